@@ -13,14 +13,380 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import os
+import threading
+from contextlib import contextmanager
+from copy import copy
+
+
 class Connector(object):
-    """Connector."""
+    """Connector.
+
+    Owns the device state (grid, adapter and WSS) for the web agent.
+    Operations that change the device are serialized.
+    """
+
+    RESOLUTION = 12.5
+    """Slice width used by the agent, in GHz."""
+
+    FREQUENCY_WINDOW = (191.325, 196.150)
+    """Spectral boundaries of the device, in THz."""
+
+    FIRST_FREQUENCY = 191.35
+    """Central frequency of the first channel in new grids, in THz."""
+
+    DEVICE = os.environ.get('WSSAGENT_DEVICE', '/dev/ttyUSB0')
+    """Serial device of the WSS."""
+
+    POLL_SETTINGS = os.environ.get('WSSAGENT_POLL_SETTINGS', '') == '1'
+    """Also poll the channel settings (``RRA?``), not only the status."""
+
+    POLL_INTERVALS = (1.0, 30.0)
+    """Minimum and maximum interval (s) between status polls."""
+
+    LOCK_TIMEOUT = 30.0
+    """Maximum time (s) an operation waits for the previous one to finish."""
 
-    def __init__(self):
+    def __init__(self, registry=None):
         """grid = FixedGrid
            adapter = FinisarAdapter
            wss = Wss Library
+           registry = AdapterRegistry (shared by default)
         """
         self._grid = None
         self._adapter = None
-        self._wss = None    
+        self._poller = None
+        self._recorder = None
+        self._profiling = None
+        self._wss = None
+        self._registry = registry
+        self._lock = threading.RLock()
+
+    def warm_up(self):
+        """Start connecting to the device in background.
+
+        The adapter is kept in the registry and reused by every grid, so the
+        connection is only established once. It can be used immediately:
+        commands will wait for the connection to be ready.
+        """
+        if self._registry is None:
+            # Imported lazily, so the agent starts serving requests quickly
+            from futebol_wss_agent.lib.registry import ADAPTERS
+            self._registry = ADAPTERS
+
+        self._adapter = self._registry.adapter(
+            self.DEVICE,
+            resolution=self.RESOLUTION,
+            frequency_window=self.FREQUENCY_WINDOW,
+            background=True)
+        self._start_poller()
+        return self._adapter
+
+    def _start_poller(self):
+        from futebol_wss_agent.lib.poller import StatusPoller
+
+        if self._poller is None:
+            min_interval, max_interval = self.POLL_INTERVALS
+            self._poller = StatusPoller(
+                self._adapter, settings=self.POLL_SETTINGS,
+                min_interval=min_interval, max_interval=max_interval)
+        self._poller.adapter = self._adapter
+        self._poller.start()
+
+    @contextmanager
+    def _locked(self):
+        """Serialize device operations, without waiting forever behind a
+        stalled one.
+        """
+        if not self._lock.acquire(timeout=self.LOCK_TIMEOUT):
+            from futebol_wss_agent.lib.resilience import DeviceTimeout
+            raise DeviceTimeout('Device busy for more than {}s'.format(
+                self.LOCK_TIMEOUT))
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    @property
+    def adapter(self):
+        """Adapter for the device, warming it up if necessary.
+
+        The connection is checked every time and re-established (in
+        background) if it failed or was lost.
+        """
+        return self.warm_up()
+
+    @property
+    def grid(self):
+        """Current grid (``None`` if no grid was created yet)."""
+        return self._grid
+
+    @property
+    def version(self):
+        """Number of effective commits of the current WSS."""
+        return self._wss.version if self._wss is not None else 0
+
+    @property
+    def etag(self):
+        """Entity tag of the current grid (``None`` if there is no grid).
+
+        It changes whenever the grid changes, in constant time.
+        """
+        return self._wss.etag if self._wss is not None else None
+
+    @property
+    def ready(self):
+        """True if the device connection is established."""
+        return self._adapter is not None and self._adapter.ready
+
+    def device_status(self):
+        """Last device status read by the background poller (see
+        :obj:`~futebol_wss_agent.lib.poller.StatusPoller.latest`).
+        """
+        if self._poller is None:
+            return {'status': 'unknown', 'updated': None}
+        return self._poller.latest
+
+    def _telemetry_recorder(self):
+        from futebol_wss_agent.lib.telemetry import TelemetryObserver
+
+        if self._recorder is None:
+            self._recorder = TelemetryObserver()
+        return self._recorder
+
+    def telemetry(self, name=None, start=None, stop=None, points=None):
+        """History recorded by the agent (see
+        :mod:`futebol_wss_agent.lib.telemetry`).
+
+        Without ``name`` the available series are listed. Returns ``None``
+        for unknown series.
+        """
+        from futebol_wss_agent.lib.telemetry import TELEMETRY
+
+        if name is None:
+            return {'series': TELEMETRY.names(), 'bytes': TELEMETRY.nbytes}
+        try:
+            return TELEMETRY.query(name, start, stop, points)
+        except KeyError:
+            return None
+
+    def _profiling_observer(self):
+        from futebol_wss_agent.lib.profiling import PROFILER, ProfilingObserver
+
+        if self._profiling is None:
+            self._profiling = ProfilingObserver(PROFILER)
+        return self._profiling
+
+    def arm_profiling(self, mode='deterministic', count=1):
+        """Profile the next ``count`` commits (see
+        :mod:`futebol_wss_agent.lib.profiling`).
+
+        Returns
+        -------
+        dict
+            Number of operations still to be profiled, per target.
+        """
+        from futebol_wss_agent.lib.profiling import PROFILER
+
+        return PROFILER.arm('commit', mode, count)
+
+    def metrics(self):
+        """Device and commit metrics, in Prometheus text format."""
+        from futebol_wss_agent.lib.metrics import REGISTRY, is_device_metric
+
+        return REGISTRY.render(select=is_device_metric)
+
+    def status(self):
+        """Readiness of the device connection, as a dictionary.
+
+        ``circuit`` is the state of the circuit breaker (``closed`` when
+        the device is responding normally).
+        """
+        circuit = self._adapter.breaker.state if self._adapter else None
+        if self.ready:
+            return {'status': 'ready', 'error': None, 'circuit': circuit}
+        error = self._adapter and self._adapter.connection_error
+        return {
+            'status': 'failed' if error else 'warming-up',
+            'error': str(error) if error else None,
+            'circuit': circuit,
+        }
+
+    def _fixed_grid(self, bandwidth, spacing):
+        from futebol_wss_agent.lib.grid import FixedGrid
+
+        return FixedGrid(
+            bandwidth=bandwidth,
+            spacing=spacing,
+            first_frequency=self.FIRST_FREQUENCY)
+
+    @staticmethod
+    def _apply_channels(grid, channels):
+        for channel in channels:
+            cr = float(channel['frequency'][1])
+            cl = float(channel['frequency'][0])
+            conf = grid[
+                'frequency', cl if cl != 0 else '':cr if cr != 0 else ''
+            ]
+            conf.port = channel['port']
+            conf.attenuation = channel['attenuation']
+
+    @staticmethod
+    def _preview(wss):
+        """Dry-run commit, summarized as a JSON-friendly dictionary."""
+        frames = wss.commit(dry_run=True) or []
+        return {
+            'commands': [frame.decode('ascii') for frame in frames],
+            'sizes': [len(frame) for frame in frames],
+            'total_size': sum(len(frame) for frame in frames),
+        }
+
+    def create_grid(self, bandwidth=50.0, spacing=0.0):
+        """Replace the channel plan with a fixed grid and commit it.
+
+        Returns
+        -------
+        Grid
+            The new grid.
+        """
+        with self._locked():
+            return self._install(self._fixed_grid(bandwidth, spacing))
+
+    def restore_grid(self, grid):
+        """Replace the channel plan with the given grid (e.g. loaded from a
+        snapshot, see :mod:`futebol_wss_agent.lib.snapshot`) and commit it.
+
+        Returns
+        -------
+        Grid
+            The new grid.
+        """
+        with self._locked():
+            return self._install(grid)
+
+    @staticmethod
+    def _same_channels(current, grid):
+        if len(current) != len(grid):
+            return False
+        grid = sorted(grid, key=lambda ch: ch.central_frequency)
+        return all(a.astuple() == b.astuple() for a, b in zip(current, grid))
+
+    def _install(self, grid):
+        from futebol_wss_agent.lib.wss import Wss
+
+        current = self._wss
+        if (current is not None and not current.dirty and
+                self._same_channels(current.grid, grid)):
+            # Same plan submitted again: nothing to send, and the version
+            # and ETag of the current grid are still valid
+            return current.grid
+
+        wss = Wss(grid, self.adapter)
+        if current is not None:
+            # The device is still in the last committed state: send only
+            # the difference, and keep the version monotonic
+            wss.previous_state = current.previous_state
+            wss.version = current.version
+        # Poll the device often after commits, and keep the history
+        wss.add_observer(self._poller)
+        wss.add_observer(self._telemetry_recorder())
+        wss.add_observer(self._profiling_observer())
+
+        # The Wss keeps its own (sorted) grid: changes must go through it
+        self._grid = wss.grid
+        self._wss = wss
+        wss.commit()
+        return wss.grid
+
+    def set_channels(self, channels):
+        """Change port and attenuation of the channels inside frequency
+        ranges, and commit.
+
+        Arguments
+        ---------
+        channels : list
+            List of dictionaries with the keys ``frequency`` (a pair with the
+            boundaries of the range in THz, ``0`` meaning unbounded),
+            ``port`` and ``attenuation``.
+
+        Returns
+        -------
+        Grid
+            The current grid.
+        """
+        with self._locked():
+            self._apply_channels(self._grid, channels)
+            self._wss.commit()
+            return self._grid
+
+    def preview_grid(self, bandwidth=50.0, spacing=0.0):
+        """Commands that :obj:`create_grid` would send, without sending them.
+
+        The adapter already in use is reused: a dry run never (re)connects
+        to the device.
+
+        Returns
+        -------
+        dict
+            ``commands`` (exact strings written to the line, including the
+            terminator), their ``sizes`` in bytes and the ``total_size``.
+
+        Raises
+        ------
+        DeviceUnavailable
+            If the connection to the device was not started yet.
+        """
+        from futebol_wss_agent.lib.wss import Wss
+
+        with self._locked():
+            if self._adapter is None:
+                from futebol_wss_agent.lib.resilience import DeviceUnavailable
+                raise DeviceUnavailable('Device not connected yet')
+            wss = Wss(self._fixed_grid(bandwidth, spacing), self._adapter)
+            return self._preview(wss)
+
+    def preview_channels(self, channels):
+        """Commands that :obj:`set_channels` would send, without sending
+        them or changing the current grid (see :obj:`preview_grid`).
+
+        Raises
+        ------
+        LookupError
+            If no grid was created yet.
+        """
+        with self._locked():
+            if self._wss is None:
+                raise LookupError('No grid created yet')
+            wss = copy(self._wss)
+            wss.grid = self._wss.grid.copy()
+            self._apply_channels(wss.grid, channels)
+            return self._preview(wss)
+
+    def reconcile(self, adopt=False):
+        """Compare the device state with the last committed grid.
+
+        Arguments
+        ---------
+        adopt : bool
+            If True, the state read from the device becomes the reference
+            for the next commit, so only the channels that differ are sent.
+
+        Returns
+        -------
+        dict
+            Summary with the indexes of the channels (in the last committed
+            state, which is the current grid unless it has uncommitted
+            changes) that are ``drifted`` or ``missing`` and the number of
+            ``unexpected`` device channels.
+        """
+        with self._locked():
+            expected = self._wss.previous_state or self._wss.grid
+            position = {id(ch): i for i, ch in enumerate(expected)}
+            result = self.adapter.reconcile(self._wss, expected, adopt)
+            return {
+                'in_sync': result.in_sync,
+                'matching': len(result.matching),
+                'drifted': [position.get(id(ch)) for ch, _ in result.drifted],
+                'missing': [position.get(id(ch)) for ch in result.missing],
+                'unexpected': len(result.unexpected),
+            }
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Single device-owner process for multi-worker deployments.
+
+The serial port of a WSS must have exactly one owner. When the web agent
+runs with several workers (e.g. ``gunicorn -w 4``), the device owner holds
+the :obj:`~.conn.Connector` (and therefore the ``Wss`` state and the serial
+connection), while the HTTP workers use a :obj:`RemoteConnector`, that
+forwards every device operation through a Unix socket.
+
+The wire protocol is line-based: each request is a JSON object
+``{"op": <name>, "args": {...}}`` terminated by ``\\n`` and each reply is
+either ``{"result": ...}`` or ``{"error": <message>}``.
+
+Usage
+-----
+
+.. code-block:: bash
+
+    python -m futebol_wss_agent.config.device_owner --socket /run/wss.sock &
+    WSSAGENT_DEVICE_SOCKET=/run/wss.sock gunicorn -w 4 app_web:app
+"""
+from __future__ import absolute_import
+
+import argparse
+import base64
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+
+from six.moves import socketserver
+
+from futebol_wss_agent.lib.resilience import DeviceUnavailable
+
+from .conn import Connector
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/tmp/wssagent.sock'
+
+
+class RemoteError(RuntimeError):
+    """Operation failed in the device-owner process."""
+
+
+class RemoteDeviceUnavailable(RemoteError, DeviceUnavailable):
+    """Device temporarily unavailable in the device-owner process."""
+
+
+def _dump_grid(grid):
+    """Grid as a base64 binary snapshot (much smaller and faster to parse
+    than a list of channel states).
+    """
+    from futebol_wss_agent.lib.snapshot import dumps
+
+    if grid is None:
+        return None
+    return base64.b64encode(dumps(grid)).decode('ascii')
+
+
+def _load_grid(snapshot):
+    from futebol_wss_agent.lib.snapshot import loads
+
+    if snapshot is None:
+        return None
+    return loads(base64.b64decode(snapshot))
+
+
+class DeviceOwner(object):
+    """Executes the requests received from the HTTP workers."""
+
+    OPERATIONS = ('status', 'grid', 'version', 'etag', 'create_grid',
+                  'set_channels', 'metrics', 'reconcile', 'preview_grid',
+                  'preview_channels', 'device_status', 'telemetry',
+                  'arm_profiling', 'restore_grid')
+
+    def __init__(self, connector=None):
+        self.connector = connector or Connector()
+
+    def handle(self, request):
+        """Run the requested operation and build the reply."""
+        op = request.get('op')
+        if op not in self.OPERATIONS:
+            return {'error': 'Unknown operation: {}'.format(op)}
+        try:
+            result = getattr(self, '_' + op)(**request.get('args', {}))
+        except Exception as err:
+            LOG.error("Operation %s failed", op, exc_info=True)
+            return {'error': str(err),
+                    'unavailable': isinstance(err, DeviceUnavailable)}
+        return {'result': result}
+
+    def _status(self):
+        return self.connector.status()
+
+    def _grid(self):
+        return _dump_grid(self.connector.grid)
+
+    def _version(self):
+        return self.connector.version
+
+    def _etag(self):
+        return self.connector.etag
+
+    def _create_grid(self, bandwidth=50.0, spacing=0.0):
+        return _dump_grid(self.connector.create_grid(bandwidth, spacing))
+
+    def _set_channels(self, channels):
+        return _dump_grid(self.connector.set_channels(channels))
+
+    def _restore_grid(self, snapshot):
+        return _dump_grid(self.connector.restore_grid(_load_grid(snapshot)))
+
+    def _metrics(self):
+        return self.connector.metrics()
+
+    def _reconcile(self, adopt=False):
+        return self.connector.reconcile(adopt)
+
+    def _preview_grid(self, bandwidth=50.0, spacing=0.0):
+        return self.connector.preview_grid(bandwidth, spacing)
+
+    def _preview_channels(self, channels):
+        return self.connector.preview_channels(channels)
+
+    def _device_status(self):
+        return self.connector.device_status()
+
+    def _telemetry(self, name=None, start=None, stop=None, points=None):
+        return self.connector.telemetry(name, start, stop, points)
+
+    def _arm_profiling(self, mode='deterministic', count=1):
+        return self.connector.arm_profiling(mode, count)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError:
+                reply = {'error': 'Malformed request'}
+            else:
+                reply = self.server.owner.handle(request)
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class DeviceOwnerServer(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server that exposes a :obj:`DeviceOwner`."""
+
+    daemon_threads = True
+
+    def __init__(self, path, owner):
+        self.owner = owner
+        try:
+            os.unlink(path)  # stale socket left by a previous run
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        socketserver.ThreadingUnixStreamServer.__init__(
+            self, path, _RequestHandler)
+
+
+class RemoteConnector(object):
+    """Same interface as :obj:`~.conn.Connector`, but the operations are
+    executed by the device-owner process.
+
+    Each thread keeps its own connection to the owner, so requests from
+    different workers (or threads) are independent.
+
+    Arguments
+    ---------
+    path : str
+        Path of the Unix socket where the owner listens.
+    timeout : float
+        Maximum time in seconds waiting for each reply (``None`` waits
+        forever). By default :obj:`DEFAULT_TIMEOUT`.
+    """
+
+    DEFAULT_TIMEOUT = 35.0
+    """A bit longer than the owner waits for the device (30 s, see
+    :obj:`~.conn.Connector.LOCK_TIMEOUT`), so its own error usually comes
+    first.
+    """
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            conn = self._local.conn = (sock, sock.makefile('rwb'))
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            for obj in reversed(conn):
+                try:
+                    obj.close()
+                except (OSError, socket.error):
+                    pass
+
+    def _call(self, op, **args):
+        message = json.dumps({'op': op, 'args': args}).encode('utf-8')
+        for attempt in (1, 2):
+            reused = getattr(self._local, 'conn', None) is not None
+            try:
+                _, stream = self._connection()
+                stream.write(message + b'\n')
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise socket.error(errno.ECONNRESET,
+                                       'Device owner closed the connection')
+            except socket.timeout:
+                # The operation may still be running: never send it again
+                self._close()
+                raise RemoteDeviceUnavailable(
+                    'No reply from the device owner in {}s'.format(
+                        self.timeout))
+            except (OSError, socket.error):
+                self._close()
+                # A kept-alive connection may have been closed by the owner
+                # (e.g. restart), in this case it is worth trying again
+                if reused and attempt == 1:
+                    continue
+                raise
+            break
+
+        reply = json.loads(line.decode('utf-8'))
+        if 'error' in reply:
+            if reply.get('unavailable'):
+                raise RemoteDeviceUnavailable(reply['error'])
+            raise RemoteError(reply['error'])
+        return reply['result']
+
+    def warm_up(self):
+        """The device is warmed up by the owner process: nothing to do."""
+
+    def status(self):
+        try:
+            return self._call('status')
+        except (OSError, socket.error, RemoteDeviceUnavailable) as err:
+            return {'status': 'unreachable', 'error': str(err)}
+
+    @property
+    def ready(self):
+        return self.status()['status'] == 'ready'
+
+    @property
+    def grid(self):
+        return _load_grid(self._call('grid'))
+
+    @property
+    def version(self):
+        return self._call('version')
+
+    @property
+    def etag(self):
+        return self._call('etag')
+
+    def create_grid(self, bandwidth=50.0, spacing=0.0):
+        return _load_grid(self._call('create_grid', bandwidth=bandwidth,
+                                     spacing=spacing))
+
+    def set_channels(self, channels):
+        return _load_grid(self._call('set_channels', channels=channels))
+
+    def restore_grid(self, grid):
+        return _load_grid(self._call('restore_grid',
+                                     snapshot=_dump_grid(grid)))
+
+    def metrics(self):
+        return self._call('metrics')
+
+    def reconcile(self, adopt=False):
+        return self._call('reconcile', adopt=adopt)
+
+    def preview_grid(self, bandwidth=50.0, spacing=0.0):
+        return self._call('preview_grid', bandwidth=bandwidth,
+                          spacing=spacing)
+
+    def preview_channels(self, channels):
+        return self._call('preview_channels', channels=channels)
+
+    def device_status(self):
+        return self._call('device_status')
+
+    def telemetry(self, name=None, start=None, stop=None, points=None):
+        return self._call('telemetry', name=name, start=start, stop=stop,
+                          points=points)
+
+    def arm_profiling(self, mode='deterministic', count=1):
+        return self._call('arm_profiling', mode=mode, count=count)
+
+
+def serve(path=DEFAULT_SOCKET, connector=None):
+    """Start the device owner and serve the workers until interrupted."""
+    owner = DeviceOwner(connector)
+    owner.connector.warm_up()
+    server = DeviceOwnerServer(path, owner)
+    LOG.info("Device owner listening on %s", path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--socket', default=os.environ.get('WSSAGENT_DEVICE_SOCKET',
+                                           DEFAULT_SOCKET),
+        help='Path of the Unix socket (default: %(default)s)')
+    opts = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+    serve(opts.socket)
+
+
+if __name__ == '__main__':
+    main()
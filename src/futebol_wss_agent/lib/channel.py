@@ -15,6 +15,10 @@
 # limitations under the License.
 from __future__ import absolute_import
 
+from itertools import count
+from operator import attrgetter
+from random import getrandbits
+
 from six import PY3
 
 from .utils import frequency_to_wavelength
@@ -25,6 +29,34 @@ if PY3:
 else:
     from collections import Mapping
 
+_EPOCHS = count(1)
+_PROCESS_TAG = '{:08x}'.format(getrandbits(32))
+
+
+class VersionClock(object):
+    """Mutation counter shared by a grid and its channels.
+
+    Each grid has its own clock (identified by ``epoch``); ``value`` is
+    incremented every time a field of one of its channels changes.
+    """
+
+    __slots__ = ('epoch', 'value')
+
+    def __init__(self):
+        self.epoch = next(_EPOCHS)
+        self.value = 0
+
+    @property
+    def tag(self):
+        """String identifying the clock and its value, unique across the
+        grids of the process and across restarts (used as ETag).
+        """
+        return '{}-{}-{}'.format(_PROCESS_TAG, self.epoch, self.value)
+
+    def __repr__(self):
+        return 'VersionClock(epoch={}, value={})'.format(self.epoch,
+                                                         self.value)
+
 
 class Channel(Mapping):
     """Data structure that represents a WDM channel.
@@ -46,8 +78,20 @@ class Channel(Mapping):
 
     MUTABLE_PROPERTIES = ('attenuation', 'blocked', 'port')
     IMMUTABLE_PROPERTIES = ('central_frequency', 'bandwidth')
+    FIELDS = IMMUTABLE_PROPERTIES + MUTABLE_PROPERTIES
+    """Keys exposed by the mapping interface, in serialization order."""
+
+    # Attributes storing each field (same order as FIELDS), so the mapping
+    # interface does O(1) work per key instead of rebuilding the state
+    _ATTRIBUTES = (tuple('_'+k for k in IMMUTABLE_PROPERTIES) +
+                   MUTABLE_PROPERTIES)
+    _ATTRIBUTE_OF = dict(zip(FIELDS, _ATTRIBUTES))
+    _VALUES = attrgetter(*_ATTRIBUTES)
+    _TRACKED = frozenset(_ATTRIBUTES)
 
     _frozen = False
+    _clock = None
+    # Set by the grid owning the channel (see Grid.version)
 
     def __init__(self, central_frequency, bandwidth,
                  attenuation=0, blocked=False, port=1):
@@ -102,14 +146,11 @@ class Channel(Mapping):
         ) + ')'
 
     def __getstate__(self):
-        state = {}
-        state.update({
-            k: getattr(self, '_'+k) for k in
-            self.IMMUTABLE_PROPERTIES
-        })
-        state.update({k: getattr(self, k) for k in self.MUTABLE_PROPERTIES})
+        return dict(zip(self.FIELDS, self._VALUES(self)))
 
-        return state
+    def astuple(self):
+        """Field values as a tuple, in the same order as :obj:`FIELDS`."""
+        return self._VALUES(self)
 
     def __setstate__(self, state):
         for k in self.IMMUTABLE_PROPERTIES:
@@ -118,33 +159,49 @@ class Channel(Mapping):
             setattr(self, k, state[k])
 
     def __getitem__(self, key):
-        return self.__getstate__()[key]
+        try:
+            attr = self._ATTRIBUTE_OF[key]
+        except (KeyError, TypeError):
+            raise KeyError(key)
+        return getattr(self, attr)
 
     def __iter__(self):
-        return iter(self.__getstate__())
+        return iter(self.FIELDS)
 
     def __len__(self):
-        return len(self.__getstate__())
+        return len(self.FIELDS)
 
     def __setattr__(self, name, value):
         """\
         Intercepts all the property changes, denying them if object is frozen.
+
+        Effective changes to the fields advance the clock of the grid that
+        owns the channel.
         """
         if self._frozen:
             raise FrozenObject
-        else:
-            super(Channel, self).__setattr__(name, value)
+        clock = self._clock
+        if (clock is not None and name in self._TRACKED and
+                self.__dict__.get(name, value) != value):
+            clock.value += 1
+        super(Channel, self).__setattr__(name, value)
+
+    @classmethod
+    def _make(cls, values):
+        """Fast constructor from the field values, in the order of
+        :obj:`FIELDS` (see :obj:`astuple`). Values are not checked.
+        """
+        channel = cls.__new__(cls)
+        channel.__dict__.update(zip(cls._ATTRIBUTES, values))
+        return channel
 
     def copy(self):
         """Copies the object.
 
-        When a frozen object is copied the new object is fresh and mutable.
+        When a frozen object is copied the new object is fresh and mutable
+        (and not owned by any grid).
         """
-        return self.__class__(self.central_frequency,
-                              self.bandwidth,
-                              self.attenuation,
-                              self.blocked,
-                              self.port)
+        return self._make(self._VALUES(self))
     __copy__ = __deepcopy__ = copy
 
     def freeze(self):
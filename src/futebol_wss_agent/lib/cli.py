@@ -13,17 +13,27 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from __future__ import absolute_import
+
+import logging
 import re
 import sys
-import time
 
-import serial
+from .metrics import (SERIAL_BYTES_READ, SERIAL_BYTES_WRITTEN,
+                      SERIAL_COMMAND_SECONDS, SERIAL_ERROR_RESPONSES, clock,
+                      command_mnemonic)
+from .resilience import DeviceTimeout
+from .telemetry import record_latency
+from .tokenizer import ResponseTokenizer
 
 try:
     from StringIO import StringIO
 except ImportError:
     from io import StringIO
 
+LOG = logging.getLogger(__name__)
+
+
 class UndefinedAdapter(RuntimeWarning):
     """Avoid committing grid if adapter not specified."""
 
@@ -33,10 +43,29 @@ class UndefinedAdapter(RuntimeWarning):
         super(UndefinedAdapter, self).__init__(message, *args, **kwargs)
 
 
+def _observe_latency(cmd, seconds):
+    """Round-trip time of a command, for the metrics and the telemetry."""
+    mnemonic = command_mnemonic(cmd)
+    SERIAL_COMMAND_SECONDS.labels(mnemonic).observe(seconds)
+    record_latency(mnemonic, seconds)
+
+
 class MalformedResponse(ValueError):
     """Grid should respect vendor grid specification."""
 
 
+class ErrorResponse(RuntimeError):
+    """Device rejected the command (CER, AER, RER or VER)."""
+
+    def __init__(self, code, command=None):
+        message = "Device replied {}".format(code)
+        if command is not None:
+            message += " to {!r}".format(command)
+        super(ErrorResponse, self).__init__(message)
+        self.code = code
+        self.command = command
+
+
 class Serial(object):
     """[summary]
     Arguments:
@@ -53,45 +82,195 @@ class Serial(object):
         'eol': '\r\n'
     }
 
-    def __init__(self, device='/dev/ttyUSB0', speed=115200):
+    DEFAULT_TIMEOUT = 10.0
+    """Maximum time waiting for the complete response of a command (s)."""
+
+    POLL_INTERVAL = 0.05
+    """Maximum time blocked in a single read, so deadlines are checked (s)."""
+
+    def __init__(self, device='/dev/ttyUSB0', speed=115200,
+                 timeout=DEFAULT_TIMEOUT):
         self._device = device
         self._speed = speed
-        self._wss = serial.Serial(self._device, self._speed) #, rtscts=True, dsrdtr=True)
+        self.timeout = timeout
+        self._wss = self._open()
+        self._stale = False
         self._buf = []
         self.config = Serial.DEFAULT_CONFIGURATION
 
-    def command(self, cmd=None):
-        print(cmd)
+    def _open(self):
+        import serial  # imported lazily: slow to load
+        if '://' in self._device:
+            # e.g. socket://host:port for terminal servers (see pyserial)
+            return serial.serial_for_url(self._device, self._speed,
+                                         timeout=self.POLL_INTERVAL)
+        return serial.Serial(self._device, self._speed,
+                             timeout=self.POLL_INTERVAL) #, rtscts=True, dsrdtr=True)
+
+    @property
+    def device(self):
+        return self._device
+
+    def is_healthy(self):
+        """True if the port is open and no I/O error happened since then."""
+        return self._wss is not None and self._wss.is_open
+
+    def close(self):
+        """Close the port. It can be opened again with :obj:`reconnect`."""
+        if self._wss is not None:
+            try:
+                self._wss.close()
+            finally:
+                self._wss = None
+
+    def reconnect(self):
+        """Close the port (if open) and open it again."""
+        self.close()
+        self._wss = self._open()
+
+    def _port(self):
+        if self._wss is None:
+            raise IOError('Serial port {} is closed'.format(self._device))
+        return self._wss
+
+    def _encode(self, cmd):
+        """Bytes written for a command (``str`` or already encoded)."""
+        if isinstance(cmd, bytes):
+            return cmd + self.config['eol'].encode('ascii')
+        return (cmd + self.config['eol']).encode('utf-8')
+
+    def _write(self, port, data):
+        if self._stale:
+            # Late response to a command that timed out
+            port.reset_input_buffer()
+            self._stale = False
+        port.write(data)
+        SERIAL_BYTES_WRITTEN.inc(len(data))
+
+    def _abandon(self, port):
+        """Discard the rest of a response that was not received in time.
+
+        Otherwise it would be read as the response to the next command.
+        Bytes arriving later are discarded before the next command is sent.
+        """
+        port.reset_input_buffer()
+        self._stale = True
+
+    def _deadline(self, timeout):
+        return clock() + (self.timeout if timeout is None else timeout)
+
+    def _complete(self, response):
+        """True if the last line of the response is OK or an error code."""
+        if not response.endswith('\n'):
+            return False
+        lines = response.split()
+        if not lines:
+            return False
+        last = lines[-1]
+        return bool(re.match(self.config['prompt_string'] + r'$', last) or
+                    self.config['error_regex'].match(last))
+
+    def command(self, cmd=None, timeout=None):
+        """Send a command (``str`` or ``bytes``) and return its response.
+
+        Raises :obj:`~.resilience.DeviceTimeout` if the response is not
+        complete after ``timeout`` seconds (:obj:`timeout` by default).
+        """
+        LOG.debug('Sending %r', cmd)
         if cmd:
-            buf = StringIO()
-            res = ""
-            c = cmd + self.config['eol']
-            self._wss.write(c.encode('utf-8'))
-               
-            time.sleep(1)
-
-            while True:
-                while self._wss.in_waiting:
-                    r = self._wss.read()
-                    buf.write(r.decode())
-                    time.sleep(0)
+            try:
+                return self._command(cmd, timeout)
+            except (IOError, OSError):
+                # The port is unusable (e.g. device unplugged): drop it, so
+                # the next user notices (is_healthy) and reconnects
+                self.close()
+                raise
+
+    def _command(self, cmd, timeout=None):
+        buf = StringIO()
+        res = ""
+        c = self._encode(cmd)
+        start = clock()
+        deadline = self._deadline(timeout)
+        port = self._port()
+        self._write(port, c)
 
+        while not self._complete(res):
+            if clock() > deadline:
+                _observe_latency(cmd, clock() - start)
+                self._abandon(port)
+                raise DeviceTimeout(
+                    'No complete response to {!r} after {}s (got {!r})'
+                    .format(cmd, self.timeout if timeout is None else timeout,
+                            res))
+            # Blocks at most POLL_INTERVAL
+            r = port.read(port.in_waiting or 1)
+            if r:
+                SERIAL_BYTES_READ.inc(len(r))
+                buf.write(r.decode())
                 res = buf.getvalue()
-                print(res)
-                #if bool(re.match(self.config['prompt_string'], res.decode())):
-                #    break
-                if not self._wss.in_waiting:
-                    break
-            self._wss.flush()
-            return res.strip()
+
+        LOG.debug('Received %r', res)
+        port.flush()
+        _observe_latency(cmd, clock() - start)
+        self._count_errors(res)
+        return res.strip()
+
+    def iter_records(self, cmd, timeout=None):
+        """Send a query and yield each record of the response as soon as it
+        is received (see :obj:`~.tokenizer.ResponseTokenizer`).
+
+        Raises :obj:`ErrorResponse` if the device rejects the query and
+        :obj:`~.resilience.DeviceTimeout` if the response is not complete
+        after ``timeout`` seconds.
+        """
+        tokenizer = ResponseTokenizer()
+        c = self._encode(cmd)
+        start = clock()
+        deadline = self._deadline(timeout)
+        port = self._port()
+        try:
+            self._write(port, c)
+            while not tokenizer.done:
+                chunk = port.read(port.in_waiting or 1)
+                if not chunk:  # nothing received during POLL_INTERVAL
+                    if clock() > deadline:
+                        self._abandon(port)
+                        raise DeviceTimeout(
+                            'Incomplete response to {!r}'.format(cmd))
+                    continue
+                SERIAL_BYTES_READ.inc(len(chunk))
+                for record in tokenizer.feed(chunk):
+                    yield record
+        except GeneratorExit:
+            # Abandoned by the consumer: the rest of the response is stale
+            self._abandon(port)
+            raise
+        except (IOError, OSError):
+            self.close()
+            raise
+        finally:
+            _observe_latency(cmd, clock() - start)
+
+        if tokenizer.error:
+            SERIAL_ERROR_RESPONSES.labels(tokenizer.error).inc()
+            raise ErrorResponse(tokenizer.error, cmd)
+
+    def _count_errors(self, response):
+        error_regex = self.config['error_regex']
+        for line in response.splitlines():
+            error = error_regex.match(line.strip())
+            if error:
+                SERIAL_ERROR_RESPONSES.labels(error.group(1).upper()).inc()
 
     def flush(self):
-        self._wss.flush()
+        self._port().flush()
 
     def send_line(self, cmd='', flush=True):
-        self._wss.write(cmd.encode('utf-8'))
+        port = self._port()
+        port.write(cmd.encode('utf-8'))
         if flush:
-            self._wss.flush()
+            port.flush()
 
 if __name__ == "__main__":
     test = Serial()
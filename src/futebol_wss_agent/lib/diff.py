@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Difference between grids, matching channels by spectral identity.
+
+Comparing grids position by position makes every channel after an inserted
+(or removed) one look modified. :obj:`diff_grids` instead matches the
+channels by their place in the spectrum (central frequency and width), with
+a single merge over both grids, that are sorted by frequency.
+
+Example
+-------
+
+.. code-block:: python
+
+    delta = diff_grids(wss.previous_state, wss.grid)
+    delta.inserted  # => [(3, Channel(...))]
+    delta.updated   # => [(7, 8, {'port': (1, 2)})]
+"""
+from __future__ import absolute_import
+
+from collections import namedtuple
+from operator import attrgetter
+
+from .channel import Channel
+
+
+def spectral_key(channel):
+    """Identity of a channel in the spectrum: central frequency and
+    bandwidth, as integer MHz (so float noise is ignored).
+    """
+    return (int(round(channel.central_frequency * 1e6)),
+            int(round(channel.bandwidth * 1e3)))
+
+
+class GridDiff(namedtuple('GridDiff', 'inserted deleted updated')):
+    """Result of :obj:`diff_grids`.
+
+    Attributes
+    ----------
+    inserted : list
+        ``(new_index, channel)`` for channels only in the new grid.
+    deleted : list
+        ``(old_index, channel)`` for channels only in the old grid.
+    updated : list
+        ``(old_index, new_index, {field: (old, new)})`` for channels in both
+        grids whose fields changed.
+    """
+
+    @property
+    def structural(self):
+        """True if channels were inserted or deleted (the channel plan
+        changed).
+        """
+        return bool(self.inserted or self.deleted)
+
+    def __bool__(self):
+        return bool(self.inserted or self.deleted or self.updated)
+    __nonzero__ = __bool__
+
+    def to_dict(self):
+        """Compact JSON-friendly representation."""
+        return {
+            'insert': [dict(channel.__getstate__(), index=i)
+                       for i, channel in self.inserted],
+            'delete': [{'index': i,
+                        'central_frequency': channel.central_frequency,
+                        'bandwidth': channel.bandwidth}
+                       for i, channel in self.deleted],
+            'update': [{'index': j, 'previous_index': i,
+                        'changes': {k: list(v) for k, v in changes.items()}}
+                       for i, j, changes in self.updated],
+        }
+
+
+def _sorted_by_key(grid, key):
+    """Pairs ``(key, index)``, sorted. Grids are usually sorted already,
+    which is checked in linear time.
+    """
+    keyed = [(key(channel), i) for i, channel in enumerate(grid)]
+    if any(keyed[k][0] > keyed[k + 1][0] for k in range(len(keyed) - 1)):
+        keyed.sort()
+    return keyed
+
+
+def diff_grids(old, new, key=spectral_key, fields=Channel.MUTABLE_PROPERTIES):
+    """Compare two grids, matching channels with the same ``key``.
+
+    Arguments
+    ---------
+    old : Grid
+        Previous grid (``None`` is the same as empty).
+    new : Grid
+    key : callable
+        Spectral identity of a channel. Should increase with the frequency,
+        like the default :obj:`spectral_key` (or the slice range).
+    fields : tuple
+        Channel attributes compared for matched channels.
+
+    Returns
+    -------
+    GridDiff
+    """
+    old = old or ()
+    values = attrgetter(*fields) if len(fields) > 1 else (
+        lambda channel: (getattr(channel, fields[0]),))
+    left = _sorted_by_key(old, key)
+    right = _sorted_by_key(new, key)
+
+    inserted, deleted, updated = [], [], []
+    a = b = 0
+    while a < len(left) and b < len(right):
+        (key_a, i), (key_b, j) = left[a], right[b]
+        if key_a == key_b:
+            before, after = values(old[i]), values(new[j])
+            if before != after:
+                updated.append((i, j, {
+                    field: (x, y)
+                    for field, x, y in zip(fields, before, after) if x != y
+                }))
+            a += 1
+            b += 1
+        elif key_a < key_b:
+            deleted.append((i, old[i]))
+            a += 1
+        else:
+            inserted.append((j, new[j]))
+            b += 1
+    deleted.extend((i, old[i]) for _, i in left[a:])
+    inserted.extend((j, new[j]) for _, j in right[b:])
+
+    return GridDiff(inserted, deleted, updated)
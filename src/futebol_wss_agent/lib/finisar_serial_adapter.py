@@ -15,35 +15,120 @@
 # limitations under the License.
 from __future__ import absolute_import
 
+import logging
 import re
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 from math import floor
 from time import sleep
 
 from .channel import Channel
-from .cli import MalformedResponse, Serial
+from .cli import ErrorResponse, MalformedResponse, Serial
+from .frames import FragmentCache, Frame, checksum_of
+from .grid import Grid
+from .metrics import command_mnemonic, commit_phase
+from .planner import compare_grids, plan_transition
+from .resilience import CircuitBreaker, DeviceTimeout, RetryPolicy
+from .scheduler import CommandScheduler
+from .tokenizer import parse_records
+from .tracing import span
 from .verification import OutOfRange, OverlappedChannels, UnsupportedResolution
 
 TOLERANCE = 1e-6
 
+LOG = logging.getLogger(__name__)
 
-def is_grid_tainted(wss):
-    """Determines if the grid must be rebuilt."""
 
-    # No grid was set yet
-    if wss.previous_state is None:
-        return True
+@contextmanager
+def _phase(name):
+    """Report a commit phase to both metrics and tracing."""
+    with commit_phase(name), span(name):
+        yield
 
-    delta = wss.changes()
 
-    if any(k in delta for k in ('$insert', '$delete')):
-        return True
+def _cast_records(records, types, description):
+    result = []
+    for record in records:
+        if len(record) != len(types):
+            raise MalformedResponse("Invalid {} entry: {!r}".format(
+                description, record))
+        result.append(tuple(cast(v) for cast, v in zip(types, record)))
+    return result
 
-    # Even if no channel was inserted or deleted, some channel may have
-    # fundamental properties changed, and therefore the grid must be rebuilt
-    return any(
-        any(k in v.get('$update', {}) for k in Channel.IMMUTABLE_PROPERTIES)
-        for v in delta.values()
-    )
+
+def _parse_list(payload, types, description):
+    records, error = parse_records(payload)
+    if error:
+        raise ErrorResponse(error)
+    return _cast_records(records, types, description)
+
+
+def _as_records(response, types, description):
+    """Parse textual responses, or cast records already parsed."""
+    if isinstance(response, (str, bytes)):
+        return _parse_list(response, types, description)
+    return _cast_records(response, types, description)
+
+
+def parse_channel_plan(payload):
+    """Parse the reply of the ``DCC?`` query.
+
+    Arguments
+    ---------
+    payload : str or bytes
+        Reply in the format ``<C>=<S>:<S>{;<C>=<S>:<S>}``, with or without
+        framing.
+
+    Returns
+    -------
+    list
+        List of tuples ``(channel, first_slice, last_slice)``.
+    """
+    return _parse_list(payload, (int, int, int), 'channel plan')
+
+
+def parse_channel_settings(payload):
+    """Parse the reply of the ``RRA?`` query.
+
+    Arguments
+    ---------
+    payload : str or bytes
+        Reply in the format ``<C>,<P>,<A>{;<C>,<P>,<A>}``, with or without
+        framing.
+
+    Returns
+    -------
+    list
+        List of tuples ``(channel, port, attenuation)``.
+    """
+    return _parse_list(payload, (int, int, float), 'channel settings')
+
+
+class Reconciliation(namedtuple('Reconciliation', [
+        'device_grid', 'matching', 'drifted', 'missing', 'unexpected'])):
+    """Comparison between the channels configured in the device and the
+    expected ones.
+
+    Attributes
+    ----------
+    device_grid : Grid
+        Channel plan read from the device.
+    matching : list
+        Expected channels that are correctly configured in the device.
+    drifted : list
+        Pairs ``(expected, found)`` of channels that occupy the same slices,
+        but have different port or attenuation in the device.
+    missing : list
+        Expected channels whose slice range is not defined in the device.
+    unexpected : list
+        Device channels whose slice range is not expected.
+    """
+
+    @property
+    def in_sync(self):
+        """True if the device matches the expected state."""
+        return not (self.drifted or self.missing or self.unexpected)
 
 
 class _Communication(object):
@@ -58,32 +143,132 @@ class _Communication(object):
     ---------
     interface : inclinations.Serial or None
         If no interface is passed, a new one will be created with the default
-        options.
+        options, wrapped in a :obj:`~.scheduler.CommandScheduler`.
     use_checksum : bool
         If True, the wire protocol includes checksum.
+    background : bool
+        If True, the connection is established (and the line flushed) in a
+        background thread, so the constructor returns immediately.
+        Commands wait until the connection is ready.
+    device : str
+        Serial device used when no interface is passed.
+
+    Attributes
+    ----------
+    breaker : CircuitBreaker
+        Rejects commands while the device is not responding.
+    retry : RetryPolicy
+        Used for queries, that are idempotent. Commands are never retried.
+    ready_timeout : float
+        Maximum time (s) that a command waits for the connection.
     """
 
-    def __init__(self, interface=None, use_checksum=True):
+    READY_TIMEOUT = 30.0
+
+    def __init__(self, interface=None, use_checksum=True, background=False,
+                 device=None):
         self.use_checksum = use_checksum
-        self.interface = interface if interface else Serial()
-        self.interface.config.update(
-            prompt_string='\^?OK(\$FF66)?',
-            error_regex=re.compile(
-                r'\^?(CER|AER|RER|VER)(\$[A-F0-9]{4})?\s*$', re.I),
-            eol='\r\n'
-        )
-        # Make sure that no garbage is received from equipment
-        sleep(1)
-        self.interface.send_line('', flush=True)
-        sleep(1)
-        self.interface.flush()
+        self.interface = interface
+        self.device = device
+        self.breaker = CircuitBreaker(device or 'WSS')
+        self.retry = RetryPolicy()
+        self.ready_timeout = self.READY_TIMEOUT
+        self.error = None
+        self.ready = threading.Event()
+        self._settled = threading.Event()
+        self._start(background)
+
+    def _start(self, background):
+        if background:
+            thread = threading.Thread(target=self._connect_in_background,
+                                      name='wss-warm-up')
+            thread.daemon = True
+            thread.start()
+        else:
+            self.connect()
+
+    def _interface_healthy(self):
+        is_healthy = getattr(self.interface, 'is_healthy', None)
+        return is_healthy is None or is_healthy()
+
+    @property
+    def healthy(self):
+        """True if the connection is established and still usable."""
+        return (self.ready.is_set() and self.error is None and
+                self._interface_healthy())
+
+    @property
+    def settled(self):
+        """True when the last connection attempt finished (either way)."""
+        return self._settled.is_set()
+
+    def connect(self):
+        """Open the interface and make sure no garbage is left in the line."""
+        try:
+            if self.interface is None:
+                # Configuration commands take precedence over polling
+                self.interface = CommandScheduler(
+                    Serial(self.device) if self.device else Serial())
+            elif not self._interface_healthy():
+                self.interface.reconnect()
+            self.interface.config.update(
+                prompt_string='\^?OK(\$FF66)?',
+                error_regex=re.compile(
+                    r'\^?(CER|AER|RER|VER)(\$[A-F0-9]{4})?\s*$', re.I),
+                eol='\r\n'
+            )
+            # Make sure that no garbage is received from equipment
+            sleep(1)
+            self.interface.send_line('', flush=True)
+            sleep(1)
+            self.interface.flush()
+        except Exception as err:
+            self.error = err
+            raise
+        else:
+            self.error = None
+            self.ready.set()
+        finally:
+            self._settled.set()
+
+    def _connect_in_background(self):
+        try:
+            self.connect()
+        except Exception:
+            LOG.exception('Impossible to connect to the WSS')
+
+    def wait_ready(self, timeout=None):
+        """Block until the connection is established.
+
+        Raises the connection error if the attempt failed.
+        """
+        if not self._settled.wait(timeout):
+            raise DeviceTimeout('WSS connection not ready after {}s'.format(
+                timeout))
+        if self.error is not None:
+            raise self.error
+
+    def reconnect(self, background=False):
+        """Establish the connection again, reusing the interface."""
+        self.ready.clear()
+        self._settled.clear()
+        self._start(background)
+
+    def close(self):
+        """Close the interface (if it supports it)."""
+        self.ready.clear()
+        close = getattr(self.interface, 'close', None)
+        if close is not None:
+            close()
 
     @staticmethod
     def checksum(command_str):
         """Finisar checksum is the 16-bit 2-complement of the sum of the bytes
         that correspond to each charater.
         """
-        return (0xFFFF - sum(ord(ch) for ch in command_str)) + 0b1
+        if isinstance(command_str, Frame):
+            return command_str.checksum
+        return checksum_of(sum(ord(ch) for ch in command_str))
 
     def verify_response_line(self, line):
         """True if line is well-formed, False otherwise."""
@@ -113,20 +298,138 @@ class _Communication(object):
     def strip_response_checksum(response):
         return response.strip()[1:].split("$")[0]
 
+    @staticmethod
+    def response_payload(response):
+        """Data returned by a query, without framing.
+
+        Leading ``^``, checksums and the final ``OK`` line are removed and
+        the remaining lines are concatenated.
+        """
+        lines = []
+        for line in response.splitlines():
+            line = line.strip().lstrip('^').split('$')[0]
+            if line and line.upper() != 'OK':
+                lines.append(line)
+        return ''.join(lines)
+
+    def _ensure_ready(self):
+        if not self.ready.is_set():
+            self.wait_ready(self.ready_timeout)
+
+    def _send(self, method, *args):
+        """Call the interface through the circuit breaker."""
+        self._ensure_ready()
+        return self.breaker.call(getattr(self.interface, method), *args)
+
+    def query(self, command_str):
+        """Send a query and return the data in the response.
+
+        Queries are retried if the device does not reply in time.
+        """
+        return self.response_payload(
+            self.retry.call(self._send, 'command', command_str))
+
+    def query_records(self, command_str):
+        """Send a query whose response is a list of records.
+
+        If the interface supports streaming (``iter_records``), the
+        response is parsed while it is being received.
+
+        Returns
+        -------
+        list
+            List of tuples, see :obj:`~.tokenizer.ResponseTokenizer`.
+        """
+        self._ensure_ready()
+        if hasattr(self.interface, 'iter_records'):
+            def read_records(cmd):
+                return list(self.interface.iter_records(cmd))
+            return self.retry.call(self.breaker.call, read_records,
+                                   command_str)
+        return self.retry.call(self._send, 'command', command_str)
+
+    def query_custom_channels(self):
+        """Current channel plan, see :obj:`parse_channel_plan`."""
+        return _as_records(self.query_records("DCC?"),
+                           (int, int, int), 'channel plan')
+
+    def read_reconfiguration_array(self):
+        """Current port and attenuation of each channel, see
+        :obj:`parse_channel_settings`.
+        """
+        return _as_records(self.query_records("RRA?"),
+                           (int, int, float), 'channel settings')
+
     def command(self, command_str):
-        """Send the command using wire protocol that contains checksum."""
+        """Send the command using wire protocol that contains checksum.
+
+        Commands are not retried: if the device does not reply in time it is
+        unknown whether they were applied.
+        """
         #if self.use_checksum:
         #    cmd = "^{:s}${:04X}".format(
         #            command_str, self.checksum(command_str))
         #    response = self.interface.command(cmd)
         #    self.verify_response_checksum(response)
         #else:
-        response = self.interface.command(command_str)
+        response = self._send('command', command_str)
 
         return self.strip_response_checksum(response)
 
+    def frame(self, command):
+        """Exact bytes written to the line for a command."""
+        eol = getattr(self.interface, 'config', {}).get('eol', '\r\n')
+        if not isinstance(command, bytes):
+            command = command.encode('ascii')
+        return command + eol.encode('ascii')
+
+    # Encoders return :obj:`~.frames.Frame` objects (bytes). The fragments
+    # of each channel are cached, so only changed channels are formatted.
+    _SLICE_FRAGMENTS = FragmentCache('{:d}={:d}:{:d};')
+    _SETTING_FRAGMENTS = FragmentCache('{:d},{:d},{:0.1f};')
+
+    @staticmethod
+    def encode_enforce_flexgrid():
+        return Frame(b"CHW 0")
+
+    @classmethod
+    def encode_configure_grid(cls, slices):
+        """Command for :obj:`configure_grid`."""
+        return cls.encode_configure_grid_channels(
+            (i+1, s0, sf) for i, (s0, sf) in enumerate(slices))
+
+    @classmethod
+    def encode_configure_grid_channels(cls, slices):
+        """Command that (re)defines only some channels.
+
+        Arguments
+        ---------
+        slices : list
+            List of tuples ``(channel, first_slice, last_slice)``, where
+            channel is the number of the channel, starting at 1.
+        """
+        return cls._SLICE_FRAGMENTS.build(b"DCC ", slices)
+
+    @classmethod
+    def encode_update_grid(cls, settings):
+        """Command for :obj:`update_grid`."""
+        return cls.encode_update_channels(
+            (i+1, port, att) for i, (port, att) in enumerate(settings))
+
+    @classmethod
+    def encode_update_channels(cls, settings):
+        """Command that updates only some channels.
+
+        Arguments
+        ---------
+        settings : list
+            List of tuples ``(channel, port, attenuation)``, where channel
+            is the number of the channel, starting at 1.
+        """
+        return cls._SETTING_FRAGMENTS.build(b"UCA ", settings)
+
     def enforce_flexgrid(self):
-        return self.command("CHW 0")
+        return self.command(self.encode_enforce_flexgrid())
 
     def configure_grid(self, slices):
         """Configure WSS grid.
@@ -138,10 +441,7 @@ class _Communication(object):
             is the number of the first spectral slice to be used and the
             second one is the number of the last spectral slice to be used
         """
-        return self.command("DCC " + "".join(
-            "{:d}={:d}:{:d};".format(i+1, s0, sf)
-            for i, (s0, sf) in enumerate(slices)
-        ))
+        return self.command(self.encode_configure_grid(slices))
 
     def update_grid(self, settings):
         """Update channels attenuation and port.
@@ -154,10 +454,7 @@ class _Communication(object):
             second one is the attenuation value in dB.
             If the channel is blocked, the tuple should be (99, 99.9).
         """
-        return self.command("UCA " + "".join(
-            "{:d},{:d},{:0.1f};".format(i+1, port, att)
-            for i, (port, att) in enumerate(settings)
-        ))
+        return self.command(self.encode_update_grid(settings))
 
 
 class Adapter(object):
@@ -176,6 +473,11 @@ class Adapter(object):
         If True, the wire protocol includes checksum.
     frequency_window : tuple
         Spectral boundaries for channels. ``(191.325, 196.150)`` by default.
+    background : bool
+        If True, the connection to the device is warmed up in background
+        (see :obj:`ready`).
+    device : str
+        Serial device used when no interface is passed.
     """
 
     def __init__(self,
@@ -183,12 +485,59 @@ class Adapter(object):
                  max_attenuation=15,
                  interface=None,
                  use_checksum=True,
-                 frequency_window=(191.325, 196.150)):
+                 frequency_window=(191.325, 196.150),
+                 background=False,
+                 device=None):
 
         self.frequency_window = frequency_window
         self.resolution = resolution
         self.max_attenuation = max_attenuation
-        self._comm = _Communication(interface, use_checksum)
+        self.cost_model = None
+        """:obj:`~.planner.CostModel` used to plan commits (the default one
+        if None).
+        """
+        self.flexgrid = False
+        """True once the device is known to be in flexgrid mode."""
+        self._comm = _Communication(interface, use_checksum, background,
+                                    device)
+
+    @property
+    def ready(self):
+        """True when the device connection is established."""
+        return self._comm.ready.is_set()
+
+    @property
+    def connection_error(self):
+        """Exception raised while connecting to the device, if any."""
+        return self._comm.error
+
+    @property
+    def healthy(self):
+        """True if the device connection is established and usable."""
+        return self._comm.healthy
+
+    @property
+    def breaker(self):
+        """:obj:`~.resilience.CircuitBreaker` protecting the device."""
+        return self._comm.breaker
+
+    @property
+    def settled(self):
+        """True unless a connection attempt is in progress."""
+        return self._comm.settled
+
+    def reconnect(self, background=False):
+        """Connect again to the device, reusing the serial interface.
+
+        The device may have been power-cycled meanwhile, so the grid mode is
+        not assumed anymore.
+        """
+        self.flexgrid = False
+        self._comm.reconnect(background)
+
+    def close(self):
+        """Release the device connection."""
+        self._comm.close()
 
     def validate(self, wss):
         """Hook for validating WSS grid"""
@@ -267,17 +616,154 @@ class Adapter(object):
     def _attenuation(channel):
         return 99.9 if channel.blocked else channel.attenuation
 
-    def commit(self, wss):
-        """Configure equipment with new settings."""
+    def _slices(self, channel):
+        return (self._first_slice(channel), self._last_slice(channel))
 
-        if is_grid_tainted(wss):
-            self._comm.enforce_flexgrid()
-            self._comm.configure_grid(
-                (self._first_slice(channel), self._last_slice(channel))
-                for channel in wss.grid
-            )
+    def _settings(self, channel):
+        # Attenuation is sent with 0.1 dB precision
+        return (self._port(channel), round(self._attenuation(channel), 1))
+
+    def _channel_from_slices(self, first_slice, last_slice,
+                             port=1, attenuation=0):
+        """Inverse of :obj:`_first_slice` and :obj:`_last_slice`."""
+        df = self.resolution*1e-3
+        f0 = self.frequency_window[0]
+        start = f0 + (first_slice - 1)*df
+        stop = f0 + last_slice*df
+        blocked = port == 99 or attenuation >= 99.9
+        return Channel((start + stop)/2,
+                       (last_slice - first_slice + 1)*self.resolution,
+                       attenuation=0 if blocked else attenuation,
+                       blocked=blocked,
+                       port=1 if blocked else port)
+
+    @staticmethod
+    def _with_settings(channel, port, attenuation):
+        """Copy of the channel, using the port and attenuation read from
+        the device.
+        """
+        channel = channel.copy()
+        if port == 99 or attenuation >= 99.9:
+            channel.blocked = True
+        else:
+            channel.blocked = False
+            channel.port = port
+            channel.attenuation = attenuation
+        return channel
+
+    def operation_status(self):
+        """Operational status word of the device (``OSS?``), ``0`` when
+        there are no alarms.
+        """
+        return int(self._comm.query('OSS?'), 16)
+
+    def read_channel_settings(self):
+        """Port and attenuation of each channel (``RRA?``), as a list of
+        tuples ``(channel, port, attenuation)``.
+        """
+        return self._comm.read_reconfiguration_array()
+
+    def read_grid(self):
+        """Read the channel plan and the channel settings from the device.
 
-        self._comm.update_grid(
-            (self._port(channel), self._attenuation(channel))
-            for channel in wss.grid
+        Returns
+        -------
+        Grid
+            Channels configured in the device, sorted by frequency.
+        """
+        settings = {number: (port, att) for number, port, att
+                    in self._comm.read_reconfiguration_array()}
+        return Grid(
+            self._channel_from_slices(first, last,
+                                      *settings.get(number, (99, 99.9)))
+            for number, first, last in sorted(
+                self._comm.query_custom_channels(), key=lambda c: c[1])
         )
+
+    def reconcile(self, wss, expected=None, adopt=False):
+        """Compare the state of the device with the expected grid.
+
+        Channels are matched by slice range, and then compared by port and
+        attenuation (as sent over the wire).
+
+        Arguments
+        ---------
+        wss : Wss
+            Object whose grid is configured by this adapter.
+        expected : Grid
+            Grid expected in the device. By default the last committed state
+            (``wss.previous_state``), or ``wss.grid`` if nothing was
+            committed yet.
+        adopt : bool
+            If True, ``wss.previous_state`` is replaced by the state read from
+            the device, so the next commit only sends what is necessary to
+            bring the device to the current grid.
+
+        Returns
+        -------
+        Reconciliation
+        """
+        if expected is None:
+            expected = (wss.grid if wss.previous_state is None
+                        else wss.previous_state)
+        device_grid = self.read_grid()
+        found = {self._slices(ch): ch for ch in device_grid}
+
+        matching, drifted, missing, adopted = [], [], [], []
+        for channel in expected:
+            slices = self._slices(channel)
+            device_channel = found.pop(slices, None)
+            if device_channel is None:
+                missing.append(channel)
+                continue
+            settings = self._settings(device_channel)
+            if self._settings(channel) == settings:
+                matching.append(channel)
+            else:
+                drifted.append((channel, device_channel))
+            adopted.append(self._with_settings(channel, *settings))
+        unexpected = [ch for ch in device_grid if self._slices(ch) in found]
+
+        result = Reconciliation(device_grid, matching, drifted, missing,
+                                unexpected)
+        if adopt:
+            # Keep the exact frequencies of the expected channels when the
+            # plan is the same, so the comparison with the grid is exact
+            state = (Grid(adopted) if not (missing or unexpected)
+                     else device_grid.copy())
+            wss.previous_state = state.freeze()
+        return result
+
+    def plan(self, wss):
+        """Options to bring the device from the last committed state to the
+        current grid, cheapest first (see :mod:`.planner`).
+        """
+        transition = compare_grids(self, wss.previous_state, wss.grid)
+        return plan_transition(self, transition, wss.grid, self.flexgrid,
+                               self.cost_model)
+
+    def encode(self, wss):
+        """Hook for dry runs: bytes that :obj:`commit` would send, in order.
+
+        The device is not touched.
+        """
+        frame = self._comm.frame
+        return [frame(command) for command in self.plan(wss).commands]
+
+    def commit(self, wss):
+        """Configure equipment with new settings.
+
+        The cheapest valid command sequence is sent, see :obj:`plan`.
+        """
+        with _phase('diff'):
+            transition = compare_grids(self, wss.previous_state, wss.grid)
+
+        with _phase('encode'):
+            plan = plan_transition(self, transition, wss.grid,
+                                   self.flexgrid, self.cost_model)
+
+        with _phase('io'):
+            for command in plan.commands:
+                self._comm.command(command)
+                if command_mnemonic(command) == 'CHW':
+                    self.flexgrid = True
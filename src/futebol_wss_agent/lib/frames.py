@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Finisar commands built directly as bytes.
+
+List commands (``DCC``, ``UCA``) are the concatenation of one fragment per
+channel, e.g. ``b'12=45:48;'``. A :obj:`FragmentCache` keeps
+each encoded fragment together with the sum of its bytes, so re-encoding a
+grid in which few channels changed only formats those channels, and the
+checksum of the :obj:`Frame` is obtained by adding the cached sums.
+"""
+from __future__ import absolute_import
+
+import threading
+
+
+def checksum_of(byte_sum):
+    """Finisar checksum (16-bit 2-complement) from the sum of the bytes."""
+    return (0x10000 - byte_sum) & 0xFFFF
+
+
+class Frame(bytes):
+    """Encoded command (without line terminator).
+
+    It is a regular :obj:`bytes` object that also knows the sum of its
+    bytes, so the checksum is not computed again.
+    """
+
+    def __new__(cls, data, byte_sum=None):
+        frame = super(Frame, cls).__new__(cls, data)
+        frame.byte_sum = (sum(bytearray(data)) if byte_sum is None
+                          else byte_sum)
+        return frame
+
+    @property
+    def checksum(self):
+        return checksum_of(self.byte_sum)
+
+    def framed(self):
+        """Command with the checksum framing: ``^<command>$<checksum>``."""
+        return b'^' + self + '${:04X}'.format(self.checksum).encode('ascii')
+
+
+class FragmentCache(object):
+    """Encoded per-channel fragments, with the sum of their bytes.
+
+    Arguments
+    ---------
+    template : str
+        Format string for a fragment, receiving the items of the key.
+    maxsize : int
+        When the cache reaches this number of fragments it is emptied, so
+        memory stays bounded.
+    """
+
+    def __init__(self, template, maxsize=8192):
+        self.template = template
+        self.maxsize = maxsize
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        try:
+            return self._fragments[key]
+        except KeyError:
+            data = self.template.format(*key).encode('ascii')
+            value = (data, sum(bytearray(data)))
+            with self._lock:
+                if len(self._fragments) >= self.maxsize:
+                    self._fragments.clear()
+                self._fragments[key] = value
+            return value
+
+    def build(self, prefix, keys):
+        """Frame with the prefix (e.g. ``b'UCA '``) and one fragment per
+        key.
+        """
+        parts = [prefix]
+        byte_sum = sum(bytearray(prefix))
+        for key in keys:
+            data, data_sum = self[key]
+            parts.append(data)
+            byte_sum += data_sum
+        return Frame(b''.join(parts), byte_sum)
+
+    def __len__(self):
+        return len(self._fragments)
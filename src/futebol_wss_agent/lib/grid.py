@@ -16,20 +16,24 @@
 
 from __future__ import absolute_import
 
-from itertools import repeat
+import logging
+import operator
+from itertools import compress, cycle, repeat
 
 from six import PY3, string_types
 from six.moves import xrange as xrangex
 
-from .channel import Channel
+from .channel import Channel, VersionClock
 from .utils import wavelength_to_frequency
-from .verification import ReadonlyAttribute
+from .verification import OutOfRange, OverlappedChannels, ReadonlyAttribute
 
 if PY3:
     from collections.abc import Sequence, Iterable
 else:
     from collections import Sequence, Iterable
 
+LOG = logging.getLogger(__name__)
+
 TOLERANCE = 1e-6
 
 
@@ -81,6 +85,11 @@ class PropertyView(object):
             # called `iterable`
             iterable = []
             some_property = PropertyView('come_property', delegate='iterable')
+
+    The values are returned as a :obj:`Column`, that supports element-wise
+    comparisons and arithmetic, e.g.::
+
+        grid[grid.port == 3].attenuation += 1
     """
 
     def __init__(self, name, delegate=None, readonly=False):
@@ -89,12 +98,15 @@ class PropertyView(object):
         self.delegate = delegate
 
     def __get__(self, instance, _=None):
+        if instance is None:
+            return self
         if self.delegate is not None:
             collection = getattr(instance, self.delegate)
         else:
             collection = instance
 
-        return [getattr(obj, self.name) for obj in collection]
+        name = self.name
+        return Column([getattr(obj, name) for obj in collection])
 
     def __set__(self, instance, value):
         if self._readonly:
@@ -105,9 +117,156 @@ class PropertyView(object):
         else:
             collection = instance
 
+        name = self.name
         values = value if _is_iterable(value) else repeat(value)
         for obj, val in zip(collection, values):
-            setattr(obj, self.name, val)
+            setattr(obj, name, val)
+
+
+def _operands(values, other):
+    """Pairs of operands for an element-wise operation (scalars are
+    broadcast).
+    """
+    if not _is_iterable(other):
+        return ((value, other) for value in values)
+    if not isinstance(other, list):
+        other = list(other)
+    if len(other) != len(values):
+        raise ValueError('Operands with different lengths: {} and {}'
+                         .format(len(values), len(other)))
+    return zip(values, other)
+
+
+def _elementwise(op, result=None, reflected=False):
+    def method(self, other):
+        cls = result or self.__class__
+        if reflected:
+            return cls([op(b, a) for a, b in _operands(self, other)])
+        return cls([op(a, b) for a, b in _operands(self, other)])
+    return method
+
+
+def _inplace(op):
+    def method(self, other):
+        self[:] = [op(a, b) for a, b in _operands(self, other)]
+        return self
+    return method
+
+
+class Mask(list):
+    """Boolean values, one per channel, resulting from comparing a
+    :obj:`Column`.
+
+    Use it to index a grid (``grid[mask]``) or with :obj:`Grid.where`.
+    Masks are combined element-wise with ``&``, ``|``, ``^`` and ``~``.
+    Like in numpy, the truth value of a mask is ambiguous: use
+    :obj:`any` or :obj:`all`.
+    """
+
+    __hash__ = None
+
+    __and__ = __rand__ = _elementwise(operator.and_)
+    __or__ = __ror__ = _elementwise(operator.or_)
+    __xor__ = __rxor__ = _elementwise(operator.xor)
+
+    def __invert__(self):
+        return Mask([not value for value in self])
+
+    def __bool__(self):
+        raise ValueError('The truth value of a mask is ambiguous, '
+                         'use any() or all()')
+    __nonzero__ = __bool__
+
+    @property
+    def indices(self):
+        """Positions where the mask is True."""
+        return [i for i, value in enumerate(self) if value]
+
+
+class Column(list):
+    """Values of a channel property for each channel of a collection.
+
+    Comparisons are element-wise and return a :obj:`Mask`. Arithmetic is
+    element-wise too (with scalars broadcast), so in-place operations work
+    as expected when assigned back::
+
+        grid.attenuation += 0.5
+        grid[grid.port == 3].attenuation *= 2
+        grid[~grid.blocked].port = 2
+
+    Note that this differs from a plain :obj:`list`: ``==`` does not return
+    a :obj:`bool` (and the :obj:`Mask` cannot be used in an ``if``), and
+    ``+`` adds the values instead of concatenating the columns (use
+    ``list(column)`` for the list behaviour).
+    """
+
+    __hash__ = None
+
+    __eq__ = _elementwise(operator.eq, Mask)
+    __ne__ = _elementwise(operator.ne, Mask)
+    __lt__ = _elementwise(operator.lt, Mask)
+    __le__ = _elementwise(operator.le, Mask)
+    __gt__ = _elementwise(operator.gt, Mask)
+    __ge__ = _elementwise(operator.ge, Mask)
+
+    __add__ = _elementwise(operator.add)
+    __sub__ = _elementwise(operator.sub)
+    __mul__ = _elementwise(operator.mul)
+    __truediv__ = __div__ = _elementwise(operator.truediv)
+    __radd__ = _elementwise(operator.add, reflected=True)
+    __rsub__ = _elementwise(operator.sub, reflected=True)
+    __rmul__ = _elementwise(operator.mul, reflected=True)
+    __rtruediv__ = __rdiv__ = _elementwise(operator.truediv, reflected=True)
+
+    __iadd__ = _inplace(operator.add)
+    __isub__ = _inplace(operator.sub)
+    __imul__ = _inplace(operator.mul)
+    __itruediv__ = __idiv__ = _inplace(operator.truediv)
+
+    def __neg__(self):
+        return Column([-value for value in self])
+
+    def __invert__(self):
+        """Negation of a boolean column (e.g. ``~grid.blocked``), as a
+        :obj:`Mask`.
+        """
+        if not all(isinstance(value, bool) for value in self):
+            raise TypeError('~ is only supported for boolean columns')
+        return Mask([not value for value in self])
+
+    def isin(self, values):
+        """Mask of the elements that are in ``values``."""
+        values = set(values)
+        return Mask([value in values for value in self])
+
+
+def _select(channels, condition=None, values=None):
+    """Channels satisfying a mask or predicate and with the given property
+    values, in a single pass.
+    """
+    if isinstance(condition, Mask):
+        if len(condition) != len(channels):
+            raise ValueError('Mask of length {} for {} channels'.format(
+                len(condition), len(channels)))
+        channels = compress(channels, condition)
+        condition = None
+    elif condition is not None and not callable(condition):
+        raise TypeError('Condition should be a Mask or a callable')
+
+    if values:
+        names = list(values)
+        expected = tuple(values[name] for name in names)
+        getter = operator.attrgetter(*names)
+        if len(names) == 1:
+            expected = expected[0]
+        if condition is None:
+            return [ch for ch in channels if getter(ch) == expected]
+        return [ch for ch in channels
+                if getter(ch) == expected and condition(ch)]
+
+    if condition is None:
+        return list(channels)
+    return [ch for ch in channels if condition(ch)]
 
 
 def add_property_views(cls):
@@ -124,11 +283,69 @@ def add_property_views(cls):
     return cls
 
 
+class _Selectable(object):
+    """Masked selections, shared by :obj:`Grid` and :obj:`Selection`."""
+
+    def where(self, condition=None, **values):
+        """Channels satisfying a condition, as a :obj:`Selection`.
+
+        Arguments
+        ---------
+        condition : Mask or callable
+            A mask (e.g. ``grid.port == 3``) or a predicate receiving each
+            channel.
+        **values
+            Select only the channels with these property values.
+
+        Examples
+        --------
+
+            grid.where(port=3).attenuation += 1
+            grid.where(lambda ch: ch.attenuation > 10).blocked = True
+        """
+        return Selection(_select(self._channels, condition, values))
+
+
 @add_property_views
-class Grid(Sequence):
-    """Collection of channels that define a flex WDM grid."""
+class Selection(_Selectable, Sequence):
+    """Channels picked from a grid by a mask or condition.
+
+    A lightweight view over the same channel objects (no :obj:`Grid` is
+    built): changes to its properties change the grid.
+    """
 
     def __init__(self, channels):
+        self._channels = channels
+
+    def __repr__(self):
+        return self.__class__.__name__ + '(' + repr(self._channels) + ')'
+
+    def __len__(self):
+        return len(self._channels)
+
+    def __iter__(self):
+        return iter(self._channels)
+
+    def __getitem__(self, index):
+        if isinstance(index, Mask):
+            return self.where(index)
+        if isinstance(index, slice):
+            return Selection(self._channels[index])
+        if isinstance(index, Iterable):
+            return Selection([self._channels[i] for i in index])
+        return self._channels[index]
+
+
+@add_property_views
+class Grid(_Selectable, Sequence):
+    """Collection of channels that define a flex WDM grid.
+
+    The grid takes ownership of the channels: any change to them advances
+    :obj:`version`. Sub-grids (slices, filters) share the clock of the grid
+    they come from, but do not take the ownership of the channels.
+    """
+
+    def __init__(self, channels, clock=None):
         self._channels = []
 
         for channel in channels:
@@ -138,12 +355,49 @@ class Grid(Sequence):
                                      channel.__class__))
             self._channels.append(channel)
 
+        self._claim(clock)
+
+    def _claim(self, clock=None):
+        """Attach the channels to ``clock`` (a new one by default)."""
+        self._clock = VersionClock() if clock is None else clock
+        for channel in self._channels:
+            # Bypass __setattr__: frozen channels can be owned too
+            channel.__dict__['_clock'] = self._clock
+
+    @classmethod
+    def _view(cls, channels, clock):
+        """Sub-grid sharing ``clock`` with the grid it comes from, without
+        taking the ownership of the channels.
+        """
+        grid = cls.__new__(cls)
+        grid._channels = channels
+        grid._clock = clock
+        return grid
+
+    @property
+    def version(self):
+        """Number of changes made to the channels of the grid.
+
+        It only increases, so comparing it with a previous value tells in
+        constant time whether the grid may have changed (setting a value
+        and then restoring it counts as two changes).
+        """
+        return self._clock.value
+
+    @property
+    def etag(self):
+        """Entity tag for the current content of the grid."""
+        return self._clock.tag
+
     def __repr__(self):
         return self.__class__.__name__ + '(' + repr(self._channels) + ')'
 
     def __len__(self):
         return len(self._channels)
 
+    def __iter__(self):
+        return iter(self._channels)
+
     def __getitem__(self, index):
         """Retrieve an element or slice of the grid.
 
@@ -158,7 +412,11 @@ class Grid(Sequence):
             grid[0:12] # => [Channel(...), ...Channel(...)]
             grid['frequency', 184.5:196.1] # => [Channel(...), ...Channel(...)]
             grid['wavelength', 1545:1560] # => [Channel(...), ...Channel(...)]
+            grid[grid.port == 3] # => Selection([Channel(...), ...])
         """
+        if isinstance(index, Mask):
+            return self.where(index)
+
         if isinstance(index, tuple):
             attr, index = index
             if not isinstance(index, slice):
@@ -174,7 +432,7 @@ class Grid(Sequence):
             item = self._channels[index]
 
         if isinstance(item, Sequence):
-            return Grid(item)
+            return Grid._view(item, self._clock)
 
         return item
 
@@ -198,7 +456,7 @@ class Grid(Sequence):
             New collection of channels.
         """
 
-        print('attr', attr)
+        LOG.debug('Filtering by %s: %s to %s', attr, start, stop)
         result = []
         last_value = None
         attr = 'frequency' if 'freq' in attr else 'wavelength'
@@ -216,7 +474,7 @@ class Grid(Sequence):
                 result.append(channel)
                 last_value = current_value
 
-        return Grid(result)
+        return Grid._view(result, self._clock)
 
     def copy(self):
         """Copies the grid.
@@ -283,3 +541,162 @@ class FixedGrid(Grid):
             channels = (Channel(f, bandwidth) for f in freqs)
 
         super(FixedGrid, self).__init__(channels)
+
+
+def _as_list(values, size=None):
+    """List from a sequence (or numpy array), or a scalar repeated."""
+    if not _is_iterable(values):
+        return [values] * size
+    if hasattr(values, 'tolist'):  # numpy: avoid numpy scalar types
+        return values.tolist()
+    return list(values)
+
+
+class FlexGrid(Grid):
+    """Heterogeneous collection of channels, defined by spectral slices.
+
+    Channel ``i`` occupies ``slice_counts[i]`` slices (of ``resolution``
+    GHz) starting at the slice ``start_slices[i]``, where slice 1 starts at
+    the beginning of the ``frequency_window``. This is the same numbering
+    used by Finisar devices.
+
+    All the arguments can be lists or arrays (e.g. numpy), and ``ports``,
+    ``attenuations`` and ``blocked`` can also be scalars. The specification
+    is validated in a single pass and the channels are built without
+    per-attribute checks, so grids with thousands of channels are created
+    in a few milliseconds.
+
+    Arguments
+    ---------
+    channels : list
+        Already built channels (the other arguments are ignored).
+    start_slices : list
+        First slice of each channel (starting at 1), in ascending order.
+    slice_counts : list
+        Number of slices of each channel.
+    ports : list or int
+    attenuations : list or float
+    blocked : list or bool
+    resolution : float
+        Slice width in GHz. 6.25 by default.
+    frequency_window : tuple
+        Spectral boundaries in THz. ``(191.325, 196.150)`` by default.
+
+    Raises
+    ------
+    OverlappedChannels
+        If the channels overlap or are not in ascending order.
+    OutOfRange
+        If a channel is outside the frequency window.
+    """
+
+    DEFAULT_RESOLUTION = 6.25
+    """Slice width in GHz."""
+
+    DEFAULT_FREQUENCY_WINDOW = (191.325, 196.150)
+    """Spectral boundaries, in THz."""
+
+    def __init__(self,
+                 channels=None,
+                 start_slices=(),
+                 slice_counts=(),
+                 ports=1,
+                 attenuations=0,
+                 blocked=False,
+                 resolution=DEFAULT_RESOLUTION,
+                 frequency_window=DEFAULT_FREQUENCY_WINDOW):
+        if channels is not None:
+            super(FlexGrid, self).__init__(channels)
+            return
+
+        starts = _as_list(start_slices)
+        counts = _as_list(slice_counts)
+        size = len(starts)
+        ports = _as_list(ports, size)
+        attenuations = _as_list(attenuations, size)
+        blocked = _as_list(blocked, size)
+        if not (len(counts) == len(ports) == len(attenuations) ==
+                len(blocked) == size):
+            raise ValueError('All the channel specifications should have '
+                             'the same length ({} start slices given)'
+                             .format(size))
+
+        f0, f1 = frequency_window
+        df = resolution * 1e-3
+        max_slice = int((f1 - f0) / df + TOLERANCE)
+
+        make = Channel._make
+        channels = []
+        next_free = 1
+        for start, count, port, att, block in zip(
+                starts, counts, ports, attenuations, blocked):
+            if start < 1 or count < 1 or start + count - 1 > max_slice:
+                raise OutOfRange(
+                    'Slices {}:{} out of the range 1:{}'.format(
+                        start, start + count - 1, max_slice))
+            if start < next_free:
+                raise OverlappedChannels(
+                    'Channel starting at slice {} overlaps the previous one '
+                    '(or channels are not in ascending order)'.format(start))
+            next_free = start + count
+            channels.append(make((
+                f0 + (start - 1 + count / 2.0) * df,  # central frequency
+                count * resolution,                    # bandwidth
+                att, block, port)))
+
+        # Channels are trusted: skip the checks in Grid.__init__
+        self._channels = channels
+        self._claim()
+
+    @classmethod
+    def from_specs(cls, specs, **kwargs):
+        """Grid from a list of ``(start_slice, slice_count[, port[,
+        attenuation]])`` tuples.
+
+        Raises
+        ------
+        ValueError
+            If a spec does not have 2 to 4 elements.
+        """
+        columns = [], [], [], []
+        defaults = (None, None, 1, 0)
+        for spec in specs:
+            spec = tuple(spec)
+            if not 2 <= len(spec) <= 4:
+                raise ValueError(
+                    'Channel specs should be (start_slice, slice_count'
+                    '[, port[, attenuation]]), got {!r}'.format(spec))
+            spec += defaults[len(spec):]
+            for column, value in zip(columns, spec):
+                column.append(value)
+        return cls(start_slices=columns[0], slice_counts=columns[1],
+                   ports=columns[2], attenuations=columns[3], **kwargs)
+
+    @classmethod
+    def covering(cls, slice_counts=(8,), resolution=DEFAULT_RESOLUTION,
+                 frequency_window=DEFAULT_FREQUENCY_WINDOW, **kwargs):
+        """Grid that fills the whole frequency window, cycling through the
+        given channel widths (in number of slices).
+
+        Example
+        -------
+
+            FlexGrid.covering((4, 6, 8))  # 25, 37.5, 50, 25, ... GHz
+        """
+        slice_counts = tuple(slice_counts)
+        if not slice_counts or min(slice_counts) < 1:
+            raise ValueError('Channels should have at least one slice, got '
+                             '{!r}'.format(slice_counts))
+        f0, f1 = frequency_window
+        max_slice = int((f1 - f0) / (resolution * 1e-3) + TOLERANCE)
+        starts, counts = [], []
+        start = 1
+        for count in cycle(slice_counts):
+            if start + count - 1 > max_slice:
+                break
+            starts.append(start)
+            counts.append(count)
+            start += count
+        return cls(start_slices=starts, slice_counts=counts,
+                   resolution=resolution, frequency_window=frequency_window,
+                   **kwargs)
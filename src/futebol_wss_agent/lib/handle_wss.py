@@ -17,17 +17,30 @@
 import asyncio
 import sys
 
-import serial
-
-from serial_wss import SerialWSS
+# Absolute imports: the module is also run as a script
+from futebol_wss_agent.lib.finisar_serial_adapter import _Communication
+from futebol_wss_agent.lib.serial_wss import SerialWSS
+from futebol_wss_agent.lib.tcp_wss import TcpWSS
 
 
 class HandleWSS(object):
-    def __init__(self, **kwargs):
+    DEFAULT_TIMEOUT = 10.0
+    """Maximum time waiting for the complete response of a query (s)."""
+
+    def __init__(self, transport=None, timeout=DEFAULT_TIMEOUT, **kwargs):
         self._device = '/dev/cu.UC-232AC'
         self._speed = 115200
-        self._wss = serial.Serial(self._device, self._speed) #, rtscts=True, dsrdtr=True)
-        self._wss = SerialWSS(self._wss)
+        self.timeout = timeout
+        if transport is None:
+            import serial  # imported lazily: slow to load
+            transport = serial.Serial(self._device, self._speed) #, rtscts=True, dsrdtr=True)
+            transport = SerialWSS(transport)
+        self._wss = transport
+
+    @classmethod
+    async def connect_tcp(cls, host, port, timeout=DEFAULT_TIMEOUT):
+        """Handle for a WSS behind a serial-over-TCP terminal server."""
+        return cls(await TcpWSS.connect(host, port, timeout=timeout), timeout)
 
     async def goserial(self, data=None, future=None):
         #print(self._wss)
@@ -41,13 +54,32 @@ class HandleWSS(object):
             future.set_result(data)
             await asyncio.sleep(2.78)
 
+    async def query(self, command):
+        """Send a query and return the data in the response (without the
+        framing and the final OK).
+        """
+        await self._wss.write("{}\r\n".format(command).encode())
+        response = await self._wss.read_until(b'OK', self.timeout)
+        return _Communication.response_payload(response.decode())
+
+    async def iter_records(self, command):
+        """Send a query and yield each record of the response as soon as it
+        is received.
+        """
+        await self._wss.write("{}\r\n".format(command).encode())
+        async for record in self._wss.read_records(timeout=self.timeout):
+            yield record
+
     async def read_reconfiguration_array(self):
         """This query reads the configuration of all channels in the channel plan.
            RRA?\r{\n}
            <C>,<P>,<A>{;<C>,<P>,<A>}*(0:Cmax-1)\r\n
            OK\r\n
+
+           Returns a list of tuples (channel, port, attenuation).
         """
-        await test._wss.write("RRA?\r\n".encode())
+        return [(int(c), int(p), float(a))
+                async for c, p, a in self.iter_records("RRA?")]
 
 
     async def update_reconfiguration_array(self, **conf):
@@ -84,8 +116,11 @@ class HandleWSS(object):
             DCC?\r{\n}
             <C>=<S>:<S>{;<C>=<S>:<S>}*(0:Cmax-1)\r\n
             OK\r\n
+
+            Returns a list of tuples (channel, first slice, last slice).
         """
-        await test._wss.write("DCC?\r\n".encode())
+        return [(int(c), int(s0), int(sf))
+                async for c, s0, sf in self.iter_records("DCC?")]
     
     async def start_up_state(self):
         """This query reads the current start-up state of the device
@@ -94,7 +129,7 @@ class HandleWSS(object):
            [SLS|SAB|SFD]\r\n
            OK\r\n
         """
-        await test._wss.write("SUS?\r\n".encode())
+        return await self.query("SUS?")
     
     async def firmware_release(self):
         """This query will return the firmware release version number active on the device.
@@ -102,7 +137,7 @@ class HandleWSS(object):
            [01:255].[00:255].[00:255]{_rc}{[00:255]}\r\n
            OK\r\n
         """
-        await test._wss.write("FWR?\r\n".encode())
+        return await self.query("FWR?")
 
     async def hardware_release(self):
         """This query will return the hardware release for the device (FPGA version).
@@ -110,7 +145,7 @@ class HandleWSS(object):
            [00:255].[00:255].[00:255]\r\n
            OK\r\n
         """
-        await test._wss.write("HWR?\r\n".encode())
+        return await self.query("HWR?")
 
     async def serial_number(self):
         """This query will return the device serial number.
@@ -118,7 +153,7 @@ class HandleWSS(object):
            [EP|EF|SN][000000:999999]\r\n
            OK\r\n
         """
-        await test._wss.write("SNO?\r\n".encode())
+        return await self.query("SNO?")
     
     async def operation_status(self):
         """This query returns the operational status of the device.
@@ -126,7 +161,7 @@ class HandleWSS(object):
            [0x0000:0xFFFF]\r\n
            OK\r\n
         """
-        await test._wss.write("OSS?\r\n".encode())
+        return await self.query("OSS?")
 
 
 async def main(t):
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Lightweight counters and histograms exposed in Prometheus text format.
+
+Every labelled series is allocated once (either up-front, or the first time
+a new combination of labels is used) and updating it afterwards is just an
+increment in a pre-allocated list, so the instrumentation can stay in the
+hot path of the serial communication.
+
+Updates are not synchronized: under heavy contention an increment may
+eventually be lost, which is acceptable for monitoring purposes.
+"""
+from __future__ import absolute_import
+
+import re
+import time
+from bisect import bisect_left
+from threading import Lock
+
+clock = getattr(time, 'perf_counter', time.time)
+"""Monotonic high resolution clock, in seconds."""
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Default histogram upper bounds, in seconds."""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+"""Content type for the Prometheus text exposition format."""
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\')
+            .replace('\n', r'\n').replace('"', r'\"'))
+
+
+def _format_labels(names, values, extra=''):
+    pairs = ['{}="{}"'.format(k, _escape(v)) for k, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer(object):
+    """Context manager that observes the elapsed time in a histogram."""
+
+    __slots__ = ('_series', '_start')
+
+    def __init__(self, series):
+        self._series = series
+        self._start = None
+
+    def __enter__(self):
+        self._start = clock()
+        return self
+
+    def __exit__(self, *_):
+        self._series.observe(clock() - self._start)
+        return False
+
+
+class _CounterSeries(object):
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _HistogramSeries(object):
+    __slots__ = ('_bounds', 'buckets', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self._bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Metric(object):
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Series for the given label values (created on first use)."""
+        try:
+            return self._series[values]
+        except KeyError:
+            if len(values) != len(self.labelnames):
+                raise ValueError('Expected labels {}, got {}'.format(
+                    self.labelnames, values))
+            with self._lock:
+                return self._series.setdefault(values, self._new_series())
+
+    def preallocate(self, *combinations):
+        """Create the series for each combination of label values."""
+        for values in combinations:
+            if not isinstance(values, tuple):
+                values = (values,)
+            self.labels(*values)
+        return self
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} {}'.format(self.name, self.TYPE)]
+        for values in sorted(self._series):
+            lines.extend(self._render_series(values, self._series[values]))
+        return lines
+
+    def _render_series(self, values, series):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    TYPE = 'counter'
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_series(self, values, series):
+        yield '{}{} {}'.format(self.name,
+                               _format_labels(self.labelnames, values),
+                               _format_number(series.value))
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, using fixed buckets.
+
+    Arguments
+    ---------
+    buckets : tuple
+        Sorted upper bounds of the buckets (the ``+Inf`` bucket is implicit).
+    """
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, labelnames,
+                                        registry)
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_series(self, values, series):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),),
+                                series.buckets):
+            cumulative += count
+            yield '{}_bucket{} {}'.format(
+                self.name,
+                _format_labels(self.labelnames, values,
+                               'le="{}"'.format(_format_number(bound))),
+                cumulative)
+        labels = _format_labels(self.labelnames, values)
+        yield '{}_sum{} {}'.format(self.name, labels, repr(series.sum))
+        yield '{}_count{} {}'.format(self.name, labels, series.count)
+
+
+class Registry(object):
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self, select=None):
+        """Metrics in the Prometheus text exposition format.
+
+        Arguments
+        ---------
+        select : callable
+            If given, only the metrics whose name satisfy this predicate are
+            rendered.
+        """
+        lines = []
+        for metric in self._metrics:
+            if select is None or select(metric.name):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+REGISTRY = Registry()
+"""Default registry, exposed by the web agent in ``/metrics``."""
+
+
+# ---- Metrics collected by the agent ----
+
+_MNEMONIC = re.compile(r'\^?\s*([A-Z]{3}\??)', re.I)
+
+FINISAR_COMMANDS = ('CHW', 'DCC', 'DCC?', 'UCA', 'URA', 'RRA?', 'OSS?',
+                    'SUS?', 'FWR?', 'HWR?', 'SNO?')
+"""Mnemonics for which the latency series are pre-allocated."""
+
+ERROR_RESPONSES = ('CER', 'AER', 'RER', 'VER')
+"""Error codes that can be returned by the device."""
+
+COMMIT_PHASES = ('validate', 'diff', 'encode', 'io')
+"""Phases in which the time spent by ``Wss.commit`` is divided."""
+
+SERIAL_COMMAND_SECONDS = Histogram(
+    'wss_serial_command_seconds',
+    'Round-trip time of commands sent to the device.',
+    ['command']).preallocate(*FINISAR_COMMANDS)
+
+SERIAL_BYTES_WRITTEN = Counter(
+    'wss_serial_bytes_written_total',
+    'Bytes written to the device.')
+
+SERIAL_BYTES_READ = Counter(
+    'wss_serial_bytes_read_total',
+    'Bytes read from the device.')
+
+SERIAL_ERROR_RESPONSES = Counter(
+    'wss_serial_error_responses_total',
+    'Error responses returned by the device.',
+    ['code']).preallocate(*ERROR_RESPONSES)
+
+COMMIT_PHASE_SECONDS = Histogram(
+    'wss_commit_phase_seconds',
+    'Time spent in each phase of a WSS commit.',
+    ['phase']).preallocate(*COMMIT_PHASES)
+
+SCHEDULER_PRIORITIES = ('configuration', 'query', 'monitoring')
+"""Priority classes of the serial line scheduler, most urgent first."""
+
+SCHEDULER_WAIT_SECONDS = Histogram(
+    'wss_scheduler_wait_seconds',
+    'Time commands wait for the serial line, by priority class.',
+    ['priority']).preallocate(*SCHEDULER_PRIORITIES)
+
+SCHEDULER_COALESCED = Counter(
+    'wss_scheduler_coalesced_total',
+    'Low priority queries answered by an identical queued query.')
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'wss_http_request_seconds',
+    'Latency of the HTTP requests handled by the agent.',
+    ['route', 'method'])
+
+
+def is_http_metric(name):
+    """True for the metrics collected by the web layer."""
+    return name.startswith('wss_http_')
+
+
+def is_device_metric(name):
+    """True for the metrics collected where the device is handled."""
+    return not is_http_metric(name)
+
+
+def command_mnemonic(command):
+    """Three letter mnemonic (plus ``?`` for queries) of a Finisar command.
+
+    Example
+    -------
+
+        command_mnemonic('^UCA 1,1,0.0;$FE12') # => 'UCA'
+        command_mnemonic('RRA?') # => 'RRA?'
+    """
+    if isinstance(command, bytes):
+        command = command.decode('ascii', 'replace')
+    match = _MNEMONIC.match(command)
+    return match.group(1).upper() if match else 'unknown'
+
+
+def commit_phase(name):
+    """Context manager that times one of the :obj:`COMMIT_PHASES`."""
+    return COMMIT_PHASE_SECONDS.labels(name).time()
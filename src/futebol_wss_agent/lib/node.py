@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""ROADM node: several WSS modules (add/drop, express, ...) that change
+together.
+
+:obj:`Node.commit` is a two-phase commit over the member :obj:`~.wss.Wss`
+objects:
+
+1. every member with pending changes is validated, in parallel. If any of
+   them is invalid nothing is sent;
+2. the members are committed concurrently, one thread per device. If any
+   of them fails, the members already committed are rolled back to their
+   previous state (also concurrently).
+
+So the reconfiguration takes as long as the slowest device, instead of the
+sum of all of them. Members sharing the same adapter (device) are committed
+one after the other, in the same thread.
+
+Usage
+-----
+
+.. code-block:: python
+
+    node = Node({'add-drop': Wss(grid_a, adapter_a),
+                 'express': Wss(grid_b, adapter_b)})
+    with node.transaction():
+        node['add-drop'].grid[0:4].port = 2
+        node['express'].grid[0:4].port = 5
+"""
+from __future__ import absolute_import
+
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+LOG = logging.getLogger(__name__)
+
+
+class NodeCommitError(RuntimeError):
+    """Some members of the node could not be validated or committed.
+
+    Attributes
+    ----------
+    errors : dict
+        Member name => exception raised during validation or commit.
+    rolled_back : list
+        Names of the members restored to their previous state.
+    rollback_errors : dict
+        Member name => exception raised while rolling back (the state of
+        these devices is unknown).
+    """
+
+    def __init__(self, message, errors, rolled_back=(), rollback_errors=None):
+        details = '; '.join('{}: {}'.format(name, err)
+                            for name, err in errors.items())
+        super(NodeCommitError, self).__init__(
+            '{} ({})'.format(message, details))
+        self.errors = errors
+        self.rolled_back = list(rolled_back)
+        self.rollback_errors = rollback_errors or {}
+
+
+class Node(object):
+    """Group of WSS modules committed together.
+
+    Arguments
+    ---------
+    members : dict or list
+        Name => :obj:`~.wss.Wss` (or a list of pairs).
+    max_workers : int
+        Maximum number of devices handled at the same time (by default one
+        thread per device).
+    """
+
+    def __init__(self, members=None, max_workers=None):
+        self.members = OrderedDict(members or ())
+        self.max_workers = max_workers
+        self.version = 0
+        """Number of node commits that changed at least one member."""
+
+    def add(self, name, wss):
+        self.members[name] = wss
+        return wss
+
+    def __getitem__(self, name):
+        return self.members[name]
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    @property
+    def dirty(self):
+        """True if any member may have changed since its last commit."""
+        return any(wss.dirty for wss in self.members.values())
+
+    def _groups(self, names):
+        """Member names grouped by device (adapter)."""
+        groups = OrderedDict()
+        for name in names:
+            adapter = self.members[name].adapter
+            key = name if adapter is None else id(adapter)
+            groups.setdefault(key, []).append(name)
+        return list(groups.values())
+
+    def _run_group(self, func, names, stop_on_error):
+        results, errors = {}, {}
+        for name in names:
+            try:
+                results[name] = func(name, self.members[name])
+            except Exception as err:
+                LOG.error('Member %s of the node failed', name,
+                          exc_info=True)
+                errors[name] = err
+                if stop_on_error:
+                    break
+        return results, errors
+
+    def _run(self, func, names, stop_on_error=False):
+        """Call ``func(name, wss)`` for the members, concurrently for
+        different devices.
+
+        Returns
+        -------
+        tuple
+            Dictionaries with the results and the exceptions, by name.
+        """
+        groups = self._groups(names)
+        results, errors = {}, {}
+        if not groups:
+            return results, errors
+        if len(groups) == 1:
+            return self._run_group(func, groups[0], stop_on_error)
+
+        workers = min(self.max_workers or len(groups), len(groups))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._run_group, func, group,
+                                   stop_on_error)
+                       for group in groups]
+            for future in futures:
+                group_results, group_errors = future.result()
+                results.update(group_results)
+                errors.update(group_errors)
+        return results, errors
+
+    def validate(self, names=None):
+        """Validate the members (all by default) in parallel.
+
+        Raises
+        ------
+        NodeCommitError
+            With the errors of every invalid member.
+        """
+        names = list(self.members) if names is None else names
+        _, errors = self._run(
+            lambda _, wss: wss._run_adapter_hook('validate'), names)
+        if errors:
+            raise NodeCommitError('Invalid node configuration', errors)
+
+    @staticmethod
+    def _restore(wss, state):
+        """Send ``state`` to the device again, keeping the grid (so the
+        changes stay pending).
+        """
+        if state is None:
+            raise RuntimeError('No previous state to restore')
+        desired = wss.grid
+        wss.grid = state.copy()
+        try:
+            wss.commit()
+        finally:
+            wss.grid = desired
+
+    def commit(self, force=False):
+        """Validate every changed member and then commit them concurrently,
+        rolling back the committed ones if any fails.
+
+        Arguments
+        ---------
+        force : bool
+            Commit every member, even without pending changes.
+
+        Returns
+        -------
+        int
+            The current :obj:`version`.
+
+        Raises
+        ------
+        NodeCommitError
+            If a member is invalid (nothing is sent) or fails to commit.
+        """
+        names = [name for name, wss in self.members.items()
+                 if force or wss.dirty]
+        if not names:
+            return self.version
+
+        self.validate(names)
+
+        snapshots = {name: self.members[name].previous_state
+                     for name in names}
+        _, errors = self._run(lambda _, wss: wss.commit(force), names,
+                              stop_on_error=True)
+        if not errors:
+            self.version += 1
+            return self.version
+
+        # Members whose committed state changed, excluding the failed ones
+        committed = [name for name in names
+                     if name not in errors and
+                     self.members[name].previous_state
+                     is not snapshots[name]]
+        _, rollback_errors = self._run(
+            lambda name, wss: self._restore(wss, snapshots[name]), committed)
+        rolled_back = [name for name in committed
+                       if name not in rollback_errors]
+        raise NodeCommitError('Node commit failed', errors, rolled_back,
+                              rollback_errors)
+
+    @contextmanager
+    def transaction(self):
+        """Change several members and commit them together at the end."""
+        yield self
+        self.commit()
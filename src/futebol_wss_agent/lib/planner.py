@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Selection of the cheapest Finisar command sequence for a grid change.
+
+Given the last committed grid and the new one, :obj:`plan_transition`
+enumerates the valid command sequences (full replan, partial ``DCC`` or
+settings only), estimates the cost of each one with a :obj:`CostModel` and
+picks the cheapest.
+
+The settings are always sent with ``UCA``: ``URA`` only prepares a new
+channel array, that would still need to be activated.
+"""
+from __future__ import absolute_import
+
+from collections import namedtuple
+
+from .diff import diff_grids
+from .metrics import command_mnemonic
+
+Transition = namedtuple('Transition', 'same_plan moved changed size')
+"""Comparison between two grids.
+
+Attributes
+----------
+same_plan : bool
+    True if the channels defined in the device can be kept: both grids
+    have the same number of channels, or channels were only inserted (so
+    partial changes are possible).
+moved : list
+    Indexes of the channels whose slice range changed.
+changed : list
+    Indexes of the channels whose port or attenuation changed.
+size : int
+    Number of channels in the new grid.
+"""
+
+
+class Option(namedtuple('Option', 'name commands cost')):
+    """Valid command sequence, with its estimated cost in seconds."""
+
+    @property
+    def size(self):
+        """Number of bytes of the commands (without line terminators)."""
+        return sum(len(command) for command in self.commands)
+
+
+class CostModel(object):
+    """Estimates the time needed to run a sequence of commands.
+
+    Arguments
+    ---------
+    baudrate : int
+        Serial line speed (10 bits are transmitted per byte).
+    command_overhead : float
+        Fixed time spent per command (round-trip and response), in seconds.
+    settle : dict
+        Additional processing time per mnemonic, in seconds. Changing the
+        grid mode (``CHW``) and the channel plan (``DCC``) are much slower
+        than changing port and attenuation.
+    """
+
+    DEFAULT_SETTLE = {'CHW': 1.0, 'DCC': 0.2}
+
+    def __init__(self, baudrate=115200, command_overhead=0.05, settle=None):
+        self.byte_time = 10.0 / baudrate
+        self.command_overhead = command_overhead
+        self.settle = dict(self.DEFAULT_SETTLE if settle is None else settle)
+
+    def command_cost(self, command):
+        return (self.command_overhead + (len(command) + 2) * self.byte_time +
+                self.settle.get(command_mnemonic(command), 0))
+
+    def cost(self, commands):
+        return sum(self.command_cost(command) for command in commands)
+
+
+DEFAULT_COST_MODEL = CostModel()
+
+
+class TransitionPlan(object):
+    """All the valid options for a transition, cheapest first."""
+
+    def __init__(self, transition, options):
+        self.transition = transition
+        self.options = sorted(options,
+                              key=lambda o: (o.cost, len(o.commands)))
+
+    @property
+    def best(self):
+        return self.options[0]
+
+    @property
+    def commands(self):
+        """Commands of the cheapest option."""
+        return self.best.commands
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, ', '.join(
+            '{}={:.3f}s'.format(o.name, o.cost) for o in self.options))
+
+
+def compare_grids(adapter, old, new):
+    """Compare two grids in terms of what is sent to the device.
+
+    Arguments
+    ---------
+    adapter : Adapter
+        Finisar adapter, used to convert channels in slice ranges and wire
+        settings.
+    old : Grid
+        Last committed grid (``None`` if nothing was committed).
+    new : Grid
+        Grid to be committed.
+
+    When channels are inserted, the channels before the first insertion
+    keep their numbers: only the following ones are redefined (see
+    :obj:`~.diff.diff_grids`). Removing channels requires a full replan,
+    because ``DCC`` cannot drop a channel number.
+    """
+    size = len(new)
+    everything = Transition(False, list(range(size)), list(range(size)),
+                            size)
+    if old is None or len(old) > size:
+        return everything
+
+    slices, settings = adapter._slices, adapter._settings
+    first = size
+    if len(old) < size:
+        delta = diff_grids(old, new, key=slices)
+        if delta.deleted:
+            return everything
+        first = min(j for j, _ in delta.inserted)
+
+    moved, changed = [], []
+    for i, a, b in zip(range(first), old, new):
+        if slices(a) != slices(b):
+            moved.append(i)
+        if settings(a) != settings(b):
+            changed.append(i)
+    # Channels from the first insertion on are renumbered
+    moved.extend(range(first, size))
+    changed.extend(range(first, size))
+    return Transition(True, moved, changed, size)
+
+
+def plan_transition(adapter, transition, new, flexgrid=False,
+                    cost_model=None):
+    """Enumerate the valid command sequences for a transition.
+
+    Arguments
+    ---------
+    adapter : Adapter
+        Finisar adapter.
+    transition : Transition
+        Result of :obj:`compare_grids`.
+    new : Grid
+        Grid to be committed.
+    flexgrid : bool
+        True if the device is known to be in flexgrid mode, so ``CHW 0``
+        is not necessary.
+    cost_model : CostModel
+
+    Returns
+    -------
+    TransitionPlan
+    """
+    cost_model = cost_model or DEFAULT_COST_MODEL
+    comm = adapter._comm
+    options = []
+
+    def add(name, commands):
+        options.append(Option(name, commands, cost_model.cost(commands)))
+
+    def settings_of(indexes):
+        return [(i+1, adapter._port(new[i]), adapter._attenuation(new[i]))
+                for i in indexes]
+
+    uca_all = comm.encode_update_channels(settings_of(range(len(new))))
+    mode = [] if flexgrid else [comm.encode_enforce_flexgrid()]
+
+    # Full replan: always valid
+    full_plan = mode + [comm.encode_configure_grid(
+        adapter._slices(channel) for channel in new)]
+    add('full', full_plan + [uca_all])
+
+    if transition.same_plan and transition.moved and flexgrid:
+        # Redefine only the channels that moved. The settings of the
+        # redefined channels are sent again, just in case.
+        partial_plan = [comm.encode_configure_grid_channels(
+            (i+1,) + adapter._slices(new[i]) for i in transition.moved)]
+        touched = sorted(set(transition.moved) | set(transition.changed))
+        add('partial', partial_plan +
+            [comm.encode_update_channels(settings_of(touched))])
+
+    if transition.same_plan and not transition.moved:
+        if transition.changed:
+            add('settings', [comm.encode_update_channels(
+                settings_of(transition.changed))])
+        else:
+            add('unchanged', [])
+
+    return TransitionPlan(transition, options)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Background polling of the device status.
+
+:obj:`StatusPoller` queries the operational status (``OSS?``) and,
+optionally, the channel settings (``RRA?``) in a background thread, with
+:obj:`~.scheduler.MONITORING` priority, and keeps the last result in
+memory. Any number of clients can read it (:obj:`StatusPoller.latest`)
+without generating serial traffic. The status words are also recorded in
+the telemetry (see :mod:`.telemetry`).
+
+The interval adapts to the device: it drops to ``min_interval`` after a
+commit or a change in the status (including the first failure), and grows
+by ``backoff`` after each poll that finds nothing new, up to
+``max_interval``. Installed as an
+observer (see :mod:`.tracing`), the poller is nudged after every commit.
+
+Usage
+-----
+
+.. code-block:: python
+
+    poller = StatusPoller(adapter, settings=True).start()
+    wss.add_observer(poller)
+    poller.latest  # => {'operation_status': 0, 'updated': ..., ...}
+"""
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+
+from .metrics import clock
+from .scheduler import MONITORING, priority
+from .telemetry import record_status
+from .tracing import Observer
+
+LOG = logging.getLogger(__name__)
+
+
+class StatusPoller(Observer):
+    """Polls the device status in background, with an adaptive interval.
+
+    Arguments
+    ---------
+    adapter : Adapter
+        Provides ``operation_status`` and ``read_channel_settings``.
+    settings : bool
+        If True, the channel settings (``RRA?``) are polled too.
+    min_interval : float
+        Interval (s) after commits and changes.
+    max_interval : float
+        Interval (s) when the device is stable.
+    backoff : float
+        Factor applied to the interval after each uneventful poll.
+    """
+
+    COMMIT_HOOKS = ('commit', 'Wss.commit')
+
+    def __init__(self, adapter, settings=False, min_interval=1.0,
+                 max_interval=30.0, backoff=2.0):
+        self.adapter = adapter
+        self.settings = settings
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.polls = 0
+        self._latest = {'status': 'unknown', 'updated': None}
+        self._nudged = False
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def latest(self):
+        """Result of the last poll, as a JSON-friendly dictionary.
+
+        ``status`` is ``ok``, ``alarm`` (non-zero status word), ``error``
+        (the query failed) or ``unknown`` (not polled yet); ``updated`` is
+        the Unix time of the poll.
+        """
+        return self._latest  # replaced, never mutated: safe to share
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start polling in a daemon thread (no-op if already running)."""
+        if not self.running:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='wss-status-poller')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def nudge(self):
+        """Poll as soon as possible, and then often for a while."""
+        self._nudged = True
+        self._wake.set()
+
+    def hook_finished(self, wss, call):
+        if call.name in self.COMMIT_HOOKS:
+            self.nudge()
+
+    def poll(self):
+        """Query the device once, update :obj:`latest` and adapt the
+        interval.
+
+        Returns
+        -------
+        bool
+            True if something changed since the previous poll (e.g. the
+            device started or stopped failing).
+        """
+        previous = self._latest
+        nudged, self._nudged = self._nudged, False  # later nudges count
+        start = clock()
+        result = {'updated': time.time()}
+        try:
+            with priority(MONITORING):
+                word = self.adapter.operation_status()
+                result['operation_status'] = word
+                if self.settings:
+                    result['settings'] = [
+                        {'channel': n, 'port': port, 'attenuation': att}
+                        for n, port, att
+                        in self.adapter.read_channel_settings()]
+        except Exception as err:
+            # Only the first of a series of failures is worth a warning
+            log = LOG.debug if previous['status'] == 'error' else LOG.warning
+            log('Impossible to poll the WSS status: %s', err)
+            result.update(status='error', error=str(err))
+        else:
+            result.update(status='alarm' if word else 'ok', error=None)
+            record_status(word)
+        result['duration'] = clock() - start
+        self.polls += 1
+        result['polls'] = self.polls
+
+        eventful = (result['status'] != previous['status'] or
+                    result.get('operation_status') !=
+                    previous.get('operation_status') or
+                    result.get('settings') != previous.get('settings'))
+        if eventful or nudged:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff,
+                                self.max_interval)
+        result['interval'] = self.interval
+        self._latest = result
+        return eventful
+
+    def _run(self):
+        while not self._stopped.is_set():
+            # Cleared before polling, so a nudge during the poll is kept
+            self._wake.clear()
+            if getattr(self.adapter, 'ready', True):
+                self.poll()
+            else:
+                # Still connecting: check again soon
+                self.interval = self.min_interval
+            self._wake.wait(self.interval)
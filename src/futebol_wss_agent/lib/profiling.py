@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""On-demand profiling of individual requests and commits.
+
+Two modes are available:
+
+- ``deterministic``: :mod:`cProfile`, every call is measured. The profile is
+  stored in the :mod:`pstats` format (``python -m pstats <file>``,
+  snakeviz, ...);
+- ``sampling``: the stack of the profiled thread is sampled at a fixed
+  interval, so the overhead is small even for long operations. The profile
+  is stored as collapsed stacks (``frame;frame;frame count`` lines, for
+  flamegraph.pl or speedscope).
+
+Profiling is switched on for the next operations with :obj:`Profiler.arm`
+(the agent can also honour the ``X-WSS-Profile`` request header). Profiles
+are kept by a :obj:`ProfileStore`, in a directory with bounded size, so
+they can be retrieved later (and by any worker process).
+
+Usage
+-----
+
+.. code-block:: python
+
+    PROFILER.arm('commit', mode='sampling')
+    wss.add_observer(ProfilingObserver(PROFILER))
+    wss.commit()
+    PROFILER.store.list()  # => [{'id': '...-commit', 'mode': ...}]
+"""
+from __future__ import absolute_import
+
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from .tracing import Observer
+
+LOG = logging.getLogger(__name__)
+
+MODES = ('deterministic', 'sampling')
+TARGETS = ('request', 'commit')
+
+_EXTENSIONS = {'deterministic': '.prof', 'sampling': '.txt'}
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class ProfileStore(object):
+    """Profiles on disk: one data file and one JSON metadata file each.
+
+    When the store exceeds ``max_profiles`` or ``max_bytes``, the oldest
+    profiles are removed.
+    """
+
+    def __init__(self, directory=None, max_profiles=50,
+                 max_bytes=50 * 1024 * 1024):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), 'wssagent-profiles')
+        self.max_profiles = max_profiles
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id, extension):
+        if _UNSAFE.search(profile_id):
+            raise KeyError(profile_id)
+        return os.path.join(self.directory, profile_id + extension)
+
+    def save(self, name, mode, data, **meta):
+        """Store a profile and return its id."""
+        profile_id = '{:.6f}-{}'.format(time.time(), _UNSAFE.sub('_', name))
+        meta.update(id=profile_id, name=name, mode=mode, size=len(data),
+                    created=time.time())
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(self._path(profile_id, _EXTENSIONS[mode]), 'wb') as f:
+                f.write(data)
+            with open(self._path(profile_id, '.json'), 'w') as f:
+                json.dump(meta, f)
+            self._evict()
+        return profile_id
+
+    def list(self):
+        """Metadata of the stored profiles, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        profiles.append(json.load(f))
+                except (IOError, OSError, ValueError):
+                    continue  # removed meanwhile (or being written)
+        return profiles
+
+    def metadata(self, profile_id):
+        try:
+            with open(self._path(profile_id, '.json')) as f:
+                return json.load(f)
+        except (IOError, OSError):
+            raise KeyError(profile_id)
+
+    def path(self, profile_id):
+        """Data file of a profile. Raises :obj:`KeyError` if unknown."""
+        meta = self.metadata(profile_id)
+        return self._path(profile_id, _EXTENSIONS[meta['mode']])
+
+    def read(self, profile_id):
+        with open(self.path(profile_id), 'rb') as f:
+            return f.read()
+
+    def _remove(self, meta):
+        for extension in (_EXTENSIONS[meta['mode']], '.json'):
+            try:
+                os.remove(self._path(meta['id'], extension))
+            except OSError:
+                pass
+
+    def _evict(self):
+        profiles = self.list()
+        total = sum(meta['size'] for meta in profiles)
+        while profiles and (len(profiles) > self.max_profiles or
+                            total > self.max_bytes):
+            oldest = profiles.pop(0)
+            total -= oldest['size']
+            self._remove(oldest)
+
+
+class SamplingProfiler(object):
+    """Samples the stack of a thread from a background thread.
+
+    Arguments
+    ---------
+    thread_id : int
+        Thread to sample (by default, the one calling :obj:`start`).
+    interval : float
+        Time (s) between samples.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self._counts = defaultdict(int)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_name(code):
+        return '{} ({}:{})'.format(code.co_name,
+                                   os.path.basename(code.co_filename),
+                                   code.co_firstlineno)
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        if names:
+            self._counts[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.current_thread().ident
+        self._thread = threading.Thread(target=self._run,
+                                        name='wss-sampling-profiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def render(self):
+        """Collapsed stacks, most frequent first."""
+        lines = ['{} {}'.format(stack, count) for stack, count in
+                 sorted(self._counts.items(), key=lambda i: -i[1])]
+        return '\n'.join(lines).encode('utf-8')
+
+
+class _Session(object):
+    """Profiling in progress, see :obj:`Profiler.start`."""
+
+    def __init__(self, profiler, name, mode, meta):
+        self.profiler = profiler
+        self.name = name
+        self.mode = mode
+        self.meta = meta
+        self.profile_id = None
+        self._start = time.time()
+        if mode == 'sampling':
+            self._impl = SamplingProfiler(
+                interval=profiler.sampling_interval)
+            self._impl.start()
+        else:
+            self._impl = cProfile.Profile()
+            self._impl.enable()
+
+    def stop(self):
+        """Stop profiling and store the profile.
+
+        Returns
+        -------
+        str
+            Id of the profile in the store (``None`` if it could not be
+            stored).
+        """
+        if self.profile_id is not None:
+            return self.profile_id
+        duration = time.time() - self._start
+        if self.mode == 'sampling':
+            self._impl.stop()
+            data = self._impl.render()
+            self.meta['samples'] = self._impl.samples
+        else:
+            self._impl.disable()
+            self._impl.create_stats()
+            data = marshal.dumps(self._impl.stats)  # same as dump_stats
+        try:
+            self.profile_id = self.profiler.store.save(
+                self.name, self.mode, data, duration=duration, **self.meta)
+        except (IOError, OSError):
+            LOG.error('Impossible to store the profile', exc_info=True)
+        return self.profile_id
+
+
+class Profiler(object):
+    """Profiles the operations selected on demand.
+
+    Arguments
+    ---------
+    store : ProfileStore
+    sampling_interval : float
+        Time (s) between samples in ``sampling`` mode.
+    """
+
+    MAX_ARMED = 100
+    """Maximum number of pending operations per target."""
+
+    def __init__(self, store=None, sampling_interval=0.005):
+        self.store = store or ProfileStore()
+        self.sampling_interval = sampling_interval
+        self._armed = {target: [None, 0] for target in TARGETS}
+        # target => [mode, number of operations still to be profiled]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def check_mode(mode):
+        if mode not in MODES:
+            raise ValueError('Unknown profiling mode {!r} (use one of {})'
+                             .format(mode, ', '.join(MODES)))
+        return mode
+
+    def arm(self, target, mode='deterministic', count=1):
+        """Profile the next ``count`` operations of the ``target`` kind
+        (``request`` or ``commit``), replacing the previous request for
+        this target. ``count`` is limited to :obj:`MAX_ARMED`.
+        """
+        if target not in TARGETS:
+            raise ValueError('Unknown profiling target {!r} (use one of {})'
+                             .format(target, ', '.join(TARGETS)))
+        self.check_mode(mode)
+        count = max(0, min(int(count), self.MAX_ARMED))
+        with self._lock:
+            self._armed[target] = [mode, count]
+        return self.armed
+
+    def disarm(self):
+        with self._lock:
+            for target in TARGETS:
+                self._armed[target] = [None, 0]
+
+    @property
+    def armed(self):
+        """Number of operations still to be profiled, per target."""
+        return {target: pending[1]
+                for target, pending in self._armed.items()}
+
+    def take(self, target):
+        """Mode for the next ``target`` operation, if it should be
+        profiled (``None`` otherwise).
+        """
+        if not self._armed[target][1]:  # cheap check, without the lock
+            return None
+        with self._lock:
+            pending = self._armed[target]
+            if not pending[1]:
+                return None
+            pending[1] -= 1
+            return pending[0]
+
+    def start(self, name, mode='deterministic', **meta):
+        """Start profiling the current thread. Call ``stop()`` on the
+        returned object to store the profile.
+        """
+        return _Session(self, name, self.check_mode(mode), meta)
+
+    @contextmanager
+    def profile(self, name, mode='deterministic', **meta):
+        """Profile the block. The session (with the ``profile_id``, after
+        the block) is returned.
+        """
+        session = self.start(name, mode, **meta)
+        try:
+            yield session
+        finally:
+            session.stop()
+
+    def summary(self, profile_id, limit=40, sort='cumulative'):
+        """Text report of a profile: the top functions of deterministic
+        profiles, the collapsed stacks of sampling ones.
+        """
+        meta = self.store.metadata(profile_id)
+        if meta['mode'] == 'sampling':
+            return self.store.read(profile_id).decode('utf-8')
+        output = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+        stats = pstats.Stats(self.store.path(profile_id), stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+class ProfilingObserver(Observer):
+    """Profiles the commits selected with ``profiler.arm('commit')``."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._local = threading.local()
+
+    def hook_started(self, wss, call):
+        if call.name != 'Wss.commit':
+            return
+        mode = self.profiler.take('commit')
+        if mode is not None:
+            self._local.session = self.profiler.start(
+                'commit', mode, version=wss.version)
+
+    def hook_finished(self, wss, call):
+        session = getattr(self._local, 'session', None)
+        if call.name != 'Wss.commit' or session is None:
+            return
+        self._local.session = None
+        session.meta['error'] = None if call.error is None else str(
+            call.error)
+        profile_id = session.stop()
+        LOG.info('Commit profiled: %s', profile_id)
+
+
+PROFILER = Profiler(ProfileStore(os.environ.get('WSSAGENT_PROFILE_DIR')))
+"""Default profiler of the agent. Profiles are stored in
+``$WSSAGENT_PROFILE_DIR`` (a temporary directory by default), shared by
+the worker processes.
+"""
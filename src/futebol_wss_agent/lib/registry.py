@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Long-lived adapters, one per device.
+
+Opening the serial port and settling the line takes a couple of seconds, and
+a tty must not be opened twice. :obj:`AdapterRegistry` keeps one
+:obj:`~.finisar_serial_adapter.Adapter` (and therefore one serial connection)
+per device and hands it out to every caller. Before reusing an adapter its
+health is checked: if the connection failed or was lost, the same adapter
+reconnects (lazily, on the next request for it).
+
+Usage
+-----
+
+.. code-block:: python
+
+    adapter = ADAPTERS.adapter('/dev/ttyUSB0', resolution=12.5)
+    wss = Wss(FixedGrid(), adapter)  # no new connection, only commands
+"""
+from __future__ import absolute_import
+
+import logging
+import threading
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_DEVICE = '/dev/ttyUSB0'
+
+
+class AdapterRegistry(object):
+    """Keeps one adapter per device, reconnecting it when unhealthy.
+
+    Arguments
+    ---------
+    factory : callable
+        Creates the adapter for a device, receiving the device and the
+        keyword arguments given to :obj:`adapter`. By default a Finisar
+        :obj:`~.finisar_serial_adapter.Adapter` is created.
+    """
+
+    def __init__(self, factory=None):
+        self._factory = factory or self._finisar_adapter
+        self._adapters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _finisar_adapter(device, **options):
+        from .finisar_serial_adapter import Adapter
+
+        return Adapter(device=device, **options)
+
+    def adapter(self, device=DEFAULT_DEVICE, **options):
+        """Adapter for the device, created on first use.
+
+        The options are only used when the adapter is created. If the
+        existing adapter is unhealthy (and not already reconnecting), a new
+        connection attempt is started, in background if the adapter was
+        created with ``background=True``.
+        """
+        with self._lock:
+            adapter = self._adapters.get(device)
+            if adapter is None:
+                adapter = self._factory(device, **options)
+                self._adapters[device] = adapter
+            elif adapter.settled and not adapter.healthy:
+                LOG.warning('Connection to %s is unhealthy, reconnecting',
+                            device)
+                adapter.reconnect(background=options.get('background',
+                                                         False))
+            return adapter
+
+    def get(self, device=DEFAULT_DEVICE):
+        """Adapter for the device, or ``None`` (no health check)."""
+        return self._adapters.get(device)
+
+    def close(self, device=DEFAULT_DEVICE):
+        """Release the connection to the device and forget its adapter."""
+        with self._lock:
+            adapter = self._adapters.pop(device, None)
+        if adapter is not None:
+            adapter.close()
+
+    def close_all(self):
+        with self._lock:
+            adapters, self._adapters = self._adapters, {}
+        for adapter in adapters.values():
+            try:
+                adapter.close()
+            except Exception:
+                LOG.exception('Error closing %r', adapter)
+
+    def __contains__(self, device):
+        return device in self._adapters
+
+    def __len__(self):
+        return len(self._adapters)
+
+
+ADAPTERS = AdapterRegistry()
+"""Default registry, shared by the whole process."""
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Protection against wedged or disconnected devices.
+
+Every command has a deadline (see :obj:`~.cli.Serial`), idempotent queries
+are retried a bounded number of times with exponential backoff
+(:obj:`RetryPolicy`) and a :obj:`CircuitBreaker` per device fails fast
+while the device is not responding, instead of making every caller wait
+for its own timeout.
+"""
+from __future__ import absolute_import
+
+import logging
+import random
+import threading
+import time
+
+from .metrics import clock
+
+LOG = logging.getLogger(__name__)
+
+
+class DeviceUnavailable(RuntimeError):
+    """Device cannot be used at the moment."""
+
+
+class DeviceTimeout(DeviceUnavailable):
+    """Device did not reply before the deadline."""
+
+
+class CircuitOpen(DeviceUnavailable):
+    """Device failed repeatedly, calls are rejected until it recovers."""
+
+
+TRANSIENT_ERRORS = (DeviceTimeout, IOError, OSError)
+"""Failures that indicate a problem with the device or the connection
+(device error replies, like ``CER``, are not among them).
+"""
+
+
+class RetryPolicy(object):
+    """Bounded retries with exponential backoff.
+
+    Only use it for idempotent operations (queries).
+
+    Arguments
+    ---------
+    attempts : int
+        Maximum number of calls (including the first one).
+    backoff : float
+        Delay before the first retry, in seconds.
+    factor : float
+        Multiplier applied to the delay after each retry.
+    max_backoff : float
+        Upper limit for the delay, in seconds.
+    jitter : float
+        Fraction of the delay that is randomized, so clients retrying at the
+        same time do not stay synchronized.
+    retry_on : tuple
+        Exception types that trigger a retry.
+    """
+
+    def __init__(self, attempts=3, backoff=0.1, factor=2.0, max_backoff=2.0,
+                 jitter=0.1, retry_on=TRANSIENT_ERRORS):
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+
+    def delays(self):
+        """Delays (in seconds) before each retry."""
+        delay = self.backoff
+        for _ in range(self.attempts - 1):
+            yield delay * (1 - self.jitter * random.random())
+            delay = min(delay * self.factor, self.max_backoff)
+
+    def call(self, func, *args, **kwargs):
+        """Call ``func``, retrying if it raises one of :obj:`retry_on`."""
+        for delay in self.delays():
+            try:
+                return func(*args, **kwargs)
+            except self.retry_on as err:
+                LOG.warning('%s failed (%r), retrying in %.3fs',
+                            getattr(func, '__name__', func), err, delay)
+                time.sleep(delay)
+        return func(*args, **kwargs)
+
+
+NO_RETRY = RetryPolicy(attempts=1)
+
+
+class CircuitBreaker(object):
+    """Fails fast while a device is unhealthy.
+
+    After ``failure_threshold`` consecutive failures the circuit *opens* and
+    calls raise :obj:`CircuitOpen` immediately. After ``reset_timeout``
+    seconds the circuit is *half-open*: one call goes through as a probe,
+    closing the circuit if it succeeds or opening it again otherwise.
+
+    Arguments
+    ---------
+    name : str
+        Name of the device, used in messages.
+    failure_threshold : int
+    reset_timeout : float
+        In seconds.
+    failures : tuple
+        Exception types counted as failures. Other exceptions mean that the
+        device answered, so they count as success.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name='wss', failure_threshold=3, reset_timeout=30.0,
+                 failures=TRANSIENT_ERRORS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = failures
+        self.consecutive_failures = 0
+        self.last_error = None
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _before_call(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        raise CircuitOpen('{} is unavailable (circuit {}, last error: {!r})'
+                          .format(self.name, state, self.last_error))
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = error
+            if (self._probing or
+                    self.consecutive_failures >= self.failure_threshold):
+                if self._opened_at is None or self._probing:
+                    LOG.error('Opening circuit for %s after %d failures',
+                              self.name, self.consecutive_failures)
+                self._opened_at = clock()
+            self._probing = False
+
+    def call(self, func, *args, **kwargs):
+        """Call ``func`` if the circuit allows it, tracking the outcome."""
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except self.failures as err:
+            self.record_failure(err)
+            raise
+        except Exception:
+            self.record_success()  # the device replied (e.g. with CER)
+            raise
+        self.record_success()
+        return result
+
+    def __repr__(self):
+        return '{}({!r}, state={!r})'.format(
+            self.__class__.__name__, self.name, self.state)
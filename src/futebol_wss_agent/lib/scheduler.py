@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Priority scheduling of the commands sent through a serial line.
+
+:obj:`CommandScheduler` wraps an interface (e.g. :obj:`~.cli.Serial`) and
+has the same API, so it can be used in its place. Only one command uses the
+line at a time; when it is released, the most urgent waiting command goes
+next:
+
+- :obj:`CONFIGURATION` commands (``DCC``, ``UCA``, ...) go first,
+- then :obj:`QUERY` (queries issued by the agent itself, e.g. ``DCC?``
+  while planning a commit),
+- and :obj:`MONITORING` (background polling) last.
+
+Identical monitoring queries waiting for the line are coalesced: they are
+sent once and every caller gets the same response. To prevent starvation,
+commands are promoted one class for every ``aging`` seconds they wait.
+
+The priority of a command is inferred from its mnemonic. Background tasks
+lower it with :obj:`priority`:
+
+.. code-block:: python
+
+    with priority(MONITORING):
+        adapter.read_device_state()
+"""
+from __future__ import absolute_import
+
+import threading
+from contextlib import contextmanager
+from itertools import count
+
+from .metrics import (SCHEDULER_COALESCED, SCHEDULER_PRIORITIES,
+                      SCHEDULER_WAIT_SECONDS, clock, command_mnemonic)
+
+CONFIGURATION, QUERY, MONITORING = range(3)
+
+_local = threading.local()
+
+
+@contextmanager
+def priority(level):
+    """Send the commands issued by this thread (inside the block) with the
+    given priority class.
+    """
+    previous = getattr(_local, 'level', None)
+    _local.level = level
+    try:
+        yield
+    finally:
+        _local.level = previous
+
+
+def _level_of(command):
+    level = getattr(_local, 'level', None)
+    if level is not None:
+        return level
+    return QUERY if command_mnemonic(command).endswith('?') else CONFIGURATION
+
+
+class _Ticket(object):
+    """Command waiting for the line."""
+
+    __slots__ = ('level', 'seq', 'enqueued', 'key', 'done', 'result',
+                 'error')
+
+    def __init__(self, level, seq, enqueued, key=None):
+        self.level = level
+        self.seq = seq
+        self.enqueued = enqueued
+        self.key = key
+        self.done = threading.Event() if key is not None else None
+        self.result = None
+        self.error = None
+
+
+class CommandScheduler(object):
+    """Serial line shared by concurrent callers, with priority classes.
+
+    Arguments
+    ---------
+    interface : object
+        Object with ``command`` (and optionally ``iter_records``, then
+        available in the scheduler too). Every other attribute
+        (``config``, ``flush``, ``reconnect``, ...) is delegated to it.
+    aging : float
+        Seconds of waiting after which a command is promoted one class.
+    coalesce : bool
+        If True, identical :obj:`MONITORING` queries waiting for the line
+        are sent only once.
+    """
+
+    def __init__(self, interface, aging=2.0, coalesce=True):
+        self.interface = interface
+        self.aging = aging
+        self.coalesce = coalesce
+        self._cond = threading.Condition()
+        self._pending = []
+        self._queued = {}  # key => ticket, for coalescing
+        self._seq = count()
+        self._busy = False
+
+    def __getattr__(self, name):
+        # Only called for attributes not found in the scheduler
+        attr = getattr(self.__dict__['interface'], name)
+        if name == 'iter_records':
+            return self._iter_records
+        return attr
+
+    @property
+    def waiting(self):
+        """Number of commands waiting for the line."""
+        return len(self._pending)
+
+    def _choose(self, now):
+        """Most urgent waiting ticket, considering the time it waited.
+
+        The queue holds a handful of tickets (one per waiting thread), so
+        a linear scan is cheaper than keeping a heap whose keys change as
+        tickets age.
+        """
+        aging = self.aging
+        return min(self._pending, key=lambda t: (
+            t.level - (now - t.enqueued) / aging, t.seq))
+
+    def _acquire(self, level, key=None):
+        """Wait for the turn of a command.
+
+        Returns
+        -------
+        tuple
+            ``(ticket, leader)``: the ticket and True if the caller should
+            send the command, or the ticket of an identical queued command
+            and False.
+        """
+        now = clock()
+        with self._cond:
+            if key is not None:
+                queued = self._queued.get(key)
+                if queued is not None:
+                    return queued, False
+            ticket = _Ticket(level, next(self._seq), now, key)
+            self._pending.append(ticket)
+            if key is not None:
+                self._queued[key] = ticket
+            while self._busy or self._choose(clock()) is not ticket:
+                self._cond.wait()
+            self._pending.remove(ticket)
+            if key is not None:
+                del self._queued[key]
+            self._busy = True
+        SCHEDULER_WAIT_SECONDS.labels(SCHEDULER_PRIORITIES[level]).observe(
+            clock() - now)
+        return ticket, True
+
+    def _release(self):
+        with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+
+    def _execute(self, level, key, func, *args, **kwargs):
+        if not (self.coalesce and level >= MONITORING):
+            key = None
+        ticket, leader = self._acquire(level, key)
+        if not leader:
+            SCHEDULER_COALESCED.inc()
+            ticket.done.wait()
+            if ticket.error is not None:
+                raise ticket.error
+            return ticket.result
+        try:
+            ticket.result = func(*args, **kwargs)
+            return ticket.result
+        except Exception as err:
+            ticket.error = err
+            raise
+        finally:
+            if ticket.done is not None:
+                ticket.done.set()
+            self._release()
+
+    def command(self, command, *args, **kwargs):
+        """Send a command when its turn comes (see :obj:`priority`)."""
+        key = ('command', command) + args + tuple(sorted(kwargs.items()))
+        return self._execute(_level_of(command), key,
+                             self.interface.command, command, *args,
+                             **kwargs)
+
+    def _iter_records(self, command, *args, **kwargs):
+        """Records of a query, read when its turn comes.
+
+        The records are read completely before the line is released (an
+        abandoned iterator cannot hold the line, and the caller can send
+        other commands while iterating). Coalesced monitoring queries share
+        the records.
+        """
+        key = ('iter_records', command) + args + tuple(sorted(kwargs.items()))
+        return iter(self._execute(_level_of(command), key, self._read_records,
+                                  command, *args, **kwargs))
+
+    def _read_records(self, command, *args, **kwargs):
+        return list(self.interface.iter_records(command, *args, **kwargs))
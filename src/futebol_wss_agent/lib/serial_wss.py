@@ -16,38 +16,45 @@
 import asyncio
 import sys
 
-import serial
+from .cli import ErrorResponse
+from .resilience import DeviceTimeout
+from .tokenizer import ResponseTokenizer
 
 
-class SerialWSS(object):
-    def __init__(self, serial, ioloop=None):
-        self._serial = serial
-        # Asynchronous I/O requires non-blocking devices
-        self._serial.timeout = 0
-        self._serial.write_timeout = 0
+class BufferedWSS(object):
+    """Buffering and response parsing shared by the asynchronous transports.
 
+    Subclasses pass the received bytes to :obj:`_on_data` and implement
+    :obj:`write`.
+    """
+
+    def __init__(self, ioloop=None):
         if ioloop is not None:
             self.loop = ioloop
         else:
             self.loop = asyncio.get_event_loop()
-        self.loop.add_reader(self._serial.fd, self._on_read)
         self._rbuf = b''
         self._rbytes = 0
-        self._wbuf = b''
         self._rfuture = None
         self._delimiter = None
+        self._data_waiter = None
+        self._error = None
 
-    def _on_read(self):
-        data = self._serial.read(4096)
+    def _on_data(self, data):
         self._rbuf += data
         self._rbytes = len(self._rbuf)
         self._check_pending_read()
-
-    def _on_write(self):
-        written = self._serial.write(self._wbuf)
-        self._wbuf = self._wbuf[written:]
-        if not self._wbuf:
-            self.loop.remove_writer(self._serial.fd)
+        waiter = self._data_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _on_error(self, error):
+        """Fail the pending and future reads (e.g. connection lost)."""
+        self._error = error
+        for future in (self._rfuture, self._data_waiter):
+            if future is not None and not future.done():
+                future.set_exception(error)
+        self._delimiter = self._rfuture = None
 
     def _check_pending_read(self):
         future = self._rfuture
@@ -61,17 +68,95 @@ class SerialWSS(object):
                 future.set_result(ret)
                 return future
 
-    async def read_until(self, delimiter=b'\n'):
+    async def read_until(self, delimiter=b'\n', timeout=None):
+        """Read until (and including) the delimiter.
+
+        Raises :obj:`~.resilience.DeviceTimeout` if the delimiter is not
+        received in ``timeout`` seconds (the bytes stay in the buffer).
+        """
+        deadline = None if timeout is None else self.loop.time() + timeout
         while self._delimiter:
-            await self._rfuture
+            await self._wait(asyncio.shield(self._rfuture), deadline)
 
         self._delimiter = delimiter
-        self._rfuture = asyncio.Future()
-        #future = self._check_pending_read()
-        return await self._rfuture
+        self._rfuture = future = self.loop.create_future()
+        # The delimiter may already be in the buffer
+        self._check_pending_read()
+        if self._error is not None and not future.done():
+            self._delimiter = self._rfuture = None
+            raise self._error
+        try:
+            return await self._wait(future, deadline)
+        except DeviceTimeout:
+            if self._rfuture is future:
+                self._delimiter = self._rfuture = None
+            raise
+
+    async def _wait(self, future, deadline):
+        if deadline is None:
+            return await future
+        try:
+            return await asyncio.wait_for(
+                future, max(0, deadline - self.loop.time()))
+        except asyncio.TimeoutError:
+            raise DeviceTimeout('No response from the device')
+
+    async def readline(self, timeout=None):
+        return await self.read_until(timeout=timeout)
+
+    async def read_records(self, tokenizer=None, timeout=None):
+        """Yield the records of a response as the bytes arrive, see
+        :obj:`~.tokenizer.ResponseTokenizer`.
+
+        Raises :obj:`~.cli.ErrorResponse` if the device rejected the command
+        and :obj:`~.resilience.DeviceTimeout` if the response is not complete
+        after ``timeout`` seconds.
+        Should not be used concurrently with :obj:`read_until`.
+        """
+        tokenizer = tokenizer or ResponseTokenizer()
+        deadline = None if timeout is None else self.loop.time() + timeout
+        while not tokenizer.done:
+            if not self._rbuf:
+                if self._error is not None:
+                    raise self._error
+                self._data_waiter = self.loop.create_future()
+                try:
+                    await self._wait(self._data_waiter, deadline)
+                finally:
+                    self._data_waiter = None
+                continue
+            data, self._rbuf = self._rbuf, b''
+            for record in tokenizer.feed(data):
+                yield record
+            # Bytes after the end of the response belong to the next one
+            self._rbuf = data[tokenizer.consumed:] + self._rbuf
+            self._rbytes = len(self._rbuf)
+        if tokenizer.error:
+            raise ErrorResponse(tokenizer.error)
 
-    async def readline(self):
-        return await self.read_until()
+    async def write(self, data):
+        raise NotImplementedError
+
+
+class SerialWSS(BufferedWSS):
+    def __init__(self, serial, ioloop=None):
+        super(SerialWSS, self).__init__(ioloop)
+        self._serial = serial
+        # Asynchronous I/O requires non-blocking devices
+        self._serial.timeout = 0
+        self._serial.write_timeout = 0
+
+        self.loop.add_reader(self._serial.fd, self._on_read)
+        self._wbuf = b''
+
+    def _on_read(self):
+        self._on_data(self._serial.read(4096))
+
+    def _on_write(self):
+        written = self._serial.write(self._wbuf)
+        self._wbuf = self._wbuf[written:]
+        if not self._wbuf:
+            self.loop.remove_writer(self._serial.fd)
 
     async def write(self, data):
         need_add_writer = not self._wbuf
@@ -82,6 +167,7 @@ class SerialWSS(object):
         return len(data)
 
 async def go_serial():
+    import serial
     ser = serial.Serial('/dev/ttys015', 9600) #, rtscts=True, dsrdtr=True)
     print(ser)
     aser = SerialWSS(ser)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fast JSON serialization for channels and grids.
+
+The generic path (``dict(channel)`` followed by ``json.dumps``/``jsonify``)
+allocates an intermediate dictionary per channel. The functions in this
+module read the channel fields in a single call and write the JSON text
+directly, producing UTF-8 encoded bytes ready to be sent over the wire.
+"""
+from __future__ import absolute_import
+
+import json
+from math import isinf, isnan
+
+from six import integer_types
+
+from .channel import Channel
+
+_KEYS = tuple('"{}":'.format(k) for k in Channel.FIELDS)
+_INDEX_KEY = '"index":'
+
+
+def _encode_value(value):
+    """JSON representation of a single scalar field."""
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, float):
+        if isnan(value) or isinf(value):
+            return json.dumps(value)
+        return repr(value)
+    if isinstance(value, integer_types):
+        return str(int(value))
+    return json.dumps(value)
+
+
+def _encode_channel(channel, index=None):
+    parts = [k + _encode_value(v)
+             for k, v in zip(_KEYS, channel.astuple())]
+    if index is not None:
+        parts.append(_INDEX_KEY + str(index))
+    return '{' + ','.join(parts) + '}'
+
+
+def channel_to_json(channel):
+    """Serialize a channel to a JSON object.
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON text.
+    """
+    return _encode_channel(channel).encode('utf-8')
+
+
+def grid_to_json(grid, index=False):
+    """Serialize a grid to a JSON array of objects (one per channel).
+
+    Arguments
+    ---------
+    grid : Grid
+        Collection of channels (any iterable of channels is accepted).
+    index : bool
+        If True, each object also includes the position of the channel in
+        the grid, under the ``index`` key.
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON text.
+    """
+    if index:
+        items = (_encode_channel(ch, i) for i, ch in enumerate(grid))
+    else:
+        items = (_encode_channel(ch) for ch in grid)
+    return ('[' + ','.join(items) + ']').encode('utf-8')
+
+
+def grid_to_columns(grid):
+    """Column-oriented representation of the grid.
+
+    Returns
+    -------
+    dict
+        Maps each field in :obj:`Channel.FIELDS` to the list of values for
+        all the channels, in the grid order.
+    """
+    rows = [ch.astuple() for ch in grid]
+    if not rows:
+        return {k: [] for k in Channel.FIELDS}
+    return dict(zip(Channel.FIELDS, (list(col) for col in zip(*rows))))
+
+
+def grid_columns_to_json(grid):
+    """Serialize a grid as a JSON object with one array per field.
+
+    See Also
+    --------
+        :obj:`grid_to_columns`
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON text.
+    """
+    columns = grid_to_columns(grid)
+    return ('{' + ','.join(
+        k + '[' + ','.join(_encode_value(v) for v in columns[name]) + ']'
+        for k, name in zip(_KEYS, Channel.FIELDS)
+    ) + '}').encode('utf-8')
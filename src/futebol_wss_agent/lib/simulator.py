@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Stand-in for a Finisar WSS, for development and testing without
+hardware.
+
+:obj:`FinisarSimulator` keeps the channel plan and the settings in memory
+and answers the commands used by the agent (``CHW``, ``DCC``, ``UCA``,
+``URA`` and the queries) following the wire protocol. :obj:`serve_tcp`
+exposes it like a serial-over-TCP terminal server, so the agent can talk to
+it with :obj:`~.tcp_wss.TcpWSS` or with ``cli.Serial('socket://host:port')``.
+
+Usage
+-----
+
+.. code-block:: bash
+
+    python -m futebol_wss_agent.lib.simulator --port 4001
+"""
+from __future__ import absolute_import
+
+import argparse
+import asyncio
+import logging
+import re
+
+LOG = logging.getLogger(__name__)
+
+_LINE_END = re.compile(br'[\r\n]+')
+
+
+class FinisarSimulator(object):
+    """In-memory Finisar WSS.
+
+    ``DCC`` (re)defines only the channels it mentions, which is what the
+    planner expects from partial channel plan updates. ``URA`` only stages
+    a reconfiguration array (see :obj:`staged`), like the device does: the
+    activation is not simulated, so the settings are changed only by
+    ``UCA``.
+
+    Arguments
+    ---------
+    max_port : int
+    max_attenuation : float
+    max_slice : int
+    """
+
+    IDENTITY = {
+        'SUS?': 'SLS',
+        'FWR?': '1.0.0',
+        'HWR?': '1.0.0',
+        'SNO?': 'SN000000',
+        'OSS?': '0x0000',
+    }
+
+    def __init__(self, max_port=23, max_attenuation=15.0, max_slice=394):
+        self.max_port = max_port
+        self.max_attenuation = max_attenuation
+        self.max_slice = max_slice
+        self.flexgrid = False
+        self.plan = {}
+        """Channel number => (first slice, last slice)."""
+        self.settings = {}
+        """Channel number => (port, attenuation)."""
+        self.staged = None
+        """Settings staged by the last ``URA`` (not applied)."""
+        self.commands = 0
+
+    @staticmethod
+    def _items(arguments):
+        return [item for item in arguments.split(';') if item.strip()]
+
+    def _define_channels(self, arguments):
+        plan = {}
+        for item in self._items(arguments):
+            number, slices = item.split('=')
+            first, last = (int(s) for s in slices.split(':'))
+            if not 1 <= first <= last <= self.max_slice:
+                raise ValueError('Slices out of range')
+            plan[int(number)] = (first, last)
+        self.plan.update(plan)
+
+    def _parse_settings(self, arguments):
+        settings = {}
+        for item in self._items(arguments):
+            number, port, att = item.split(',')
+            port, att = int(port), float(att)
+            blocked = port == 99 or att == 99.9
+            if not blocked and not (0 <= port <= self.max_port and
+                                    0 <= att <= self.max_attenuation):
+                raise ValueError('Settings out of range')
+            settings[int(number)] = (port, att)
+        return settings
+
+    def _update_channels(self, arguments):
+        self.settings.update(self._parse_settings(arguments))
+
+    def _reconfigure_array(self, arguments):
+        self.staged = self._parse_settings(arguments)
+
+    def _channel_plan(self):
+        return ';'.join('{}={}:{}'.format(number, first, last)
+                        for number, (first, last) in sorted(self.plan.items()))
+
+    def _reconfiguration_array(self):
+        return ';'.join('{},{},{:.1f}'.format(number, port, att)
+                        for number, (port, att)
+                        in sorted(self.settings.items()))
+
+    def handle(self, line):
+        """Response (with line terminators) for a single command line."""
+        # Remove the optional framing: ^<command>$<checksum>
+        command = line.strip().lstrip('^').split('$')[0].strip()
+        if not command:
+            return ''
+        self.commands += 1
+        mnemonic, _, arguments = command.partition(' ')
+        mnemonic = mnemonic.upper()
+        try:
+            data = self._execute(mnemonic, arguments)
+        except (ValueError, TypeError):
+            LOG.debug('Invalid command: %r', command, exc_info=True)
+            return 'VER\r\n'
+        except KeyError:
+            return 'CER\r\n'
+        return ('' if data is None else data + '\r\n') + 'OK\r\n'
+
+    def _execute(self, mnemonic, arguments):
+        if mnemonic == 'CHW':
+            self.flexgrid = int(arguments) == 0
+        elif mnemonic == 'DCC':
+            self._define_channels(arguments)
+        elif mnemonic == 'UCA':
+            self._update_channels(arguments)
+        elif mnemonic == 'URA':
+            self._reconfigure_array(arguments)
+        elif mnemonic == 'DCC?':
+            return self._channel_plan()
+        elif mnemonic == 'RRA?':
+            return self._reconfiguration_array()
+        else:
+            return self.IDENTITY[mnemonic]
+        return None
+
+    def handle_bytes(self, buffer):
+        """Execute every complete line in the buffer.
+
+        Returns
+        -------
+        tuple
+            The responses (bytes) and the incomplete bytes left.
+        """
+        *lines, rest = _LINE_END.split(buffer)
+        response = ''.join(self.handle(line.decode('ascii', 'replace'))
+                           for line in lines)
+        return response.encode('ascii'), rest
+
+
+async def _serve_client(simulator, reader, writer, latency):
+    buffer = b''
+    try:
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            response, buffer = simulator.handle_bytes(buffer + data)
+            if response:
+                if latency:
+                    await asyncio.sleep(latency)
+                writer.write(response)
+                await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_tcp(simulator=None, host='127.0.0.1', port=0, latency=0.0):
+    """Expose a simulator through TCP, like a terminal server.
+
+    Arguments
+    ---------
+    port : int
+        ``0`` picks a free port, see ``server.sockets[0].getsockname()``.
+    latency : float
+        Delay (s) added before each response.
+
+    Returns
+    -------
+    asyncio.AbstractServer
+    """
+    simulator = simulator or FinisarSimulator()
+
+    def handler(reader, writer):
+        return _serve_client(simulator, reader, writer, latency)
+
+    server = await asyncio.start_server(handler, host, port)
+    server.simulator = simulator
+    return server
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4001)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Delay before each response, in seconds')
+    opts = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+
+    loop = asyncio.get_event_loop()
+    server = loop.run_until_complete(
+        serve_tcp(host=opts.host, port=opts.port, latency=opts.latency))
+    LOG.info('Finisar simulator listening on %s:%d', opts.host, opts.port)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+
+
+if __name__ == '__main__':
+    main()
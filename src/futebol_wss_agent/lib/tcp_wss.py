@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Asynchronous transport for WSS units behind serial-over-TCP terminal
+servers.
+
+:obj:`TcpWSS` has the same API as :obj:`~.serial_wss.SerialWSS`
+(``write``, ``read_until``, ``readline``, ``read_records``), so it can be
+used by :obj:`~.handle_wss.HandleWSS`. Nagle's algorithm is disabled (the
+commands are small and latency sensitive) and TCP keep-alive is enabled,
+so a dead terminal server is detected even while the line is idle.
+
+Usage
+-----
+
+.. code-block:: python
+
+    wss = await TcpWSS.connect('10.0.0.20', 4001)
+    await wss.write(b'DCC?\\r\\n')
+    records = [r async for r in wss.read_records(timeout=5)]
+"""
+import asyncio
+import socket
+
+from .resilience import DeviceTimeout
+from .serial_wss import BufferedWSS
+
+KEEPALIVE_OPTIONS = (
+    # (option name, value): idle time before probing (s), interval between
+    # probes (s) and number of failed probes before closing.
+    ('TCP_KEEPIDLE', 10),
+    ('TCP_KEEPINTVL', 5),
+    ('TCP_KEEPCNT', 3),
+)
+
+
+def configure_socket(sock, keepalive=True):
+    """Disable Nagle's algorithm and enable TCP keep-alive."""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if keepalive:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for name, value in KEEPALIVE_OPTIONS:
+            option = getattr(socket, name, None)  # platform dependent
+            if option is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, option, value)
+
+
+class _Protocol(asyncio.Protocol):
+    def __init__(self, wss):
+        self._wss = wss
+
+    def connection_made(self, transport):
+        self._wss._transport = transport
+
+    def data_received(self, data):
+        self._wss._on_data(data)
+
+    def connection_lost(self, exc):
+        self._wss._on_error(exc or ConnectionResetError(
+            'Connection to the WSS closed'))
+
+
+class TcpWSS(BufferedWSS):
+    """WSS connected through TCP. Use :obj:`connect` to create it."""
+
+    def __init__(self, ioloop=None):
+        super(TcpWSS, self).__init__(ioloop)
+        self._transport = None
+
+    @classmethod
+    async def connect(cls, host, port, ioloop=None, timeout=10.0,
+                      keepalive=True):
+        """Open the connection.
+
+        Raises :obj:`~.resilience.DeviceTimeout` if it is not established
+        in ``timeout`` seconds.
+        """
+        wss = cls(ioloop)
+        try:
+            await asyncio.wait_for(wss.loop.create_connection(
+                lambda: _Protocol(wss), host, port), timeout)
+        except asyncio.TimeoutError:
+            raise DeviceTimeout('Impossible to connect to {}:{}'.format(
+                host, port))
+        configure_socket(wss._transport.get_extra_info('socket'), keepalive)
+        return wss
+
+    @property
+    def connected(self):
+        return self._transport is not None and self._error is None
+
+    async def write(self, data):
+        if self._error is not None:
+            raise self._error
+        self._transport.write(data)
+        return len(data)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
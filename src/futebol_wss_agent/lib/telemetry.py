@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""History of the device, kept in memory with bounded size.
+
+Each series is a :obj:`RingBuffer`: preallocated arrays (one for the
+timestamps and one per field) where the oldest samples are overwritten. The
+memory used by the agent therefore does not grow with the uptime: it is at
+most ``max_series * capacity`` samples (when the limit of series is reached,
+the least recently updated series is removed, e.g. the channels of an old
+grid plan).
+
+The agent records:
+
+- ``channel/<MHz>``: attenuation, port and blocked flag of each channel
+  (identified by its central frequency in MHz), when a commit changes them
+  (see :obj:`TelemetryObserver`);
+- ``status``: the operational status word read by the poller;
+- ``latency/<mnemonic>``: round-trip time of each command.
+
+Example
+-------
+
+.. code-block:: python
+
+    TELEMETRY.query('latency/UCA', start=time.time() - 3600, points=60)
+    # => {'time': [...], 'seconds': [...]}  (mean of each minute)
+"""
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .diff import diff_grids, spectral_key
+from .metrics import clock
+from .tracing import Observer
+
+LOG = logging.getLogger(__name__)
+
+
+def _mean(values):
+    return sum(values) / float(len(values))
+
+
+def _bitwise_or(values):
+    result = 0
+    for value in values:
+        result |= int(value)
+    return result
+
+
+AGGREGATES = {
+    'mean': _mean,
+    'min': min,
+    'max': max,
+    'last': lambda values: values[-1],
+    'or': _bitwise_or,
+}
+"""Functions used to combine the samples that fall in the same bucket when
+a query is downsampled.
+"""
+
+
+class _Timeline(object):
+    """Timestamps of a ring buffer in chronological order (for bisect)."""
+
+    __slots__ = ('times', 'first', 'size', 'capacity')
+
+    def __init__(self, times, first, size):
+        self.times = times
+        self.first = first
+        self.size = size
+        self.capacity = len(times)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.times[(self.first + i) % self.capacity]
+
+
+class RingBuffer(object):
+    """Fixed-size series of samples, backed by :obj:`array.array`.
+
+    Arguments
+    ---------
+    fields : tuple
+        Name of each value in a sample.
+    capacity : int
+        Number of samples kept. Older samples are overwritten.
+    typecodes : str
+        :obj:`array.array` type code for each field (``'d'`` by default).
+    aggregates : tuple
+        Name of the function (see :obj:`AGGREGATES`) used to combine each
+        field when downsampling (``'mean'`` by default).
+    """
+
+    def __init__(self, fields, capacity=1024, typecodes=None,
+                 aggregates=None):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        typecodes = typecodes or 'd' * len(self.fields)
+        self.aggregates = tuple(aggregates or ('mean',) * len(self.fields))
+        if not len(typecodes) == len(self.aggregates) == len(self.fields):
+            raise ValueError('One type code and aggregate per field')
+        self._times = array('d', [0.0]) * capacity
+        self._columns = [array(code, [0]) * capacity for code in typecodes]
+        self._next = 0
+        self._size = 0
+        self.appended = 0.0
+        """When the last sample was appended (see :obj:`~.metrics.clock`)."""
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Memory used by the samples."""
+        return sum(a.itemsize * len(a) for a in [self._times] + self._columns)
+
+    def append(self, values, timestamp=None):
+        """Add a sample (one value per field), by default at the current
+        time. Timestamps never go backwards, so the buffer stays sorted.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            i = self._next
+            if self._size:
+                timestamp = max(timestamp, self._times[i - 1])
+            self._times[i] = timestamp
+            for column, value in zip(self._columns, values):
+                column[i] = value
+            self._next = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+            self.appended = clock()
+
+    def _slice(self, column, first, lo, hi):
+        """Chronological items ``lo:hi`` of a column, copied."""
+        a, b = first + lo, first + hi
+        if b <= self.capacity:
+            return column[a:b]
+        if a >= self.capacity:
+            return column[a - self.capacity:b - self.capacity]
+        return column[a:] + column[:b - self.capacity]
+
+    def query(self, start=None, stop=None, points=None):
+        """Samples with ``start <= time <= stop``.
+
+        Arguments
+        ---------
+        points : int
+            If given, and there are more samples, the range is divided in
+            this number of equal intervals and the samples in each interval
+            are combined (see ``aggregates``).
+
+        Returns
+        -------
+        dict
+            ``time`` and each field mapped to the list of values, in
+            chronological order. Downsampled buckets are timestamped with
+            their last sample.
+        """
+        with self._lock:
+            first = (self._next - self._size) % self.capacity
+            timeline = _Timeline(self._times, first, self._size)
+            lo = 0 if start is None else bisect_left(timeline, start)
+            hi = (self._size if stop is None
+                  else bisect_right(timeline, stop))
+            hi = max(lo, hi)
+            times = self._slice(self._times, first, lo, hi)
+            columns = [self._slice(c, first, lo, hi) for c in self._columns]
+
+        if points and len(times) > points:
+            times, columns = self._downsample(times, columns, points)
+        result = {'time': list(times)}
+        result.update(zip(self.fields, (list(c) for c in columns)))
+        return result
+
+    def _downsample(self, times, columns, points):
+        """Combine the samples in ``points`` intervals of equal duration.
+        The boundaries are found by bisection and each bucket is aggregated
+        from an array slice, so the work per sample is done in C.
+        """
+        t0 = times[0]
+        width = (times[-1] - t0) / float(points)
+        edges = [bisect_right(times, t0 + width * (k + 1))
+                 for k in range(points - 1)]
+        edges.append(len(times))
+        functions = [AGGREGATES[name] for name in self.aggregates]
+        bucket_times = []
+        results = [[] for _ in columns]
+        lo = 0
+        for hi in edges:
+            if hi > lo:
+                bucket_times.append(times[hi - 1])
+                for column, result, func in zip(columns, results, functions):
+                    result.append(func(column[lo:hi]))
+            lo = hi
+        return bucket_times, results
+
+
+class Telemetry(object):
+    """Named ring buffers.
+
+    Arguments
+    ---------
+    capacity : int
+        Samples kept by each series.
+    max_series : int
+        Maximum number of series. After this limit, the least recently
+        updated series is removed to make room for a new one, so memory
+        stays bounded.
+    """
+
+    def __init__(self, capacity=1024, max_series=2048):
+        self.capacity = capacity
+        self.max_series = max_series
+        self._series = {}
+        self._lock = threading.Lock()
+        self._evicted = False
+
+    def series(self, name, fields=('value',), **kwargs):
+        """Ring buffer for ``name``, created (with the given fields and
+        :obj:`RingBuffer` options) if necessary.
+        """
+        try:
+            return self._series[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._series:
+                while self._series and len(self._series) >= self.max_series:
+                    self._evict()
+                kwargs.setdefault('capacity', self.capacity)
+                self._series[name] = RingBuffer(fields, **kwargs)
+            return self._series[name]
+
+    def _evict(self):
+        """Remove the least recently updated series (with the lock held)."""
+        name = min(self._series, key=lambda n: self._series[n].appended)
+        del self._series[name]
+        if not self._evicted:  # only the first time: it happens routinely
+            self._evicted = True
+            LOG.warning('Telemetry series limit (%d) reached, removing the '
+                        'least recently updated series', self.max_series)
+        LOG.debug('Telemetry series %s removed', name)
+
+    def record(self, name, values, fields=('value',), timestamp=None,
+               **kwargs):
+        """Append a sample to a series (see :obj:`series`)."""
+        self.series(name, fields, **kwargs).append(values, timestamp)
+
+    def names(self, prefix=''):
+        return sorted(name for name in list(self._series)
+                      if name.startswith(prefix))
+
+    def query(self, name, start=None, stop=None, points=None):
+        """See :obj:`RingBuffer.query`. Raises :obj:`KeyError` for unknown
+        series.
+        """
+        series = self._series[name]
+        result = series.query(start, stop, points)
+        result['fields'] = list(series.fields)
+        return result
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in list(self._series.values()))
+
+
+TELEMETRY = Telemetry()
+"""Default store, exposed by the web agent in ``/api/v1/telemetry``."""
+
+CHANNEL_FIELDS = dict(fields=('attenuation', 'port', 'blocked'),
+                      typecodes='dhb', aggregates=('mean', 'last', 'max'))
+STATUS_FIELDS = dict(fields=('operation_status',), typecodes='l',
+                     aggregates=('or',))
+LATENCY_FIELDS = dict(fields=('seconds',), typecodes='d',
+                      aggregates=('mean',))
+
+
+def channel_series_name(channel):
+    """Name of the series of a channel: its central frequency in MHz."""
+    return 'channel/{}'.format(spectral_key(channel)[0])
+
+
+def record_channels(channels, telemetry=None, timestamp=None):
+    """Record attenuation, port and blocked flag of the channels."""
+    telemetry = TELEMETRY if telemetry is None else telemetry
+    timestamp = time.time() if timestamp is None else timestamp
+    for channel in channels:
+        telemetry.record(channel_series_name(channel),
+                         (channel.attenuation, channel.port, channel.blocked),
+                         timestamp=timestamp, **CHANNEL_FIELDS)
+
+
+def record_status(word, telemetry=None):
+    telemetry = TELEMETRY if telemetry is None else telemetry
+    telemetry.record('status', (word,), **STATUS_FIELDS)
+
+
+def record_latency(mnemonic, seconds, telemetry=None):
+    telemetry = TELEMETRY if telemetry is None else telemetry
+    telemetry.record('latency/' + mnemonic, (seconds,), **LATENCY_FIELDS)
+
+
+class TelemetryObserver(Observer):
+    """Records the channels changed by each successful commit."""
+
+    def __init__(self, telemetry=None):
+        self.telemetry = telemetry
+        self._before = threading.local()
+
+    def hook_started(self, wss, call):
+        if call.name == 'Wss.commit':
+            self._before.state = wss.previous_state
+
+    def hook_finished(self, wss, call):
+        if call.name != 'Wss.commit' or call.error is not None:
+            return
+        before = getattr(self._before, 'state', None)
+        after = wss.previous_state
+        if after is None or after is before:
+            return  # nothing was sent
+        delta = diff_grids(before, after)
+        changed = [after[j] for j, _ in delta.inserted]
+        changed.extend(after[j] for _, j, _ in delta.updated)
+        record_channels(changed, self.telemetry)
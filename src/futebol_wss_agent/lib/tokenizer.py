@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Incremental parser for Finisar list responses.
+
+Responses to queries like ``RRA?`` (``<C>,<P>,<A>{;<C>,<P>,<A>}``) and
+``DCC?`` (``<C>=<S>:<S>{;<C>=<S>:<S>}``) can be long for a full flexgrid
+plan. :obj:`ResponseTokenizer` consumes the bytes as they arrive from the
+device and produces each record (a tuple of numbers) as soon as its
+terminator is received, so parsing overlaps with the transfer. Numbers are
+accumulated digit by digit, without building intermediate strings.
+
+Usage
+-----
+
+.. code-block:: python
+
+    tokenizer = ResponseTokenizer()
+    for chunk in chunks_from_device:
+        for record in tokenizer.feed(chunk):
+            print(record)  # e.g. (1, 3, 0.5)
+        if tokenizer.done:
+            break
+"""
+from __future__ import absolute_import
+
+_DIGIT_0 = ord('0')
+_DIGIT_9 = ord('9')
+_DOT = ord('.')
+_MINUS = ord('-')
+_CARET = ord('^')
+_DOLLAR = ord('$')
+_SEPARATORS = frozenset(map(ord, '=:,'))
+_RECORD_END = ord(';')
+_LINE_END = frozenset(map(ord, '\r\n'))
+_IGNORED = frozenset(map(ord, ' \t'))
+
+ERROR_CODES = ('CER', 'AER', 'RER', 'VER')
+"""Words that the device replies instead of ``OK`` when a command fails."""
+
+
+class ResponseTokenizer(object):
+    """Incremental parser for responses composed by a list of records.
+
+    Fields are separated by ``=``, ``:`` or ``,``; records by ``;`` or line
+    breaks. The framing (``^`` and ``$<checksum>``) is skipped. The response
+    is complete when the line ``OK`` or an error code is received.
+
+    Attributes
+    ----------
+    done : bool
+        True when the response is complete.
+    error : str
+        Error code (e.g. ``CER``) if the device rejected the command.
+    consumed : int
+        Number of bytes of the last chunk passed to :obj:`feed` that belong
+        to this response. The remaining bytes belong to the next response.
+    """
+
+    def __init__(self):
+        self.done = False
+        self.error = None
+        self.consumed = 0
+        self._fields = []
+        self._word = bytearray()
+        self._reset_number()
+        self._in_checksum = False
+
+    def _reset_number(self):
+        self._number = 0
+        self._decimals = -1  # -1 while no decimal point was seen
+        self._negative = False
+        self._has_number = False
+
+    def _end_field(self):
+        if self._has_number:
+            value = -self._number if self._negative else self._number
+            if self._decimals >= 0:
+                value = value / float(10 ** self._decimals)
+            self._fields.append(value)
+            self._reset_number()
+
+    def _end_record(self):
+        self._end_field()
+        if self._fields:
+            record = tuple(self._fields)
+            self._fields = []
+            return record
+        return None
+
+    def _end_line(self):
+        record = self._end_record()
+        if self._word:
+            word = bytes(self._word).decode('ascii', 'replace').upper()
+            del self._word[:]
+            if word == 'OK':
+                self.done = True
+            elif word in ERROR_CODES:
+                self.error = word
+                self.done = True
+        self._in_checksum = False
+        return record
+
+    def feed(self, data):
+        """Parse a chunk of bytes, yielding each complete record.
+
+        Iteration stops once the response is complete (see :obj:`consumed`).
+        """
+        self.consumed = 0
+        data = bytearray(data)
+        for position, byte in enumerate(data):
+            if byte in _LINE_END:
+                record = self._end_line()
+                if record is not None:
+                    yield record
+                if self.done:
+                    # Include the \n of a final \r\n
+                    end = position + 1
+                    if data[end:end + 1] == b'\n' and byte != data[end]:
+                        end += 1
+                    self.consumed = end
+                    return
+            elif self._in_checksum:
+                continue
+            elif _DIGIT_0 <= byte <= _DIGIT_9:
+                self._number = self._number * 10 + (byte - _DIGIT_0)
+                self._has_number = True
+                if self._decimals >= 0:
+                    self._decimals += 1
+            elif byte in _SEPARATORS:
+                self._end_field()
+            elif byte == _RECORD_END:
+                record = self._end_record()
+                if record is not None:
+                    yield record
+            elif byte == _DOT:
+                self._decimals = 0
+            elif byte == _MINUS:
+                self._negative = True
+            elif byte == _DOLLAR:
+                self._end_field()
+                self._in_checksum = True
+            elif byte == _CARET or byte in _IGNORED:
+                continue
+            else:
+                self._word.append(byte)
+        self.consumed = len(data)
+
+    def close(self):
+        """Flush the last record, for payloads without final line break.
+
+        Returns
+        -------
+        tuple or None
+        """
+        return self._end_line()
+
+
+def parse_records(payload):
+    """Parse a complete response (or payload without framing).
+
+    Arguments
+    ---------
+    payload : str or bytes
+
+    Returns
+    -------
+    tuple
+        List of records (tuples of numbers) and the error code returned by
+        the device (``None`` if the command succeeded).
+    """
+    if not isinstance(payload, (bytes, bytearray)):
+        payload = payload.encode('ascii')
+    tokenizer = ResponseTokenizer()
+    records = list(tokenizer.feed(payload))
+    if not tokenizer.done:
+        last = tokenizer.close()
+        if last is not None:
+            records.append(last)
+    return records, tokenizer.error
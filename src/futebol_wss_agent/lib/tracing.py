@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Anderson Bravalheri, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Instrumentation of the WSS adapter hooks.
+
+Observers can be installed in a :obj:`~.wss.Wss` object (or in the class, to
+affect every instance) with :obj:`~.wss.Wss.add_observer`. They are notified
+before and after every adapter hook (``init``, ``validate``, ``commit``,
+``begin_transaction``, ...), and also around the whole ``Wss.commit`` and
+``Wss.transaction`` operations, that appear with these (dotted) names.
+
+Usage
+-----
+
+.. code-block:: python
+
+    tracer = SpanTracer(callback=lambda span: print(span.format()))
+    wss.add_observer(tracer)
+
+    with wss.transaction():
+        wss.grid[0:4].port = 2
+
+    # Wss.transaction 12.204ms
+    #   begin_transaction 0.002ms
+    #   Wss.commit 12.180ms
+    #     validate 0.315ms
+    #     commit 11.842ms
+    #       diff 0.410ms
+    #       encode 0.121ms
+    #       io 11.301ms
+    #   finish_transaction 0.001ms
+"""
+from __future__ import absolute_import
+
+import logging
+import threading
+from collections import deque
+
+from .metrics import clock
+
+LOG = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class HookCall(object):
+    """Record of a single call, as seen by observers.
+
+    Attributes
+    ----------
+    name : str
+        Name of the hook (or operation).
+    args : tuple
+        Positional arguments passed to the hook (after the WSS object).
+    kwargs : dict
+        Keyword arguments passed to the hook.
+    start : float
+        Timestamp (see :obj:`~.metrics.clock`) before calling the hook.
+    stop : float
+        Timestamp after the hook returned or raised. ``None`` while running.
+    result : object
+        Value returned by the hook.
+    error : Exception
+        Exception raised by the hook, if any.
+    """
+
+    __slots__ = ('name', 'args', 'kwargs', 'start', 'stop', 'result', 'error')
+
+    def __init__(self, name, args=(), kwargs=None):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.start = clock()
+        self.stop = None
+        self.result = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """Elapsed time in seconds (``None`` while running)."""
+        return None if self.stop is None else self.stop - self.start
+
+    def __repr__(self):
+        return '{}({!r}, duration={})'.format(
+            self.__class__.__name__, self.name, self.duration)
+
+
+class Observer(object):
+    """Base class for hook observers. Subclasses override what they need."""
+
+    def hook_started(self, wss, call):
+        """Called before the hook runs."""
+
+    def hook_finished(self, wss, call):
+        """Called after the hook runs, even if it raised an exception."""
+
+
+def notify(observers, method, wss, call):
+    """Notify each observer. Failures are logged but never propagated,
+    so instrumentation cannot break the configuration of the device.
+    """
+    for observer in observers:
+        try:
+            getattr(observer, method)(wss, call)
+        except Exception:
+            LOG.exception('Observer %r failed in %s', observer, method)
+
+
+class Span(object):
+    """Node in a tree of timed operations."""
+
+    __slots__ = ('name', 'start', 'stop', 'error', 'children')
+
+    def __init__(self, name, start=None):
+        self.name = name
+        self.start = clock() if start is None else start
+        self.stop = None
+        self.error = None
+        self.children = []
+
+    @property
+    def duration(self):
+        return None if self.stop is None else self.stop - self.start
+
+    def to_dict(self):
+        """Plain (JSON-friendly) representation of the tree."""
+        return {
+            'name': self.name,
+            'start': self.start,
+            'duration': self.duration,
+            'error': None if self.error is None else repr(self.error),
+            'children': [child.to_dict() for child in self.children],
+        }
+
+    def format(self, indent=0):
+        """Human readable representation of the tree, one span per line."""
+        duration = self.duration
+        line = '{}{} {}'.format(
+            '  ' * indent, self.name,
+            'unfinished' if duration is None
+            else '{:.3f}ms'.format(duration * 1e3))
+        if self.error is not None:
+            line += ' [{!r}]'.format(self.error)
+        return '\n'.join([line] + [child.format(indent + 1)
+                                   for child in self.children])
+
+    def __repr__(self):
+        return '{}({!r}, duration={})'.format(
+            self.__class__.__name__, self.name, self.duration)
+
+
+class SpanTracer(Observer):
+    """Observer that assembles nested hook calls into span trees.
+
+    The outermost call (usually ``Wss.transaction`` or ``Wss.commit``)
+    becomes the root of the tree. Inner hooks and the phases reported with
+    :obj:`span` become children. Each tree is emitted once its root
+    finishes.
+
+    Arguments
+    ---------
+    callback : callable
+        Receives each finished root :obj:`Span`. By default the tree is
+        written to the log, at the DEBUG level.
+    history : int
+        Number of finished trees kept in :obj:`traces`.
+    """
+
+    def __init__(self, callback=None, history=100):
+        self.callback = callback or self._log
+        self.traces = deque(maxlen=history)
+        self._local = threading.local()
+
+    @staticmethod
+    def _log(span):
+        LOG.debug('Trace:\n%s', span.format())
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def hook_started(self, wss, call):
+        stack = self._stack()
+        span = Span(call.name, call.start)
+        if stack:
+            stack[-1].children.append(span)
+        else:
+            _active_stacks().append(stack)
+        stack.append(span)
+
+    def hook_finished(self, wss, call):
+        stack = self._stack()
+        if not stack:
+            return
+        span = stack.pop()
+        span.stop = call.stop
+        span.error = call.error
+        if not stack:
+            _active_stacks().remove(stack)
+            self.traces.append(span)
+            self.callback(span)
+
+
+def _active_stacks():
+    try:
+        return _local.stacks
+    except AttributeError:
+        stacks = _local.stacks = []
+        return stacks
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ChildSpans(object):
+    def __init__(self, name, stacks):
+        self._name = name
+        self._stacks = list(stacks)
+        self._spans = []
+
+    def __enter__(self):
+        start = clock()
+        for stack in self._stacks:
+            span = Span(self._name, start)
+            stack[-1].children.append(span)
+            stack.append(span)
+            self._spans.append(span)
+        return self._spans
+
+    def __exit__(self, _type, error, _tb):
+        stop = clock()
+        for stack, span in zip(self._stacks, self._spans):
+            span.stop = stop
+            span.error = error
+            stack.remove(span)
+        return False
+
+
+def span(name):
+    """Context manager that reports a phase inside the running hook.
+
+    It is a no-op unless a :obj:`SpanTracer` is tracing the current thread,
+    so adapters can use it freely.
+    """
+    stacks = getattr(_local, 'stacks', None)
+    if not stacks:
+        return _NULL_SPAN
+    return _ChildSpans(name, stacks)
@@ -21,17 +21,27 @@ import sys
 from contextlib import contextmanager
 from warnings import warn
 
-from jsondiff import diff
-
+from .diff import diff_grids
 from .grid import Grid
+from .metrics import clock, commit_phase
+from .tracing import HookCall, notify
 from .verification import UndefinedAdapter
 
 
 class Wss(object):
     """Data structure that represents a WSS"""
 
+    observers = ()
+    """Objects notified around each adapter hook (see :mod:`.tracing`).
+    Assigning to the class attribute affects every instance.
+    """
+
     def __init__(self, channels, adapter=None):
+        self.version = 0
+        """Number of commits that changed the device configuration."""
         self.previous_state = None
+        self._committed = (None, 0, None)
+        # (grid clock, clock value, previous_state) at the last commit
         self.grid = channels
         self.adapter = adapter
         if self.adapter is None:
@@ -42,9 +52,37 @@ class Wss(object):
         """\
         If adapter provide hook, run it, with the object as first argument.
         """
-        if hasattr(self.adapter, name):
-            return getattr(self.adapter, name)(self, *args, **kwargs)
-        return None
+        hook = getattr(self.adapter, name, None)
+        if hook is None:
+            return None
+        if not self.observers:
+            return hook(self, *args, **kwargs)
+        return self._run_observed(name, hook, args, kwargs)
+
+    def _run_observed(self, name, func, args=(), kwargs=None):
+        """Run ``func(self, *args, **kwargs)`` notifying the observers
+        before and after it.
+        """
+        observers = self.observers
+        call = HookCall(name, args, kwargs)
+        notify(observers, 'hook_started', self, call)
+        try:
+            call.result = func(self, *args, **call.kwargs)
+            return call.result
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            call.stop = clock()
+            notify(reversed(observers), 'hook_finished', self, call)
+
+    def add_observer(self, observer):
+        """Install an observer for the adapter hooks of this object."""
+        self.observers = tuple(self.observers) + (observer,)
+
+    def remove_observer(self, observer):
+        """Uninstall an observer previously added to this object."""
+        self.observers = tuple(o for o in self.observers if o is not observer)
 
     @property
     def grid(self):
@@ -52,38 +90,114 @@ class Wss(object):
 
     @grid.setter
     def grid(self, value):
-        self._grid = Grid(sorted(value, key=lambda ch: ch.central_frequency))
+        # Keep the clock of the given grid, so changes made through it are
+        # still seen by ``dirty``
+        self._grid = Grid(sorted(value, key=lambda ch: ch.central_frequency),
+                          getattr(value, '_clock', None))
 
-    def commit(self):
+    def commit(self, force=False, dry_run=False):
         """Use the given adapter to send the pending changes to the equipment.
 
         After committing the previous state is updated to the current state.
+        If nothing changed since the last commit, the adapter is not used
+        (unless ``force`` is True).
+
+        With ``dry_run`` the grid is validated and encoded by the adapter
+        (``encode`` hook), but nothing is sent and the state is kept.
+
+        Returns
+        -------
+        int or list
+            The current :obj:`version`, or the byte strings that would be
+            sent, for dry runs (``None`` if the adapter cannot encode).
         """
-        try:
+        if self.observers:
+            return self._run_observed('Wss.commit', Wss._commit,
+                                      (force, dry_run))
+        return self._commit(force, dry_run)
+
+    def _commit(self, force=False, dry_run=False):
+        if dry_run:
             self._run_adapter_hook('validate')
+            return self._run_adapter_hook('encode')
+        if not force and (not self.dirty or self._unchanged()):
+            self._mark_committed()
+            return self.version
+        try:
+            with commit_phase('validate'):
+                self._run_adapter_hook('validate')
             self._run_adapter_hook('commit')
         except Exception as err:
             raise
         else:
             self.previous_state = self.grid.copy().freeze()
+            self.version += 1
+            self._mark_committed()
+            return self.version
+
+    def _mark_committed(self):
+        clock = self._grid._clock
+        self._committed = (clock, clock.value, self.previous_state)
+
+    def _unchanged(self):
+        """True if the grid is equal to the last committed state.
+
+        Compares the field values channel by channel, which is much cheaper
+        than computing the difference.
+        """
+        previous = self.previous_state
+        if previous is None or len(previous) != len(self.grid):
+            return False
+        return all(a.astuple() == b.astuple()
+                   for a, b in zip(self.grid, previous))
 
     @contextmanager
     def transaction(self):
         """Creates a context were several properties can be updates, and after
         if commit the change.
         """
-        self._run_adapter_hook('begin_transaction')
+        observers = self.observers
+        if observers:
+            call = HookCall('Wss.transaction')
+            notify(observers, 'hook_started', self, call)
         try:
-            yield
-            self.commit()
+            self._run_adapter_hook('begin_transaction')
+            try:
+                yield
+                self.commit()
+            except Exception as err:
+                if self._run_adapter_hook('rescue_transaction', err) is False:
+                    raise err
+            else:
+                self._run_adapter_hook('finish_transaction')
         except Exception as err:
-            if self._run_adapter_hook('rescue_transaction', err) is False:
-                raise err
-        else:
-            self._run_adapter_hook('finish_transaction')
+            if observers:
+                call.error = err
+            raise
+        finally:
+            if observers:
+                call.stop = clock()
+                notify(reversed(observers), 'hook_finished', self, call)
+
+    def delta(self, **kwargs):
+        """Difference between the previous and the current state, matching
+        channels by their place in the spectrum (see :obj:`.diff.diff_grids`).
+
+        Returns
+        -------
+        GridDiff
+        """
+        return diff_grids(self.previous_state, self.grid, **kwargs)
 
     def changes(self, **kwargs):
-        """Dictionary difference between current and previous state."""
+        """Dictionary difference between current and previous state
+        (``jsondiff`` format, channels compared by position).
+
+        See :obj:`delta` for a faster difference that matches channels by
+        their place in the spectrum.
+        """
+        from jsondiff import diff  # only needed here
+
         options = dict(syntax='explicit')
         options.update(kwargs)
         options.update(dump=True)
@@ -96,5 +210,22 @@ class Wss(object):
 
     @property
     def dirty(self):
-        """True if any channel changed since the last commit."""
-        return bool(self.changes(syntax='symmetric'))
+        """True if the grid may have changed since the last commit.
+
+        Answered in constant time from the version clock of the grid (see
+        :obj:`.grid.Grid.version`), so a value changed and then restored
+        still counts as dirty until the next commit. If the grid was
+        replaced since the last commit, the values are compared instead.
+        """
+        clock, value, previous = self._committed
+        grid_clock = self._grid._clock
+        if previous is not self.previous_state:
+            return True
+        if clock is not grid_clock:
+            return not self._unchanged()
+        return grid_clock.value != value
+
+    @property
+    def etag(self):
+        """Entity tag for the current grid (see :obj:`.grid.Grid.etag`)."""
+        return self._grid.etag
@@ -16,23 +16,48 @@
 import logging
 import os.path
 import sys
+import traceback
 
-from flask import Flask, Response, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request
 from werkzeug.contrib.fixers import ProxyFix
 
 from futebol_wss_agent.config.conn import Connector
+from futebol_wss_agent.config.device_owner import RemoteConnector
 from futebol_wss_agent.config.response import ROOTPAGE
-from futebol_wss_agent.lib.finisar_serial_adapter import Adapter
-from futebol_wss_agent.lib.grid import FixedGrid
+from futebol_wss_agent.lib.metrics import (CONTENT_TYPE, HTTP_REQUEST_SECONDS,
+                                           REGISTRY, clock, is_http_metric)
+from futebol_wss_agent.lib.profiling import MODES, PROFILER
+from futebol_wss_agent.lib.resilience import DeviceUnavailable
+from futebol_wss_agent.lib.serialization import (grid_columns_to_json,
+                                                 grid_to_json)
+from futebol_wss_agent.lib.snapshot import SnapshotError, dumps, loads
 from futebol_wss_agent.lib.utils import (frequency_to_wavelength,
                                          wavelength_to_frequency)
-from futebol_wss_agent.lib.wss import Wss
 
 logger = logging.getLogger()
 
 app = Flask(__name__)
 app.config.from_object(__name__)
-conn = Connector()
+
+DEVICE_SOCKET = os.environ.get('WSSAGENT_DEVICE_SOCKET')
+"""When set, the device is owned by another process, listening in this Unix
+socket (see :mod:`futebol_wss_agent.config.device_owner`), so several
+workers can serve the API.
+"""
+
+if DEVICE_SOCKET:
+    conn = RemoteConnector(DEVICE_SOCKET)
+else:
+    conn = Connector()
+    # Connect to the device while the agent is already serving requests
+    conn.warm_up()
+
+PROFILE_HEADER = os.environ.get('WSSAGENT_PROFILE_HEADER', '') == '1'
+"""Profile the requests with an ``X-WSS-Profile`` header (value: profiling
+mode, or ``1`` for the default one). The id of the stored profile is
+returned in ``X-WSS-Profile-Id``. Disabled by default: any client could
+slow down its requests and evict the stored profiles.
+"""
 
 def root_dir():
     return os.path.abspath(os.path.dirname(__file__))
@@ -51,6 +76,201 @@ def get_file(filename):
         logger.error("Impossible to read file", exc_info=True)
         return str(exc)
 
+
+_rendered = {}
+"""Last JSON rendering of the grid for each format, with its ETag."""
+
+
+def grid_response(grid, version=None, etag=None):
+    """JSON response describing each channel in the grid.
+
+    Use ``?format=columns`` to get one array per channel property instead of
+    one object per channel. The committed version is sent in the
+    ``X-WSS-Version`` header.
+
+    When the ``etag`` of the grid is given, it is sent in the ``ETag``
+    header and the rendered JSON is reused while the grid does not change.
+    """
+    columns = request.args.get('format') == 'columns'
+    cached_etag, content = _rendered.get(columns, (None, None))
+    if etag is None or etag != cached_etag:
+        if columns:
+            content = grid_columns_to_json(grid)
+        else:
+            content = grid_to_json(grid, index=True)
+        if etag is not None:
+            _rendered[columns] = (etag, content)
+    response = Response(content, mimetype='application/json')
+    if version is not None:
+        response.headers['X-WSS-Version'] = str(version)
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = clock()
+
+
+@app.after_request
+def observe_request_latency(response):
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(route, request.method).observe(
+            clock() - start)
+    return response
+
+
+@app.before_request
+def start_request_profile():
+    mode = PROFILE_HEADER and request.headers.get('X-WSS-Profile')
+    if mode:
+        mode = mode if mode in MODES else 'deterministic'
+    else:
+        mode = PROFILER.take('request')
+    if not mode:
+        return
+    try:
+        g.profile = PROFILER.start('request', mode, method=request.method,
+                                   path=request.path)
+    except Exception:
+        # The instrumentation cannot break the request (Python 3.12 refuses
+        # a second cProfile session, e.g. while a commit is profiled)
+        logger.warning("Impossible to profile %s %s", request.method,
+                       request.path, exc_info=True)
+
+
+@app.after_request
+def store_request_profile(response):
+    session = getattr(g, 'profile', None)
+    if session is None:
+        return response
+    session.meta['status'] = response.status_code
+    try:
+        profile_id = session.stop()
+    except Exception:
+        logger.warning("Impossible to stop the request profile",
+                       exc_info=True)
+        return response
+    if profile_id:
+        response.headers['X-WSS-Profile-Id'] = profile_id
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    content = REGISTRY.render(select=is_http_metric)
+    try:
+        content += conn.metrics()
+    except Exception:
+        logger.error("Impossible to collect device metrics", exc_info=True)
+    return Response(content, content_type=CONTENT_TYPE)
+
+@app.route('/api/v1/health', methods=['GET'])
+def health():
+    """Liveness probe: the agent is serving requests."""
+    return jsonify({'status': 'alive'})
+
+@app.route('/api/v1/ready', methods=['GET'])
+def ready():
+    """Readiness probe: the device connection is established."""
+    status = conn.status()
+    response = jsonify(status)
+    if status['status'] != 'ready':
+        response.status_code = 503
+    return response
+
+@app.route('/api/v1/status', methods=['GET'])
+def device_status():
+    """Device status, as last read by the background poller (no serial
+    traffic is generated).
+    """
+    try:
+        return jsonify(conn.device_status())
+    except Exception as ex:
+        return device_error(ex, "Impossible to read the WSS status")
+
+@app.route('/api/v1/telemetry', methods=['GET'])
+def telemetry_series():
+    """Names of the recorded telemetry series."""
+    try:
+        return jsonify(conn.telemetry())
+    except Exception as ex:
+        return device_error(ex, "Impossible to read the telemetry")
+
+@app.route('/api/v1/telemetry/<path:name>', methods=['GET'])
+def telemetry_query(name):
+    """Samples of a series. Query arguments: ``start`` and ``stop`` (Unix
+    time) and ``points`` (maximum number of samples, downsampling).
+    """
+    try:
+        result = conn.telemetry(
+            name,
+            start=request.args.get('start', type=float),
+            stop=request.args.get('stop', type=float),
+            points=request.args.get('points', type=int))
+    except Exception as ex:
+        return device_error(ex, "Impossible to read the telemetry")
+    if result is None:
+        response = jsonify({"error": "Unknown series: {}".format(name)})
+        response.status_code = 404
+        return response
+    return jsonify(result)
+
+@app.route('/api/v1/admin/profiling', methods=['GET', 'POST'])
+def profiling():
+    """Profile the next requests or commits.
+
+    ``POST`` arguments (JSON): ``target`` (``request`` or ``commit``),
+    ``mode`` (``deterministic`` or ``sampling``) and ``count`` (at most
+    ``Profiler.MAX_ARMED``). Requests are armed only in the worker process
+    that receives this one.
+    """
+    armed = PROFILER.armed
+    if request.method == 'POST':
+        content = request.get_json(silent=True) or {}
+        target = content.get('target', 'request')
+        mode = content.get('mode', 'deterministic')
+        try:
+            count = int(content.get('count', 1))
+            if target == 'commit':
+                PROFILER.check_mode(mode)
+                armed['commit'] = conn.arm_profiling(mode, count)['commit']
+            else:
+                armed = PROFILER.arm(target, mode, count)
+        except ValueError as ex:
+            response = jsonify({"error": str(ex)})
+            response.status_code = 400
+            return response
+        except Exception as ex:
+            return device_error(ex, "Impossible to arm the profiler")
+    return jsonify({'armed': armed, 'profiles': len(PROFILER.store.list())})
+
+@app.route('/api/v1/profiles', methods=['GET'])
+def list_profiles():
+    """Metadata of the stored profiles, oldest first."""
+    return jsonify({'profiles': PROFILER.store.list()})
+
+@app.route('/api/v1/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """A stored profile: ``pstats`` file or collapsed stacks, or a text
+    report with ``?format=text``.
+    """
+    try:
+        if request.args.get('format') == 'text':
+            return Response(PROFILER.summary(profile_id),
+                            mimetype='text/plain')
+        meta = PROFILER.store.metadata(profile_id)
+        data = PROFILER.store.read(profile_id)
+    except KeyError:
+        response = jsonify({"error": "Unknown profile: {}".format(profile_id)})
+        response.status_code = 404
+        return response
+    mimetype = ('text/plain' if meta['mode'] == 'sampling'
+                else 'application/octet-stream')
+    return Response(data, mimetype=mimetype)
+
 @app.route('/')
 def root_page():
     return render_template('index.html')
@@ -101,48 +321,90 @@ def get_information():
         pass
     return jsonify({'tasks': 1222})
 
+def device_error(ex, message="Impossible to send commands to WSS"):
+    """Error reply. ``503`` if the device is temporarily unavailable
+    (timeout, open circuit), so clients know they can try again later.
+    """
+    logger.error(message, exc_info=True)
+    response = jsonify({
+        "error": str(ex),
+    })
+    if isinstance(ex, DeviceUnavailable):
+        response.status_code = 503
+    return response
+
+@app.route('/api/v1/grid', methods=['GET'])
+def get_grid():
+    """Current grid. Supports conditional requests (``If-None-Match``)."""
+    try:
+        etag = conn.etag
+        if etag is None:
+            response = jsonify({"error": "No grid created yet"})
+            response.status_code = 404
+            return response
+        if etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        return grid_response(conn.grid, conn.version, etag)
+    except Exception as ex:
+        return device_error(ex, "Impossible to read the WSS state")
+
+SNAPSHOT_MIMETYPE = 'application/vnd.futebol.wss-grid'
+
+@app.route('/api/v1/grid/snapshot', methods=['GET', 'PUT'])
+def grid_snapshot():
+    """Current grid as a binary snapshot (see
+    :mod:`futebol_wss_agent.lib.snapshot`), to save it or transfer it to
+    another agent. ``PUT`` replaces the grid with the snapshot in the body
+    and commits it.
+    """
+    if request.method == 'PUT':
+        try:
+            grid = loads(request.get_data())
+        except SnapshotError as ex:
+            response = jsonify({"error": str(ex)})
+            response.status_code = 400
+            return response
+        try:
+            grid = conn.restore_grid(grid)
+        except Exception as ex:
+            return device_error(ex)
+        return grid_response(grid, conn.version, conn.etag)
+    try:
+        etag = conn.etag
+        if etag is None:
+            response = jsonify({"error": "No grid created yet"})
+            response.status_code = 404
+            return response
+        if etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        response = Response(dumps(conn.grid), mimetype=SNAPSHOT_MIMETYPE)
+    except Exception as ex:
+        return device_error(ex, "Impossible to read the WSS state")
+    response.set_etag(etag)
+    return response
+
 @app.route('/api/v1/create/grid', methods=['POST',])
 def create_grid():
     if request.method == 'POST':
         content = request.json
         bandwidth = 50.0
         spacing = 0.0
-        resolution = 12.5
-        # 8.0
-        # 6.25
-        frequency_window = (191.325, 196.150)
-        # (191.1, 196.5)
-        # (191.325, 196.150)
         bandwidth = float(content.setdefault('bandwidth', 50.0))
         spacing = float(content.setdefault('spacing', 0))
 
-        adapter = Adapter(
-            resolution=resolution,
-            frequency_window=frequency_window)
-        f0 = 191.35 #FixedGrid.DEFAULT_FIRST_FREQUENCY - 6.25e-3
-        grid = FixedGrid(
-            bandwidth=bandwidth,
-            spacing=spacing,
-            first_frequency=f0)
-        wss = Wss(grid, adapter)
-
-        channels = (dict(channel) for channel in grid)
-        result = [
-            channel.update(index=i) or channel
-            for i, channel in enumerate(channels)
-        ]
-        conn._grid = grid
-        conn._adapter = adapter
-        conn._wss = wss
         try:
-            wss.commit()
+            if content.get('dry_run'):
+                # Only show the commands that would be sent
+                return jsonify(conn.preview_grid(bandwidth, spacing))
+            grid = conn.create_grid(bandwidth, spacing)
         except Exception as ex:
-            logger.error("Impossible to send commands to WSS", exc_info=True)
-            result = {
-                "error": str(ex),
-            }
+            return device_error(ex)
         if content:
-            return jsonify(result)
+            return grid_response(grid, conn.version, conn.etag)
     else:
         pass
 
@@ -151,35 +413,35 @@ def set_configuration():
     if request.method == 'POST':
         content = request.json
 
+        grid = conn.grid
         if content.get('channels', 0) != 0:
-            for channel in content['channels']:
-                cr = float(channel['frequency'][1])
-                cl = float(channel['frequency'][0])
-                conf = conn._grid[
-                    'frequency', cl if cl != 0 else '':cr if cr != 0 else ''
-                ]
-                conf.port = channel['port']
-                conf.attenuation = channel['attenuation']
-           
-            grid = conn._grid
-            
-            channels = (dict(channel) for channel in grid)
-            result = [
-                 channel.update(index=i) or channel
-                 for i, channel in enumerate(channels)
-            ]
+            if conn.etag is None:
+                response = jsonify({"error": "No grid created yet"})
+                response.status_code = 404
+                return response
             try:
-                conn._wss.commit()
+                if content.get('dry_run'):
+                    # Only show the commands that would be sent
+                    return jsonify(conn.preview_channels(content['channels']))
+                grid = conn.set_channels(content['channels'])
             except Exception as ex:
-                logger.error("Impossible to send commands to WSS", exc_info=True)
-                result = {
-                    "error": str(ex),
-                }
+                return device_error(ex)
         if content:
-            return jsonify(result)
+            return grid_response(grid, conn.version, conn.etag)
     else:
         pass
 
+@app.route('/api/v1/device/reconcile', methods=['GET', 'POST'])
+def reconcile():
+    """Compare the device state with the last committed grid.
+
+    ``POST`` also adopts the device state as reference for the next commit.
+    """
+    try:
+        return jsonify(conn.reconcile(adopt=request.method == 'POST'))
+    except Exception as ex:
+        return device_error(ex, "Impossible to read the WSS state")
+
 @app.route('/api/v1/update', methods=['PATCH', 'PUT'])
 def update_configuration():
     if request.method == 'PATCH' or request.method == 'PUT':
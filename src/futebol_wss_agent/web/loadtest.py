@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright 2017-2022 Rafael S. Guimaraes, Univertity of Bristol
+#                                       High Performance Networks Group
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Load generator for the REST API of the agent.
+
+Several client threads send a mix of reads (current grid, device status,
+frequency/wavelength conversions) and writes (grid creation, channel
+settings) and the throughput and latency percentiles are reported, per
+operation and overall.
+
+By default the agent runs in this process (through the Flask test client,
+so only the web layer and the device handling are measured) and talks to a
+:obj:`~futebol_wss_agent.lib.simulator.FinisarSimulator` over TCP. With
+``--url`` a running agent is used instead (whatever its device is).
+
+Usage
+-----
+
+.. code-block:: bash
+
+    python -m futebol_wss_agent.web.loadtest --concurrency 8 \\
+        --requests 2000 --writes 0.1
+    python -m futebol_wss_agent.web.loadtest --url http://agent:8080 \\
+        --duration 60 --json
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from six.moves import http_client
+from six.moves.urllib.parse import urlencode, urlsplit
+
+from futebol_wss_agent.lib.metrics import clock
+
+READS = (
+    # (name, method, path, builder of the form or JSON payload)
+    ('grid', 'GET', '/api/v1/grid', None),
+    ('status', 'GET', '/api/v1/status', None),
+    ('frequency', 'POST', '/frequency/',
+     lambda rnd: {'form': {'number': rnd.uniform(191.4, 196.1)}}),
+    ('wavelength', 'POST', '/wavelenght/',
+     lambda rnd: {'form': {'number': rnd.uniform(1528.8, 1566.7)}}),
+)
+
+WRITES = (
+    ('create_grid', 'POST', '/api/v1/create/grid',
+     lambda rnd: {'payload': {'bandwidth': rnd.choice((50.0, 100.0)),
+                              'spacing': 0}}),
+    ('set_channels', 'POST', '/api/v1/channel/set',
+     lambda rnd: {'payload': {'channels': [_channel_settings(rnd)]}}),
+)
+
+PERCENTILES = (50, 95, 99)
+
+
+def _channel_settings(rnd):
+    start = rnd.uniform(191.4, 195.5)
+    return {'frequency': [start, start + rnd.uniform(0.1, 0.6)],
+            'port': rnd.randint(1, 23),
+            'attenuation': round(rnd.uniform(0, 15), 1)}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list: the smallest value with at
+    least ``pct`` % of the values less than or equal to it.
+    """
+    if not values:
+        return None
+    # pct * n first: exact for integer percentiles (0.07 * 100 is not 7)
+    rank = int(math.ceil(pct * len(values) / 100.0)) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def start_simulator(latency=0.0):
+    """Run a simulated device in a background thread.
+
+    Returns
+    -------
+    str
+        URL of the device, for ``cli.Serial`` (``socket://host:port``).
+    """
+    from futebol_wss_agent.lib.simulator import serve_tcp
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(serve_tcp(latency=latency))
+    thread = threading.Thread(target=loop.run_forever,
+                              name='wss-simulator')
+    thread.daemon = True
+    thread.start()
+    host, port = server.sockets[0].getsockname()[:2]
+    return 'socket://{}:{}'.format(host, port)
+
+
+class LocalClient(object):
+    """Sends the requests to an in-process agent (Flask test client)."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, form=None, payload=None):
+        response = self._client.open(path, method=method, data=form,
+                                     json=payload)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient(object):
+    """Sends the requests to a running agent, reusing the connection."""
+
+    def __init__(self, url, timeout=30.0):
+        parts = urlsplit(url)
+        self._host = parts.netloc
+        self._prefix = parts.path.rstrip('/')
+        self._timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            connection = http_client.HTTPConnection(self._host,
+                                                    timeout=self._timeout)
+            connection.connect()
+            # Headers and body are separate writes: without this, Nagle's
+            # algorithm adds the delayed ACK time to every request
+            connection.sock.setsockopt(socket.IPPROTO_TCP,
+                                       socket.TCP_NODELAY, 1)
+            self._connection = connection
+        return self._connection
+
+    def request(self, method, path, form=None, payload=None):
+        """Send a form or a JSON ``payload`` and return the status code."""
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif payload is not None:
+            body = json.dumps(payload)
+            headers['Content-Type'] = 'application/json'
+        connection = self._connect()
+        try:
+            connection.request(method, self._prefix + path, body, headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            # Open a new connection for the next request
+            connection.close()
+            self._connection = None
+            raise
+
+
+class LoadTest(object):
+    """Drives the API with several client threads.
+
+    Arguments
+    ---------
+    client_factory : callable
+        Creates the client of each thread (``request`` method).
+    concurrency : int
+        Number of client threads.
+    writes : float
+        Fraction of the requests that change the configuration.
+    requests : int
+        Total number of requests (unless ``duration`` is given).
+    duration : float
+        Send requests for this time (s) instead.
+    dry_run : bool
+        Ask the agent only to plan the writes, nothing is sent to the
+        device (measures the web layer and the planner).
+    seed : int
+        Seed for the random choices, so runs are comparable.
+    """
+
+    def __init__(self, client_factory, concurrency=4, writes=0.1,
+                 requests=1000, duration=None, dry_run=False, seed=0):
+        self.client_factory = client_factory
+        self.concurrency = concurrency
+        self.writes = writes
+        self.requests = requests
+        self.duration = duration
+        self.dry_run = dry_run
+        self.seed = seed
+        self._issued = 0
+        self._lock = threading.Lock()
+
+    def _next_ticket(self, deadline):
+        if deadline is not None:
+            return clock() < deadline
+        with self._lock:
+            self._issued += 1
+            return self._issued <= self.requests
+
+    def _operation(self, rnd):
+        name, method, path, build = rnd.choice(
+            WRITES if rnd.random() < self.writes else READS)
+        kwargs = build(rnd) if build else {}
+        if self.dry_run and 'payload' in kwargs:
+            kwargs['payload']['dry_run'] = True
+        return name, method, path, kwargs
+
+    def _worker(self, index, deadline, samples, errors):
+        rnd = random.Random(self.seed * 1000 + index)
+        client = self.client_factory()
+        while self._next_ticket(deadline):
+            name, method, path, kwargs = self._operation(rnd)
+            start = clock()
+            try:
+                status = client.request(method, path, **kwargs)
+            except Exception:
+                status = None
+            samples[name].append(clock() - start)
+            if status is None or status >= 400:
+                errors[name] += 1
+
+    def run(self):
+        """Send the requests and return the report (see :obj:`report`)."""
+        samples = [defaultdict(list) for _ in range(self.concurrency)]
+        errors = [defaultdict(int) for _ in range(self.concurrency)]
+        self._issued = 0
+        deadline = None if self.duration is None else (
+            clock() + self.duration)
+        threads = [threading.Thread(target=self._worker,
+                                    args=(i, deadline, samples[i], errors[i]))
+                   for i in range(self.concurrency)]
+        start = clock()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = clock() - start
+
+        merged, failed = defaultdict(list), defaultdict(int)
+        for thread_samples, thread_errors in zip(samples, errors):
+            for name, values in thread_samples.items():
+                merged[name].extend(values)
+            for name, count in thread_errors.items():
+                failed[name] += count
+        return self.report(merged, failed, elapsed)
+
+    def report(self, samples, errors, elapsed):
+        """Throughput and latency percentiles (ms), per operation and for
+        all the requests (``total``).
+        """
+        def summary(values, error_count):
+            values = sorted(values)
+            result = {'requests': len(values), 'errors': error_count,
+                      'throughput': len(values) / elapsed if elapsed else 0}
+            for pct in PERCENTILES:
+                value = percentile(values, pct)
+                result['p{}'.format(pct)] = (
+                    None if value is None else value * 1e3)
+            return result
+
+        operations = {name: summary(values, errors.get(name, 0))
+                      for name, values in samples.items()}
+        every = [v for values in samples.values() for v in values]
+        return {
+            'concurrency': self.concurrency,
+            'writes': self.writes,
+            'elapsed': elapsed,
+            'operations': operations,
+            'total': summary(every, sum(errors.values())),
+        }
+
+
+def format_report(report):
+    lines = ['{:d} clients, {:.0%} writes, {:.2f}s'.format(
+        report['concurrency'], report['writes'], report['elapsed'])]
+    header = '{:<14}{:>9}{:>8}{:>10}{:>10}{:>10}{:>10}'.format(
+        'operation', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms',
+        'p99 ms')
+    lines.append(header)
+    lines.append('-' * len(header))
+    rows = sorted(report['operations'].items())
+    rows.append(('total', report['total']))
+    for name, stats in rows:
+        lines.append('{:<14}{:>9d}{:>8d}{:>10.1f}{:>10.2f}{:>10.2f}{:>10.2f}'
+                     .format(name, stats['requests'], stats['errors'],
+                             stats['throughput'],
+                             *(stats['p{}'.format(p)] or 0.0
+                               for p in PERCENTILES)))
+    return '\n'.join(lines)
+
+
+def _local_app(latency, timeout=30.0):
+    """Agent in this process, connected to a simulated device."""
+    os.environ['WSSAGENT_DEVICE'] = start_simulator(latency)
+    os.environ.pop('WSSAGENT_DEVICE_SOCKET', None)
+    from futebol_wss_agent.web import app_web
+
+    deadline = clock() + timeout
+    while not app_web.conn.ready:
+        if clock() > deadline:
+            raise RuntimeError('Simulated device not ready after {}s'
+                               .format(timeout))
+        time.sleep(0.1)
+    return app_web.app
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Agent to test (by default an '
+                        'in-process agent with a simulated device)')
+    parser.add_argument('--concurrency', '-c', type=int, default=4)
+    parser.add_argument('--requests', '-n', type=int, default=1000)
+    parser.add_argument('--duration', '-d', type=float,
+                        help='Run for this time (s) instead of --requests')
+    parser.add_argument('--writes', '-w', type=float, default=0.1,
+                        help='Fraction of requests that change the grid')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Writes are only planned, not sent')
+    parser.add_argument('--device-latency', type=float, default=0.0,
+                        help='Delay (s) of each simulated device response')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true',
+                        help='Print the report as JSON')
+    opts = parser.parse_args(args)
+
+    if opts.url:
+        def client_factory():
+            return HttpClient(opts.url)
+    else:
+        app = _local_app(opts.device_latency)
+
+        def client_factory():
+            return LocalClient(app)
+
+    # Writes need a grid
+    client_factory().request('POST', '/api/v1/create/grid',
+                             payload={'bandwidth': 50.0, 'spacing': 0})
+
+    test = LoadTest(client_factory, concurrency=opts.concurrency,
+                    writes=opts.writes, requests=opts.requests,
+                    duration=opts.duration, dry_run=opts.dry_run,
+                    seed=opts.seed)
+    report = test.run()
+    if opts.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(format_report(report))
+    return 0 if report['total']['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
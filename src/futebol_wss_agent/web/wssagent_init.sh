@@ -17,13 +17,25 @@
 GUNICORN=$(which gunicorn 2> /dev/null)
 APP_PATH="/usr/local/proxyssh/"
 PIDFILE="/var/run/proxyssh.pid"
+# With more than one worker, a single device-owner process holds the serial
+# port and the workers talk to it through a Unix socket
+WORKERS=${WSSAGENT_WORKERS:-1}
+OWNER_PIDFILE="/var/run/proxyssh-owner.pid"
+DEVICE_SOCKET=${WSSAGENT_DEVICE_SOCKET:-/var/run/wssagent.sock}
 
 start() {
     echo "Starting WSS Agent - REST API..."
     if [ -x $GUNICORN ]
     then
         cd $APP_PATH
-        $GUNICORN -D -p $PIDFILE -b 0.0.0.0:8080 app_web:app
+        if [ "$WORKERS" -gt 1 ]
+        then
+            python -m futebol_wss_agent.config.device_owner \
+                --socket $DEVICE_SOCKET &
+            echo $! > $OWNER_PIDFILE
+            export WSSAGENT_DEVICE_SOCKET=$DEVICE_SOCKET
+        fi
+        $GUNICORN -D -p $PIDFILE -w $WORKERS -b 0.0.0.0:8080 app_web:app
         echo "Application now is running..."
     else
         echo "Application cannot start: Gunicorn not found!"
@@ -37,6 +49,11 @@ stop() {
     else
         echo "PIDFILE not found!"
     fi
+    if [ -f $OWNER_PIDFILE ]
+    then
+        kill $(cat $OWNER_PIDFILE)
+        rm -f $OWNER_PIDFILE
+    fi
 }
 
 restart(){
@@ -8,4 +8,61 @@
     https://pytest.org/latest/plugins.html
 """
 
-# import pytest
+import pytest
+
+from futebol_wss_agent.lib.cli import ErrorResponse
+
+
+class SimulatorInterface(object):
+    """Serial interface talking directly to a FinisarSimulator. Error
+    replies raise :obj:`ErrorResponse`, like the real interface.
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.config = {}
+        self.sent = []
+
+    def command(self, cmd, timeout=None):
+        if isinstance(cmd, bytes):
+            cmd = cmd.decode('ascii')
+        self.sent.append(cmd)
+        response = self.simulator.handle(cmd).strip()
+        if response in ('CER', 'AER', 'RER', 'VER'):
+            raise ErrorResponse(response, cmd)
+        return response
+
+    def send_line(self, cmd='', flush=True):
+        pass
+
+    def flush(self):
+        pass
+
+
+@pytest.fixture
+def simulator():
+    from futebol_wss_agent.lib.simulator import FinisarSimulator
+
+    return FinisarSimulator()
+
+
+@pytest.fixture
+def make_adapter(monkeypatch):
+    """Factory of Finisar adapters connected to a simulator (without the
+    delays to clean the line), with the slice width used by the connector.
+    """
+    from futebol_wss_agent.lib import finisar_serial_adapter
+
+    monkeypatch.setattr(finisar_serial_adapter, 'sleep', lambda s: None)
+
+    def make(simulator):
+        return finisar_serial_adapter.Adapter(
+            resolution=12.5, interface=SimulatorInterface(simulator),
+            use_checksum=False)
+    return make
+
+
+@pytest.fixture
+def adapter(simulator, make_adapter):
+    """Finisar adapter connected to the ``simulator``."""
+    return make_adapter(simulator)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.config.conn import Connector
+from futebol_wss_agent.lib.registry import AdapterRegistry
+
+
+@pytest.fixture
+def connector(adapter):
+    registry = AdapterRegistry(lambda device, **options: adapter)
+    connector = Connector(registry)
+    connector.POLL_INTERVALS = (60.0, 60.0)
+    connector.warm_up()
+    yield connector
+    connector._poller.stop(timeout=1)
+
+
+def sent(adapter):
+    """Commands sent to the device, without the status polls."""
+    return [command for command in adapter._comm.interface.sent
+            if not command.startswith('OSS?')]
+
+
+def test_set_channels_is_committed(connector, adapter, simulator):
+    connector.create_grid()
+    version, etag = connector.version, connector.etag
+    grid = connector.set_channels(
+        [{'frequency': [193.0, 0], 'port': 3, 'attenuation': 2}])
+    assert grid is connector.grid
+    assert connector.version == version + 1
+    assert connector.etag != etag
+    assert any(port == 3 for port, _ in simulator.settings.values())
+
+
+def test_same_grid_again_is_not_sent(connector, adapter):
+    grid = connector.create_grid()
+    version, etag, count = connector.version, connector.etag, len(
+        sent(adapter))
+    assert connector.create_grid() is grid
+    assert len(sent(adapter)) == count
+    assert (connector.version, connector.etag) == (version, etag)
+
+
+def test_new_grid_keeps_the_version_monotonic(connector, adapter):
+    connector.create_grid(bandwidth=50.0)
+    connector.set_channels(
+        [{'frequency': [0, 0], 'port': 2, 'attenuation': 0}])
+    version = connector.version
+    connector.create_grid(bandwidth=50.0)
+    assert connector.version == version + 1
+    # Same channel plan: only the settings are sent again
+    assert sent(adapter)[-1].startswith('UCA')
+
+
+def test_preview_does_not_touch_the_connection(connector, adapter):
+    connector.create_grid()
+
+    def reconnect(*args, **kwargs):
+        raise AssertionError('the registry should not be used')
+    connector._registry.adapter = reconnect
+    count = len(sent(adapter))
+    preview = connector.preview_grid(spacing=50.0)
+    assert any(c.startswith('DCC') for c in preview['commands'])
+    preview = connector.preview_channels(
+        [{'frequency': [0, 0], 'port': 4, 'attenuation': 0}])
+    assert preview['commands'] and preview['commands'][0].startswith('UCA')
+    assert len(sent(adapter)) == count
+    assert all(ch.port == 1 for ch in connector.grid)
+
+
+def test_preview_without_grid(connector):
+    with pytest.raises(LookupError):
+        connector.preview_channels(
+            [{'frequency': [0, 0], 'port': 4, 'attenuation': 0}])
+
+
+def test_preview_before_connecting():
+    from futebol_wss_agent.lib.resilience import DeviceUnavailable
+
+    with pytest.raises(DeviceUnavailable):
+        Connector().preview_grid()
+
+
+def test_reconcile_reports_committed_positions(connector, simulator):
+    connector.create_grid()
+    assert connector.reconcile()['in_sync']
+    simulator.settings[3] = (5, 0.0)  # changed behind the agent's back
+    summary = connector.reconcile()
+    assert not summary['in_sync']
+    assert summary['drifted'] == [2]
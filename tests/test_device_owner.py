@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+
+import pytest
+
+from futebol_wss_agent.config.device_owner import (RemoteConnector,
+                                                   RemoteDeviceUnavailable)
+
+
+@pytest.fixture
+def silent_owner(tmpdir):
+    """Unix socket that accepts requests but never replies."""
+    path = str(tmpdir.join('owner.sock'))
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(5)
+    requests = []
+
+    def serve():
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return
+            requests.append(client.makefile('rb').readline())
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    yield path, requests
+    server.close()
+
+
+def test_default_timeout_is_finite():
+    assert RemoteConnector('/nonexistent').timeout == \
+        RemoteConnector.DEFAULT_TIMEOUT > 0
+
+
+def test_missing_reply_times_out(silent_owner):
+    path, requests = silent_owner
+    conn = RemoteConnector(path, timeout=0.05)
+    with pytest.raises(RemoteDeviceUnavailable):
+        conn.create_grid()
+    assert len(requests) == 1  # not sent again
+    assert conn.status()['status'] == 'unreachable'
+
+
+def test_owner_not_running(tmpdir):
+    conn = RemoteConnector(str(tmpdir.join('missing.sock')))
+    assert conn.status()['status'] == 'unreachable'
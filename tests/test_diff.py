@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.diff import diff_grids, spectral_key
+from futebol_wss_agent.lib.grid import FixedGrid, Grid
+from futebol_wss_agent.lib.wss import Wss
+
+
+@pytest.fixture
+def grid():
+    return FixedGrid(number=6, bandwidth=50.0, spacing=100.0)
+
+
+def test_same_grid_has_no_difference(grid):
+    delta = diff_grids(grid, grid.copy())
+    assert not delta
+    assert not delta.structural
+
+
+def test_first_grid_is_all_inserted(grid):
+    delta = diff_grids(None, grid)
+    assert [i for i, _ in delta.inserted] == list(range(len(grid)))
+    assert delta.deleted == [] and delta.updated == []
+
+
+def test_insertion_in_the_middle_is_a_single_insert(grid):
+    extra = FixedGrid(number=1, bandwidth=50.0,
+                      first_frequency=grid[2].central_frequency + 0.05)
+    new = Grid(list(grid)[:3] + list(extra) + list(grid)[3:])
+    delta = diff_grids(grid, new)
+    assert delta.structural
+    assert [i for i, _ in delta.inserted] == [3]
+    assert delta.deleted == [] and delta.updated == []
+
+
+def test_deletion(grid):
+    new = Grid([channel for i, channel in enumerate(grid) if i != 4])
+    delta = diff_grids(grid, new)
+    assert [i for i, _ in delta.deleted] == [4]
+    assert delta.inserted == [] and delta.updated == []
+
+
+def test_updated_fields(grid):
+    new = grid.copy()
+    new[1].port = 7
+    new[5].attenuation = 1.5
+    delta = diff_grids(grid, new)
+    assert not delta.structural
+    assert delta.updated == [
+        (1, 1, {'port': (grid[1].port, 7)}),
+        (5, 5, {'attenuation': (grid[5].attenuation, 1.5)}),
+    ]
+
+
+def test_unsorted_grids_are_matched_by_frequency(grid):
+    new = Grid(list(reversed(grid.copy())))
+    new[0].port = 3
+    delta = diff_grids(grid, new)
+    assert not delta.structural
+    assert delta.updated == [(5, 0, {'port': (grid[5].port, 3)})]
+
+
+def test_spectral_key_ignores_float_noise(grid):
+    channel = grid[0]
+    other = FixedGrid(number=1, bandwidth=50.0 + 1e-9,
+                      first_frequency=channel.central_frequency + 1e-9)[0]
+    assert spectral_key(channel) == spectral_key(other)
+
+
+def test_to_dict(grid):
+    new = grid.copy()
+    new[0].port = 2
+    result = diff_grids(grid, new).to_dict()
+    assert result['insert'] == [] and result['delete'] == []
+    assert result['update'] == [{'index': 0, 'previous_index': 0,
+                                 'changes': {'port': [grid[0].port, 2]}}]
+
+
+def test_wss_delta(adapter, grid):
+    wss = Wss(grid, adapter)
+    wss.commit()
+    grid[2].port = 4
+    assert wss.delta().updated == [(2, 2, {'port': (1, 4)})]
+
+
+def test_wss_changes_keeps_the_jsondiff_format(adapter, grid):
+    pytest.importorskip('jsondiff')
+    wss = Wss(grid, adapter)
+    wss.commit()
+    assert wss.changes() == {}
+    grid[2].port = 4
+    assert wss.changes() != {}
+    assert wss.diff == wss.changes
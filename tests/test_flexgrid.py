@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.grid import FlexGrid
+from futebol_wss_agent.lib.verification import OutOfRange, OverlappedChannels
+
+
+def test_channels_from_slices():
+    grid = FlexGrid(start_slices=[1, 9], slice_counts=[8, 4], ports=[2, 3],
+                    attenuations=1.5)
+    assert len(grid) == 2
+    assert grid[0].bandwidth == 50.0
+    assert grid[0].start_frequency == pytest.approx(191.325)
+    assert grid[1].bandwidth == 25.0
+    assert grid[1].start_frequency == pytest.approx(191.375)
+    assert list(grid.port) == [2, 3]
+    assert list(grid.attenuation) == [1.5, 1.5]
+
+
+def test_from_specs_defaults():
+    grid = FlexGrid.from_specs([(1, 8), (9, 8, 5), (17, 4, 2, 3.0)])
+    assert [(ch.port, ch.attenuation) for ch in grid] == [
+        (1, 0), (5, 0), (2, 3.0)]
+
+
+@pytest.mark.parametrize('spec', [(1,), (1, 8, 1, 0, 'extra'), ()])
+def test_from_specs_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError):
+        FlexGrid.from_specs([(20, 4), spec])
+
+
+@pytest.mark.parametrize('specs', [
+    [(0, 4)], [(-3, 4)], [(1, 0)], [(1, -2)], [(770, 4)],
+])
+def test_out_of_range(specs):
+    with pytest.raises(OutOfRange):
+        FlexGrid.from_specs(specs)
+
+
+def test_overlapped_or_unsorted():
+    with pytest.raises(OverlappedChannels):
+        FlexGrid.from_specs([(1, 8), (8, 4)])
+    with pytest.raises(OverlappedChannels):
+        FlexGrid.from_specs([(9, 4), (1, 4)])
+
+
+def test_lengths_must_match():
+    with pytest.raises(ValueError):
+        FlexGrid(start_slices=[1, 9], slice_counts=[8])
+
+
+def test_covering_fills_the_window():
+    grid = FlexGrid.covering((4, 6, 8))
+    assert [ch.bandwidth for ch in grid[:4]] == [25.0, 37.5, 50.0, 25.0]
+    assert grid[-1].stop_frequency <= 196.150 + 1e-9
+    assert FlexGrid.covering((8,))[-1].stop_frequency == pytest.approx(
+        196.125)
+
+
+@pytest.mark.parametrize('counts', [(), (0,), (8, -1)])
+def test_covering_rejects_empty_channels(counts):
+    with pytest.raises(ValueError):
+        FlexGrid.covering(counts)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from futebol_wss_agent.lib.finisar_serial_adapter import _Communication
+from futebol_wss_agent.lib.frames import FragmentCache, Frame, checksum_of
+
+
+def test_checksum():
+    assert checksum_of(0) == 0
+    assert checksum_of(1) == 0xFFFF
+    assert checksum_of(0x10000 + 5) == 0xFFFB
+
+
+def test_frame_is_bytes():
+    frame = Frame(b'OSS?')
+    assert frame == b'OSS?'
+    assert frame.byte_sum == sum(bytearray(b'OSS?'))
+    assert frame.checksum == _Communication.checksum('OSS?')
+    assert frame.framed() == '^OSS?${:04X}'.format(
+        frame.checksum).encode('ascii')
+
+
+def test_built_frame_matches_the_text_command():
+    cache = FragmentCache('{},{},{:.1f};')
+    frame = cache.build(b'UCA ', [(1, 2, 0.0), (3, 99, 99.9)])
+    text = 'UCA 1,2,0.0;3,99,99.9;'
+    assert frame == text.encode('ascii')
+    assert frame.checksum == _Communication.checksum(text)
+
+
+def test_fragments_are_cached():
+    cache = FragmentCache('{}={}:{};')
+    first = cache[(1, 1, 8)]
+    assert cache[(1, 1, 8)] is first
+    assert len(cache) == 1
+
+
+def test_cache_is_bounded():
+    cache = FragmentCache('{};', maxsize=3)
+    for key in range(10):
+        assert cache[(key,)][0] == '{};'.format(key).encode('ascii')
+        assert len(cache) <= 3
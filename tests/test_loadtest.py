@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from futebol_wss_agent.web.loadtest import (PERCENTILES, LoadTest,
+                                            format_report, percentile)
+
+
+@pytest.mark.parametrize('n, pct, index', [
+    (1, 50, 0), (1, 99, 0),
+    (2, 50, 0), (4, 50, 1), (6, 50, 2), (7, 50, 3),
+    (20, 95, 18), (10, 95, 9), (100, 95, 94), (100, 99, 98),
+    (200, 99, 197), (100, 7, 6), (5, 0, 0), (5, 100, 4),
+])
+def test_percentile_is_nearest_rank(n, pct, index):
+    assert percentile(list(range(n)), pct) == index
+
+
+def test_percentile_matches_the_definition():
+    for n in range(1, 201):
+        values = list(range(n))
+        for pct in PERCENTILES:
+            value = percentile(values, pct)
+            # Smallest value with at least pct % of the values <= it
+            assert (value + 1) * 100 >= pct * n
+            assert value == 0 or value * 100 < pct * n
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 50) is None
+
+
+class StubClient(object):
+    """Fails the status queries and raises on the wavelength ones."""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def request(self, method, path, form=None, payload=None):
+        self.calls.append((path, payload))
+        if path == '/wavelenght/':
+            raise IOError('connection reset')
+        return 500 if path == '/api/v1/status' else 200
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+def run(calls, **options):
+    lock = threading.Lock()
+
+    def factory():
+        with lock:
+            return StubClient(calls)
+    return LoadTest(factory, **options).run()
+
+
+def test_run(calls):
+    report = run(calls, concurrency=3, requests=200, writes=0.3)
+    total = report['total']
+    assert total['requests'] == len(calls) == 200
+    assert sum(op['requests'] for op in report['operations'].values()) == 200
+    operations = report['operations']
+    assert operations['status']['errors'] == operations['status']['requests']
+    assert (operations['wavelength']['errors'] ==
+            operations['wavelength']['requests'])
+    assert operations['grid']['errors'] == 0
+    assert total['errors'] == (operations['status']['errors'] +
+                               operations['wavelength']['errors'])
+    assert total['p50'] <= total['p95'] <= total['p99']
+
+
+def test_dry_run_is_added_to_the_writes(calls):
+    run(calls, concurrency=2, requests=100, writes=0.5, dry_run=True)
+    payloads = [payload for _, payload in calls if payload is not None]
+    assert payloads and all(p['dry_run'] is True for p in payloads)
+    assert len(payloads) < len(calls)  # reads are not changed
+
+
+def test_writes_are_real_by_default(calls):
+    run(calls, concurrency=1, requests=50, writes=1.0)
+    assert all('dry_run' not in payload for _, payload in calls)
+
+
+def test_format_report(calls):
+    report = run(calls, concurrency=2, requests=40)
+    lines = format_report(report).splitlines()
+    assert lines[0].startswith('2 clients, 10% writes')
+    assert lines[1].split() == ['operation', 'requests', 'errors', 'req/s',
+                                'p50', 'ms', 'p95', 'ms', 'p99', 'ms']
+    total = lines[-1].split()
+    assert total[:3] == ['total', '40', str(report['total']['errors'])]
+    assert len(lines) == 3 + len(report['operations']) + 1
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.grid import Column, FixedGrid, Mask
+
+
+@pytest.fixture
+def grid():
+    grid = FixedGrid(number=6)
+    grid.port = [1, 2, 3, 3, 2, 1]
+    grid[4].blocked = True
+    return grid
+
+
+def test_comparison_returns_a_mask(grid):
+    mask = grid.port == 3
+    assert isinstance(mask, Mask)
+    assert mask.indices == [2, 3]
+    assert [ch.port for ch in grid[mask]] == [3, 3]
+
+
+def test_mask_truth_value_is_ambiguous(grid):
+    with pytest.raises(ValueError):
+        bool(grid.port == 3)
+    assert any(grid.port == 3) and not all(grid.port == 3)
+
+
+def test_masks_are_combined_elementwise(grid):
+    assert ((grid.port == 3) | (grid.port == 1)).indices == [0, 2, 3, 5]
+    assert ((grid.port > 1) & (grid.port < 3)).indices == [1, 4]
+    assert ((grid.port == 2) ^ grid.blocked).indices == [1]
+    assert (~(grid.port == 1)).indices == [1, 2, 3, 4]
+
+
+def test_invert_boolean_column(grid):
+    mask = ~grid.blocked
+    assert isinstance(mask, Mask)
+    assert mask.indices == [0, 1, 2, 3, 5]
+    grid[~grid.blocked].attenuation = 3
+    assert list(grid.attenuation) == [3, 3, 3, 3, 0, 3]
+
+
+def test_invert_non_boolean_column(grid):
+    with pytest.raises(TypeError):
+        ~grid.port
+
+
+def test_arithmetic_is_elementwise(grid):
+    assert list(grid.port + 1) == [2, 3, 4, 4, 3, 2]
+    assert isinstance(grid.port + 1, Column)
+    assert list(grid.port + grid.port) == [2, 4, 6, 6, 4, 2]
+    grid[grid.port == 3].attenuation += 0.5
+    assert list(grid.attenuation) == [0, 0, 0.5, 0.5, 0, 0]
+
+
+def test_where(grid):
+    grid.where(port=2).attenuation = 1
+    assert list(grid.attenuation) == [0, 1, 0, 0, 1, 0]
+    selection = grid.where(lambda ch: ch.attenuation > 0, blocked=False)
+    assert [ch.port for ch in selection] == [2]
+
+
+def test_mask_length_is_checked(grid):
+    with pytest.raises(ValueError):
+        grid[Mask([True, False])]
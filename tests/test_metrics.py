@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.metrics import (Counter, Histogram, Registry,
+                                           command_mnemonic, is_http_metric)
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter(registry):
+    counter = Counter('bytes_total', 'Bytes.', registry=registry)
+    counter.inc()
+    counter.inc(4)
+    assert registry.render() == (
+        '# HELP bytes_total Bytes.\n'
+        '# TYPE bytes_total counter\n'
+        'bytes_total 5\n')
+
+
+def test_labelled_series(registry):
+    counter = Counter('errors_total', 'Errors.', ['code'],
+                      registry=registry).preallocate('VER', 'CER')
+    counter.labels('VER').inc()
+    lines = registry.render().splitlines()
+    assert 'errors_total{code="CER"} 0' in lines
+    assert 'errors_total{code="VER"} 1' in lines
+    with pytest.raises(ValueError):
+        counter.labels('VER', 'extra')
+
+
+def test_label_values_are_escaped(registry):
+    counter = Counter('c', 'C.', ['name'], registry=registry)
+    counter.labels('a"b\\c\nd').inc()
+    assert r'c{name="a\"b\\c\nd"} 1' in registry.render().splitlines()
+
+
+def test_histogram(registry):
+    histogram = Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1),
+                          registry=registry)
+    for value in 0.05, 0.1, 0.5, 3:
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 3.65',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_histogram_timer(registry):
+    histogram = Histogram('t', 'T.', registry=registry)
+    with histogram.time():
+        pass
+    assert histogram.labels().count == 1
+
+
+def test_select(registry):
+    Counter('wss_http_requests', 'HTTP.', registry=registry)
+    Counter('wss_serial_bytes', 'Serial.', registry=registry)
+    rendered = registry.render(select=is_http_metric)
+    assert 'wss_http_requests' in rendered
+    assert 'wss_serial_bytes' not in rendered
+    assert Registry().render() == ''
+
+
+@pytest.mark.parametrize('command, mnemonic', [
+    ('UCA 1,1,0.0;', 'UCA'),
+    (b'^uca 1,1,0.0;$FE12', 'UCA'),
+    ('RRA?', 'RRA?'),
+    ('', 'unknown'),
+])
+def test_command_mnemonic(command, mnemonic):
+    assert command_mnemonic(command) == mnemonic
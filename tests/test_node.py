@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.grid import FixedGrid
+from futebol_wss_agent.lib.node import Node, NodeCommitError
+from futebol_wss_agent.lib.simulator import FinisarSimulator
+from futebol_wss_agent.lib.wss import Wss
+
+
+class BrokenSimulator(FinisarSimulator):
+    """Rejects the channel settings once ``broken`` is set."""
+
+    broken = False
+
+    def _update_channels(self, arguments):
+        if self.broken:
+            raise ValueError('broken')
+        super(BrokenSimulator, self)._update_channels(arguments)
+
+
+@pytest.fixture
+def simulators():
+    return {'add-drop': BrokenSimulator(), 'express': BrokenSimulator()}
+
+
+@pytest.fixture
+def node(simulators, make_adapter):
+    node = Node({name: Wss(FixedGrid(number=4), make_adapter(simulator))
+                 for name, simulator in simulators.items()})
+    node.commit(force=True)
+    return node
+
+
+def ports(simulator):
+    return [port for port, _ in simulator.settings.values()]
+
+
+def test_commit_only_changed_members(node, simulators):
+    version = node.version
+    assert not node.dirty
+    assert node.commit() == version
+    commands = simulators['express'].commands
+    node['add-drop'].grid[0].port = 2
+    assert node.dirty
+    assert node.commit() == version + 1
+    assert ports(simulators['add-drop']) == [2, 1, 1, 1]
+    assert simulators['express'].commands == commands
+
+
+def test_transaction(node, simulators):
+    with node.transaction():
+        node['add-drop'].grid[0].port = 2
+        node['express'].grid[1].port = 3
+    assert ports(simulators['add-drop']) == [2, 1, 1, 1]
+    assert ports(simulators['express']) == [1, 3, 1, 1]
+
+
+def test_invalid_member_sends_nothing(node, simulators):
+    node['add-drop'].grid[0].port = 2
+    node['express'].grid[0].attenuation = 50  # above the maximum
+    commands = {name: sim.commands for name, sim in simulators.items()}
+    with pytest.raises(NodeCommitError) as info:
+        node.commit()
+    assert list(info.value.errors) == ['express']
+    assert {name: sim.commands
+            for name, sim in simulators.items()} == commands
+
+
+def test_failed_commit_is_rolled_back(node, simulators):
+    node['add-drop'].grid[0].port = 2
+    node['express'].grid[0].port = 5
+    simulators['express'].broken = True
+    with pytest.raises(NodeCommitError) as info:
+        node.commit()
+    assert list(info.value.errors) == ['express']
+    assert info.value.rolled_back == ['add-drop']
+    assert ports(simulators['add-drop']) == [1, 1, 1, 1]
+    assert node['add-drop'].grid[0].port == 2  # still pending
+    assert node.dirty
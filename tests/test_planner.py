@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from futebol_wss_agent.lib.grid import FixedGrid, Grid
+from futebol_wss_agent.lib.planner import (CostModel, compare_grids,
+                                           plan_transition)
+from futebol_wss_agent.lib.wss import Wss
+
+
+def mnemonics(commands):
+    return [command.split()[0].decode('ascii') for command in commands]
+
+
+def test_cost_model():
+    model = CostModel(baudrate=10, command_overhead=0, settle={'DCC': 1})
+    assert model.command_cost('UCA 1') == 7
+    assert model.command_cost('DCC 1') == 8
+    assert model.cost(['UCA 1', 'DCC 1']) == 15
+
+
+def test_first_commit_replans_everything(adapter):
+    grid = FixedGrid(number=4)
+    transition = compare_grids(adapter, None, grid)
+    assert not transition.same_plan
+    plan = plan_transition(adapter, transition, grid)
+    assert [o.name for o in plan.options] == ['full']
+    assert mnemonics(plan.commands) == ['CHW', 'DCC', 'UCA']
+
+
+def test_settings_only(adapter):
+    old = FixedGrid(number=4)
+    new = old.copy()
+    new[2].port = 5
+    transition = compare_grids(adapter, old, new)
+    assert transition.same_plan
+    assert transition.moved == [] and transition.changed == [2]
+    plan = plan_transition(adapter, transition, new, flexgrid=True)
+    assert plan.best.name == 'settings'
+    assert plan.commands == [b'UCA 3,5,0.0;']
+
+
+def test_unchanged(adapter):
+    grid = FixedGrid(number=4)
+    plan = plan_transition(adapter, compare_grids(adapter, grid, grid),
+                           grid, flexgrid=True)
+    assert plan.best.name == 'unchanged'
+    assert plan.commands == []
+
+
+def test_partial_replan_needs_flexgrid(adapter):
+    old = FixedGrid(number=4, bandwidth=50.0, spacing=50.0)
+    new = old.copy()
+    moved = FixedGrid(number=1, bandwidth=50.0,
+                      first_frequency=new[1].central_frequency + 0.025)
+    new._channels[1] = moved[0]
+    transition = compare_grids(adapter, old, new)
+    assert transition.moved == [1]
+
+    names = [o.name for o in plan_transition(
+        adapter, transition, new, flexgrid=False).options]
+    assert names == ['full']
+    plan = plan_transition(adapter, transition, new, flexgrid=True)
+    assert plan.best.name == 'partial'
+    assert mnemonics(plan.commands) == ['DCC', 'UCA']
+
+
+def test_settings_are_never_sent_with_ura(adapter):
+    grid = FixedGrid(number=8)
+    wss = Wss(grid, adapter)
+    wss.commit()
+    grid[3].attenuation = 4
+    grid[5].port = 2
+    for option in adapter.plan(wss).options:
+        assert 'URA' not in mnemonics(option.commands)
+
+
+def test_commit_applies_the_plan(adapter, simulator):
+    grid = FixedGrid(number=8)
+    wss = Wss(grid, adapter)
+    wss.commit()
+    assert len(simulator.plan) == 8
+    grid[3].port = 7
+    sent = len(adapter._comm.interface.sent)
+    wss.commit()
+    assert adapter._comm.interface.sent[sent:] == ['UCA 4,7,0.0;']
+    assert simulator.settings[4] == (7, 0.0)
+
+
+def insert(grid, index, frequency):
+    channels = list(grid)
+    channels.insert(index, FixedGrid(number=1, bandwidth=50.0,
+                                     first_frequency=frequency)[0])
+    return Grid(channels)
+
+
+def test_insertion_redefines_the_following_channels(adapter):
+    old = FixedGrid(number=6, bandwidth=50.0, spacing=50.0)
+    new = insert(old.copy(), 3, old[2].central_frequency + 0.05)
+    transition = compare_grids(adapter, old, new)
+    assert transition.same_plan
+    assert transition.moved == [3, 4, 5, 6]
+    plan = plan_transition(adapter, transition, new, flexgrid=True)
+    assert plan.best.name == 'partial'
+    dcc = plan.commands[0].decode('ascii')
+    assert dcc.startswith('DCC 4=') and '7=' in dcc and '3=' not in dcc
+
+
+def test_removal_needs_a_full_replan(adapter):
+    old = FixedGrid(number=6, bandwidth=50.0, spacing=50.0)
+    new = Grid([channel for i, channel in enumerate(old.copy()) if i != 2])
+    transition = compare_grids(adapter, old, new)
+    assert not transition.same_plan
+    names = [o.name for o in plan_transition(
+        adapter, transition, new, flexgrid=True).options]
+    assert names == ['full']
+
+
+def test_inserted_channel_is_committed(adapter, simulator):
+    grid = FixedGrid(number=6, bandwidth=50.0, spacing=50.0)
+    wss = Wss(grid, adapter)
+    wss.commit()
+    plan = dict(simulator.plan)
+    wss.grid = insert(wss.grid, 3, grid[2].central_frequency + 0.05)
+    wss.commit()
+    assert len(simulator.plan) == 7
+    assert all(simulator.plan[n] == plan[n] for n in (1, 2, 3))
+    assert simulator.plan[5] == plan[4]
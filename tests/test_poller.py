@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from futebol_wss_agent.lib.poller import StatusPoller
+
+
+class FakeAdapter(object):
+    def __init__(self):
+        self.words = []
+        self.calls = 0
+        self.polled = threading.Event()
+        self.on_poll = None
+
+    def operation_status(self):
+        self.calls += 1
+        if self.on_poll is not None:
+            self.on_poll()
+        self.polled.set()
+        word = self.words.pop(0) if self.words else 0
+        if isinstance(word, Exception):
+            raise word
+        return word
+
+    def read_channel_settings(self):
+        return [(1, 2, 0.5)]
+
+
+@pytest.fixture
+def adapter():
+    return FakeAdapter()
+
+
+@pytest.fixture
+def poller(adapter):
+    poller = StatusPoller(adapter, min_interval=1, max_interval=8)
+    yield poller
+    poller.stop(timeout=1)
+
+
+def test_latest(poller, adapter):
+    assert poller.latest['status'] == 'unknown'
+    adapter.words = [0, 4]
+    poller.poll()
+    assert poller.latest['status'] == 'ok'
+    assert poller.latest['operation_status'] == 0
+    poller.poll()
+    assert poller.latest['status'] == 'alarm'
+    assert poller.latest['polls'] == 2
+
+
+def test_settings(adapter):
+    poller = StatusPoller(adapter, settings=True)
+    poller.poll()
+    assert poller.latest['settings'] == [
+        {'channel': 1, 'port': 2, 'attenuation': 0.5}]
+
+
+def test_interval_backs_off_until_something_changes(poller, adapter):
+    assert poller.poll()  # unknown => ok
+    assert poller.interval == 1
+    intervals = []
+    for _ in range(5):
+        assert not poller.poll()
+        intervals.append(poller.interval)
+    assert intervals == [2, 4, 8, 8, 8]
+    adapter.words = [IOError('no answer')]
+    assert poller.poll()
+    assert poller.latest['status'] == 'error'
+    assert poller.latest['error'] == 'no answer'
+    assert poller.interval == 1
+
+
+def test_nudge_resets_the_interval(poller):
+    poller.poll()
+    poller.poll()
+    assert poller.interval == 2
+    poller.nudge()
+    poller.poll()
+    assert poller.interval == 1
+
+
+def test_nudge_wakes_the_thread(adapter):
+    poller = StatusPoller(adapter, min_interval=60, max_interval=60)
+    poller.start()
+    try:
+        assert adapter.polled.wait(5)
+        adapter.polled.clear()
+        poller.nudge()
+        assert adapter.polled.wait(5)
+    finally:
+        poller.stop(timeout=1)
+
+
+def test_nudge_during_a_poll_is_not_lost(adapter):
+    poller = StatusPoller(adapter, min_interval=60, max_interval=60)
+    second = threading.Event()
+
+    def nudge_once():
+        if adapter.calls == 1:
+            poller.nudge()  # e.g. a commit finishing meanwhile
+        else:
+            second.set()
+    adapter.on_poll = nudge_once
+    poller.start()
+    try:
+        assert second.wait(5)
+    finally:
+        poller.stop(timeout=1)
+
+
+def test_not_ready_adapter_is_not_polled(adapter):
+    adapter.ready = False
+    poller = StatusPoller(adapter, min_interval=0.01)
+    poller.start()
+    assert not adapter.polled.wait(0.05)
+    poller.stop(timeout=1)
+    assert adapter.calls == 0 and not poller.running
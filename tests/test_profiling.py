@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from futebol_wss_agent.lib.profiling import (Profiler, ProfileStore,
+                                             ProfilingObserver)
+from futebol_wss_agent.lib.tracing import HookCall
+
+
+class FakeWss(object):
+    version = 3
+
+
+def work(seconds=0.02):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        sum(i * i for i in range(1000))
+
+
+@pytest.fixture
+def profiler(tmpdir):
+    return Profiler(ProfileStore(str(tmpdir), max_profiles=2),
+                    sampling_interval=0.001)
+
+
+@pytest.mark.parametrize('mode', ['deterministic', 'sampling'])
+def test_profile_is_stored(profiler, mode):
+    with profiler.profile('block', mode, path='/x') as session:
+        work()
+    meta = profiler.store.metadata(session.profile_id)
+    assert meta['mode'] == mode and meta['path'] == '/x'
+    assert profiler.store.read(session.profile_id)
+    assert profiler.summary(session.profile_id) is not None
+
+
+def test_oldest_profiles_are_evicted(profiler):
+    ids = []
+    for _ in range(3):
+        with profiler.profile('block') as session:
+            work()
+        ids.append(session.profile_id)
+    assert [meta['id'] for meta in profiler.store.list()] == ids[1:]
+    with pytest.raises(KeyError):
+        profiler.store.metadata(ids[0])
+
+
+def test_unsafe_ids_are_rejected(profiler):
+    with pytest.raises(KeyError):
+        profiler.store.read('../../etc/passwd')
+
+
+def test_arming_is_bounded(profiler):
+    assert profiler.arm('request', 'sampling', 10 ** 9) == {
+        'request': Profiler.MAX_ARMED, 'commit': 0}
+    assert profiler.take('request') == 'sampling'
+    assert profiler.armed['request'] == Profiler.MAX_ARMED - 1
+    profiler.disarm()
+    assert profiler.take('request') is None
+
+
+def test_arming_validates_its_arguments(profiler):
+    with pytest.raises(ValueError):
+        profiler.arm('everything')
+    with pytest.raises(ValueError):
+        profiler.arm('commit', mode='magic')
+
+
+def test_observer_profiles_armed_commits(profiler):
+    observer = ProfilingObserver(profiler)
+    profiler.arm('commit', count=1)
+    for _ in range(2):
+        call = HookCall('Wss.commit')
+        observer.hook_started(FakeWss, call)
+        work()
+        observer.hook_finished(FakeWss, call)
+    profiles = profiler.store.list()
+    assert len(profiles) == 1
+    assert profiles[0]['name'] == 'commit'
+    assert profiles[0]['version'] == 3
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.registry import AdapterRegistry
+
+
+class FakeAdapter(object):
+    def __init__(self, device, **options):
+        self.device = device
+        self.options = options
+        self.settled = True
+        self.healthy = True
+        self.reconnections = []
+        self.closed = False
+
+    def reconnect(self, background=False):
+        self.reconnections.append(background)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def registry():
+    return AdapterRegistry(FakeAdapter)
+
+
+def test_one_adapter_per_device(registry):
+    adapter = registry.adapter('/dev/a', resolution=12.5)
+    assert adapter.options == {'resolution': 12.5}
+    assert registry.adapter('/dev/a', resolution=6.25) is adapter
+    assert registry.adapter('/dev/b') is not adapter
+    assert len(registry) == 2 and '/dev/a' in registry
+
+
+def test_unhealthy_adapter_reconnects(registry):
+    adapter = registry.adapter('/dev/a')
+    adapter.healthy = False
+    assert registry.adapter('/dev/a', background=True) is adapter
+    assert adapter.reconnections == [True]
+
+
+def test_adapter_still_connecting_is_left_alone(registry):
+    adapter = registry.adapter('/dev/a')
+    adapter.healthy = adapter.settled = False
+    registry.adapter('/dev/a')
+    assert adapter.reconnections == []
+
+
+def test_get_does_not_create(registry):
+    assert registry.get('/dev/a') is None
+    adapter = registry.adapter('/dev/a')
+    adapter.healthy = False
+    assert registry.get('/dev/a') is adapter
+    assert adapter.reconnections == []
+
+
+def test_close(registry):
+    a, b = registry.adapter('/dev/a'), registry.adapter('/dev/b')
+    registry.close('/dev/a')
+    assert a.closed and '/dev/a' not in registry
+    registry.close('/dev/missing')
+    registry.close_all()
+    assert b.closed and len(registry) == 0
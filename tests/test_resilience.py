@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib import cli
+from futebol_wss_agent.lib.resilience import (CircuitBreaker, CircuitOpen,
+                                              DeviceTimeout, RetryPolicy)
+
+
+class FakePort(object):
+    """Serial port replying with the queued responses (bytes), only when
+    the test delivers them.
+    """
+
+    is_open = True
+
+    def __init__(self):
+        self.input = b''
+        self.written = []
+
+    @property
+    def in_waiting(self):
+        return len(self.input)
+
+    def read(self, size=1):
+        data, self.input = self.input[:size], self.input[size:]
+        return data
+
+    def write(self, data):
+        self.written.append(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self.input = b''
+
+
+class FakeSerial(cli.Serial):
+    POLL_INTERVAL = 0
+
+    def _open(self):
+        return FakePort()
+
+
+def test_retry_policy_retries_transient_errors():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise DeviceTimeout('late')
+        return 'ok'
+
+    policy = RetryPolicy(attempts=3, backoff=0)
+    assert policy.call(flaky) == 'ok'
+    assert len(calls) == 3
+
+
+def test_retry_policy_gives_up():
+    def broken():
+        raise IOError('unplugged')
+
+    with pytest.raises(IOError):
+        RetryPolicy(attempts=2, backoff=0).call(broken)
+
+
+def test_circuit_opens_and_probes(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('futebol_wss_agent.lib.resilience.clock',
+                        lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    def broken():
+        raise DeviceTimeout('late')
+
+    for _ in range(2):
+        with pytest.raises(DeviceTimeout):
+            breaker.call(broken)
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.call(lambda: 'ok')
+
+    now[0] = 10.0
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == breaker.CLOSED
+
+
+def test_device_errors_count_as_success():
+    breaker = CircuitBreaker(failure_threshold=1)
+
+    def rejected():
+        raise cli.ErrorResponse('CER')
+
+    with pytest.raises(cli.ErrorResponse):
+        breaker.call(rejected)
+    assert breaker.state == breaker.CLOSED
+
+
+def test_late_response_is_not_taken_by_the_next_command():
+    serial = FakeSerial(timeout=0)
+    port = serial._wss
+    port.input = b'partial'
+    with pytest.raises(DeviceTimeout):
+        serial.command('OSS?')
+    assert port.input == b''
+
+    port.input = b'0\r\nOK\r\n'  # late reply to OSS?
+    port.written = []
+
+    def deliver(data):
+        # The reply to the next command arrives after it is sent
+        FakePort.write(port, data)
+        port.input += b'1\r\nOK\r\n'
+    port.write = deliver
+    serial.timeout = 1
+    assert serial.command('OSS?') == '1\r\nOK'
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from futebol_wss_agent.lib.scheduler import (CONFIGURATION, MONITORING,
+                                             CommandScheduler, priority)
+
+
+class FakeInterface(object):
+    """Records the commands; ``BLOCK`` waits until ``gate`` is set."""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = threading.Event()
+        self.config = {'port': 'fake'}
+
+    def command(self, command):
+        self.sent.append(command)
+        if command == 'BLOCK':
+            self.gate.wait(5)
+        return command.lower()
+
+    def iter_records(self, command):
+        self.sent.append(command)
+        for i in range(3):
+            yield (i, command)
+
+
+@pytest.fixture
+def interface():
+    return FakeInterface()
+
+
+@pytest.fixture
+def scheduler(interface):
+    return CommandScheduler(interface)
+
+
+def in_thread(func, *args):
+    thread = threading.Thread(target=func, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end, 'timed out'
+        time.sleep(0.001)
+
+
+def monitor(scheduler, command, results):
+    with priority(MONITORING):
+        results.append(scheduler.command(command))
+
+
+def test_attributes_are_delegated(scheduler):
+    assert scheduler.config == {'port': 'fake'}
+    assert scheduler.command('DCC?') == 'dcc?'
+
+
+def test_configuration_goes_before_monitoring(scheduler, interface):
+    results = []
+    blocker = in_thread(scheduler.command, 'BLOCK')
+    wait_for(lambda: interface.sent == ['BLOCK'])
+    threads = [in_thread(monitor, scheduler, 'OSS?', results)]
+    wait_for(lambda: scheduler.waiting == 1)
+    threads.append(in_thread(scheduler.command, 'UCA 1,2,0.0;'))
+    wait_for(lambda: scheduler.waiting == 2)
+    interface.gate.set()
+    for thread in [blocker] + threads:
+        thread.join(5)
+    assert interface.sent == ['BLOCK', 'UCA 1,2,0.0;', 'OSS?']
+    assert results == ['oss?']
+
+
+def test_identical_monitoring_queries_are_coalesced(scheduler, interface):
+    results = []
+    blocker = in_thread(scheduler.command, 'BLOCK')
+    wait_for(lambda: interface.sent == ['BLOCK'])
+    threads = [in_thread(monitor, scheduler, 'OSS?', results)
+               for _ in range(3)]
+    wait_for(lambda: scheduler.waiting == 1 and
+             threading.active_count() >= 4)
+    time.sleep(0.01)  # let every follower find the queued query
+    interface.gate.set()
+    for thread in [blocker] + threads:
+        thread.join(5)
+    assert interface.sent.count('OSS?') == 1
+    assert results == ['oss?'] * 3
+
+
+def test_waiting_commands_are_promoted(interface):
+    scheduler = CommandScheduler(interface, aging=0.001)
+    results = []
+    blocker = in_thread(scheduler.command, 'BLOCK')
+    wait_for(lambda: interface.sent == ['BLOCK'])
+    first = in_thread(monitor, scheduler, 'OSS?', results)
+    wait_for(lambda: scheduler.waiting == 1)
+    time.sleep(0.05)  # many aging periods: OSS? overtakes new commands
+    second = in_thread(scheduler.command, 'UCA 1,2,0.0;')
+    wait_for(lambda: scheduler.waiting == 2)
+    interface.gate.set()
+    for thread in blocker, first, second:
+        thread.join(5)
+    assert interface.sent == ['BLOCK', 'OSS?', 'UCA 1,2,0.0;']
+
+
+def test_errors_release_the_line(scheduler, interface):
+    def fail(command):
+        raise IOError(command)
+    interface.command = fail
+    with pytest.raises(IOError):
+        scheduler.command('DCC?')
+    interface.command = FakeInterface().command
+    assert scheduler.command('DCC?') == 'dcc?'
+
+
+@pytest.mark.parametrize('level', [CONFIGURATION, MONITORING])
+def test_abandoned_records_do_not_hold_the_line(scheduler, interface, level):
+    with priority(level):
+        records = scheduler.iter_records('DCC?')
+    assert next(records) == (0, 'DCC?')
+    del records
+    done = []
+    thread = in_thread(lambda: done.append(scheduler.command('OSS?')))
+    thread.join(5)
+    assert done == ['oss?']
+
+
+def test_commands_can_be_sent_while_iterating(scheduler):
+    seen = []
+    for record in scheduler.iter_records('DCC?'):
+        seen.append((record, scheduler.command('OSS?')))
+    assert seen == [((i, 'DCC?'), 'oss?') for i in range(3)]
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+from futebol_wss_agent.lib.grid import FixedGrid, Grid
+from futebol_wss_agent.lib.serialization import (channel_to_json,
+                                                 grid_columns_to_json,
+                                                 grid_to_columns,
+                                                 grid_to_json)
+
+
+def grid():
+    grid = FixedGrid(number=3, bandwidth=37.5)
+    grid[1].port = 4
+    grid[1].attenuation = 2.25
+    grid[2].blocked = True
+    return grid
+
+
+def test_channel_matches_dict():
+    channel = grid()[1]
+    data = channel_to_json(channel)
+    assert isinstance(data, bytes)
+    assert json.loads(data.decode('utf-8')) == dict(channel)
+
+
+def test_grid_matches_dicts():
+    channels = grid()
+    assert json.loads(grid_to_json(channels).decode('utf-8')) == [
+        dict(channel) for channel in channels]
+
+
+def test_grid_with_index():
+    items = json.loads(grid_to_json(grid(), index=True).decode('utf-8'))
+    assert [item['index'] for item in items] == [0, 1, 2]
+
+
+def test_floats_keep_their_precision():
+    channel = grid()[0]
+    item = json.loads(channel_to_json(channel).decode('utf-8'))
+    assert item['central_frequency'] == channel.central_frequency
+    assert item['blocked'] is False
+
+
+def test_columns():
+    channels = grid()
+    columns = grid_to_columns(channels)
+    assert columns['port'] == [1, 4, 1]
+    assert columns['blocked'] == [False, False, True]
+    assert json.loads(grid_columns_to_json(channels).decode('utf-8')) == \
+        columns
+
+
+def test_empty_grid():
+    assert grid_to_json(Grid([])) == b'[]'
+    assert json.loads(grid_columns_to_json(Grid([])).decode('utf-8')) == \
+        grid_to_columns([])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from futebol_wss_agent.lib.cli import ErrorResponse
+from futebol_wss_agent.lib.resilience import DeviceTimeout
+from futebol_wss_agent.lib.simulator import FinisarSimulator, serve_tcp
+from futebol_wss_agent.lib.tcp_wss import TcpWSS
+
+
+def test_channel_plan(simulator):
+    assert simulator.handle('CHW 0\r\n') == 'OK\r\n'
+    assert simulator.flexgrid
+    simulator.handle('DCC 1=1:8;2=9:16;')
+    simulator.handle('DCC 2=9:12;3=13:16;')  # only the given channels
+    assert simulator.handle('DCC?') == '1=1:8;2=9:12;3=13:16\r\nOK\r\n'
+
+
+def test_settings(simulator):
+    simulator.handle('UCA 1,1,0.0;2,1,0.0;')
+    simulator.handle('UCA 2,5,1.5;3,99,99.9;')  # 3 is blocked
+    assert simulator.handle('RRA?') == \
+        '1,1,0.0;2,5,1.5;3,99,99.9\r\nOK\r\n'
+
+
+def test_reconfiguration_array_is_only_staged(simulator):
+    simulator.handle('UCA 1,1,0.0;')
+    assert simulator.handle('URA 1,4,2.0;2,3,0.0;') == 'OK\r\n'
+    assert simulator.staged == {1: (4, 2.0), 2: (3, 0.0)}
+    assert simulator.settings == {1: (1, 0.0)}
+
+
+def test_framing_is_accepted(simulator):
+    assert simulator.handle('^SNO?$1234\r\n') == 'SN000000\r\nOK\r\n'
+
+
+@pytest.mark.parametrize('command, code', [
+    ('DCC 1=0:8;', 'VER'),
+    ('UCA 1,50,0.0;', 'VER'),
+    ('UCA 1,1,20.0;', 'VER'),
+    ('UCA nonsense', 'VER'),
+    ('XYZ?', 'CER'),
+])
+def test_invalid_commands(simulator, command, code):
+    assert simulator.handle(command) == code + '\r\n'
+
+
+def test_handle_bytes_keeps_incomplete_lines(simulator):
+    response, rest = simulator.handle_bytes(b'SUS?\r\nOSS?\r\nSN')
+    assert response == b'SLS\r\nOK\r\n0x0000\r\nOK\r\n'
+    assert rest == b'SN'
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def with_server(test, latency=0.0):
+    server = await serve_tcp(FinisarSimulator(), latency=latency)
+    host, port = server.sockets[0].getsockname()[:2]
+    wss = await TcpWSS.connect(host, port, timeout=5)
+    try:
+        return await test(wss, server.simulator)
+    finally:
+        wss.close()
+        await asyncio.sleep(0.01)  # let the server see the disconnection
+        server.close()
+        await server.wait_closed()
+
+
+def test_tcp_records():
+    async def test(wss, simulator):
+        await wss.write(b'DCC 1=1:8;2=9:16;\r\n')
+        assert await wss.readline(timeout=5) == b'OK\r\n'
+        await wss.write(b'DCC?\r\n')
+        return [record async for record in wss.read_records(timeout=5)]
+    assert run(with_server(test)) == [(1, 1, 8), (2, 9, 16)]
+
+
+def test_tcp_error_response():
+    async def test(wss, simulator):
+        await wss.write(b'XYZ?\r\n')
+        with pytest.raises(ErrorResponse):
+            async for _ in wss.read_records(timeout=5):
+                pass
+        return wss.connected
+    assert run(with_server(test))
+
+
+def test_tcp_timeout():
+    async def test(wss, simulator):
+        await wss.write(b'OSS?\r\n')
+        with pytest.raises(DeviceTimeout):
+            await wss.readline(timeout=0.01)
+        # The late response is still read
+        return await wss.readline(timeout=5)
+    assert run(with_server(test, latency=0.1)) == b'0x0000\r\n'
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.grid import FixedGrid, FlexGrid, Grid
+from futebol_wss_agent.lib.snapshot import (SnapshotError, columns, dumps,
+                                            load, loads, save)
+
+
+@pytest.fixture
+def grid():
+    grid = FlexGrid.from_specs([(1, 8, 2, 1.5), (9, 4), (20, 6, 3)])
+    grid[1].blocked = True
+    return grid
+
+
+def rows(grid):
+    return [channel.astuple() for channel in grid]
+
+
+def test_round_trip(grid):
+    copy = loads(dumps(grid))
+    assert type(copy) is Grid
+    assert rows(copy) == rows(grid)
+    assert isinstance(copy[1].blocked, bool)
+
+
+def test_loaded_grid_owns_its_channels(grid):
+    copy = loads(dumps(grid))
+    version = copy.version
+    copy[0].port = 4
+    assert copy.version > version
+    assert grid[0].port == 2
+
+
+def test_empty_grid():
+    assert len(loads(dumps(Grid([])))) == 0
+
+
+@pytest.mark.parametrize('cls', [FixedGrid, FlexGrid])
+def test_subclasses_are_built_with_their_constructor(grid, cls,
+                                                     monkeypatch):
+    built = []
+    original = cls.__init__
+
+    def init(self, *args, **kwargs):
+        built.append(args)
+        original(self, *args, **kwargs)
+    monkeypatch.setattr(cls, '__init__', init)
+    copy = loads(dumps(grid), cls=cls)
+    assert type(copy) is cls and len(built) == 1
+    assert rows(copy) == rows(grid)
+
+
+def test_columns(grid):
+    views = columns(dumps(grid))
+    assert views['port'].tolist() == [2, 1, 3]
+    assert views['bandwidth'].tolist() == [50.0, 25.0, 37.5]
+
+
+def test_invalid_snapshots(grid):
+    data = dumps(grid)
+    with pytest.raises(SnapshotError):
+        loads(data[:10])
+    with pytest.raises(SnapshotError):
+        loads(b'XXXX' + data[4:])
+    corrupted = bytearray(data)
+    corrupted[-1] ^= 0xff
+    with pytest.raises(SnapshotError):
+        loads(bytes(corrupted))
+    assert rows(loads(bytes(corrupted), verify=False))
+    with pytest.raises(SnapshotError):
+        loads(data[:-16], verify=False)
+
+
+def test_save_and_load(grid, tmpdir):
+    path = str(tmpdir.join('plan.wssg'))
+    save(grid, path)
+    assert rows(load(path)) == rows(grid)
+    assert tmpdir.listdir() == [tmpdir.join('plan.wssg')]
+
+
+def test_load_empty_file(tmpdir):
+    path = tmpdir.join('empty.wssg')
+    path.write('')
+    with pytest.raises(SnapshotError):
+        load(str(path))
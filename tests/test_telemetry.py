@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.grid import FixedGrid
+from futebol_wss_agent.lib.telemetry import (RingBuffer, Telemetry,
+                                             TelemetryObserver,
+                                             channel_series_name,
+                                             record_status)
+from futebol_wss_agent.lib.wss import Wss
+
+
+def filled(capacity, count, **kwargs):
+    ring = RingBuffer(('value',), capacity=capacity, **kwargs)
+    for i in range(count):
+        ring.append((i,), timestamp=float(i))
+    return ring
+
+
+def test_oldest_samples_are_overwritten():
+    ring = filled(4, 6)
+    assert len(ring) == 4
+    assert ring.query() == {'time': [2.0, 3.0, 4.0, 5.0],
+                            'value': [2.0, 3.0, 4.0, 5.0]}
+    assert ring.nbytes == 2 * 4 * 8
+
+
+def test_time_range():
+    ring = filled(8, 10)
+    assert ring.query(start=3.5, stop=6)['time'] == [4.0, 5.0, 6.0]
+    assert ring.query(start=20)['time'] == []
+    assert ring.query(start=6, stop=3)['time'] == []
+
+
+def test_timestamps_never_go_backwards():
+    ring = filled(4, 2)
+    ring.append((9,), timestamp=0.0)
+    assert ring.query()['time'] == [0.0, 1.0, 1.0]
+
+
+def test_downsampling():
+    ring = filled(16, 10)
+    result = ring.query(points=2)
+    assert result['time'] == [4.0, 9.0]  # last sample of each bucket
+    assert result['value'] == [2.0, 7.0]
+
+
+@pytest.mark.parametrize('aggregate, expected', [
+    ('min', [0, 5]), ('max', [4, 9]), ('last', [4, 9]), ('or', [7, 15]),
+])
+def test_aggregates(aggregate, expected):
+    ring = filled(16, 10, typecodes='l', aggregates=(aggregate,))
+    assert ring.query(points=2)['value'] == expected
+
+
+def test_invalid_fields():
+    with pytest.raises(ValueError):
+        RingBuffer(('a', 'b'), typecodes='d')
+
+
+def test_least_recently_updated_series_is_removed(caplog):
+    telemetry = Telemetry(capacity=2, max_series=2)
+    telemetry.record('a', (1,))
+    telemetry.record('b', (1,))
+    telemetry.record('a', (2,))
+    telemetry.record('c', (1,))
+    assert telemetry.names() == ['a', 'c']
+    assert telemetry.query('c')['fields'] == ['value']
+    with pytest.raises(KeyError):
+        telemetry.query('b')
+    telemetry.record('d', (1,))
+    assert telemetry.names() == ['c', 'd']
+    warnings = [r for r in caplog.records if r.levelname == 'WARNING']
+    assert len(warnings) == 1
+
+
+def test_status():
+    telemetry = Telemetry()
+    record_status(4, telemetry)
+    assert telemetry.query('status')['operation_status'] == [4]
+
+
+def test_observer_records_changed_channels(adapter):
+    telemetry = Telemetry()
+    grid = FixedGrid(number=4)
+    wss = Wss(grid, adapter)
+    wss.add_observer(TelemetryObserver(telemetry))
+    wss.commit()
+    assert len(telemetry.names('channel/')) == 4
+    grid[2].port = 3
+    wss.commit()
+    assert telemetry.query(channel_series_name(grid[2]))['port'] == [1, 3]
+    assert telemetry.query(channel_series_name(grid[0]))['port'] == [1]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from futebol_wss_agent.lib.tokenizer import ResponseTokenizer, parse_records
+
+SETTINGS = b'1,3,0.5;2,99,99.9;10,1,12.25\r\nOK\r\n'
+RECORDS = [(1, 3, 0.5), (2, 99, 99.9), (10, 1, 12.25)]
+
+
+def feed_in_chunks(data, size):
+    tokenizer = ResponseTokenizer()
+    records = []
+    for start in range(0, len(data), size):
+        records.extend(tokenizer.feed(data[start:start + size]))
+        if tokenizer.done:
+            break
+    return tokenizer, records
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 100])
+def test_records_do_not_depend_on_chunk_boundaries(size):
+    tokenizer, records = feed_in_chunks(SETTINGS, size)
+    assert tokenizer.done and tokenizer.error is None
+    assert records == RECORDS
+
+
+def test_channel_plan():
+    records, error = parse_records('1=1:8;2=9:16;\r\nOK\r\n')
+    assert error is None
+    assert records == [(1, 1, 8), (2, 9, 16)]
+
+
+def test_framing_is_skipped():
+    records, error = parse_records(b'^1,2,0.0;$1A2B\r\n^OK$FF66\r\n')
+    assert error is None
+    assert records == [(1, 2, 0.0)]
+
+
+def test_negative_and_integer_values():
+    records, _ = parse_records('1,-3,-0.25\r\nOK\r\n')
+    assert records == [(1, -3, -0.25)]
+    assert isinstance(records[0][1], int)
+
+
+@pytest.mark.parametrize('code', ['CER', 'AER', 'RER', 'VER'])
+def test_error_codes(code):
+    tokenizer, records = feed_in_chunks(code.encode() + b'\r\n', 1)
+    assert tokenizer.done
+    assert tokenizer.error == code
+    assert records == []
+
+
+def test_bytes_after_the_response_are_not_consumed():
+    tokenizer = ResponseTokenizer()
+    data = b'1,2,0.0\r\nOK\r\n3,4,1.0\r\n'
+    assert list(tokenizer.feed(data)) == [(1, 2, 0.0)]
+    assert tokenizer.done
+    assert data[tokenizer.consumed:] == b'3,4,1.0\r\n'
+
+
+def test_payload_without_final_line_break():
+    records, error = parse_records('1,2,0.5;3,4,1.5')
+    assert error is None
+    assert records == [(1, 2, 0.5), (3, 4, 1.5)]
+
+
+def test_incomplete_response():
+    tokenizer = ResponseTokenizer()
+    assert list(tokenizer.feed(b'1,2,0.5;3,4')) == [(1, 2, 0.5)]
+    assert not tokenizer.done
+    assert list(tokenizer.feed(b',1.5\r\nO')) == [(3, 4, 1.5)]
+    assert not tokenizer.done
+    assert list(tokenizer.feed(b'K\r\n')) == []
+    assert tokenizer.done
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from futebol_wss_agent.lib.grid import FixedGrid
+from futebol_wss_agent.lib.tracing import (HookCall, Observer, SpanTracer,
+                                           notify, span)
+from futebol_wss_agent.lib.wss import Wss
+
+
+class Recorder(Observer):
+    def __init__(self):
+        self.calls = []
+
+    def hook_started(self, wss, call):
+        self.calls.append(('started', call.name))
+
+    def hook_finished(self, wss, call):
+        self.calls.append(('finished', call.name, call.error))
+
+
+def names(span):
+    return [span.name] + [names(child) for child in span.children]
+
+
+def test_commit_is_traced(adapter):
+    wss = Wss(FixedGrid(number=4), adapter)
+    tracer = SpanTracer(history=2)
+    wss.add_observer(tracer)
+    wss.commit()
+    root, = tracer.traces
+    assert root.name == 'Wss.commit'
+    assert root.duration >= 0
+    assert 'commit' in [child.name for child in root.children]
+    assert 'Wss.commit' in root.format()
+    assert root.to_dict()['name'] == 'Wss.commit'
+
+
+def test_history_is_bounded(adapter):
+    wss = Wss(FixedGrid(number=4), adapter)
+    tracer = SpanTracer(history=2)
+    wss.add_observer(tracer)
+    for port in 2, 3, 4:
+        wss.grid[0].port = port
+        wss.commit()
+    assert len(tracer.traces) == 2
+
+
+def test_observers_see_errors(adapter):
+    recorder = Recorder()
+    wss = Wss(FixedGrid(number=4), adapter)
+    wss.add_observer(recorder)
+    wss.commit()
+    assert recorder.calls[0] == ('started', 'Wss.commit')
+    assert recorder.calls[-1] == ('finished', 'Wss.commit', None)
+
+
+def test_failing_observer_is_ignored():
+    class Broken(Observer):
+        def hook_started(self, wss, call):
+            raise RuntimeError('broken')
+    recorder = Recorder()
+    notify([Broken(), recorder], 'hook_started', None, HookCall('x'))
+    assert recorder.calls == [('started', 'x')]
+
+
+def test_span_without_tracer_is_a_noop():
+    with span('diff') as spans:
+        assert spans is None
+
+
+def test_spans_nest_in_the_running_hook():
+    tracer = SpanTracer()
+    call = HookCall('outer')
+    tracer.hook_started(None, call)
+    with span('phase'):
+        pass
+    call.stop = call.start + 1
+    tracer.hook_finished(None, call)
+    root, = tracer.traces
+    assert names(root) == ['outer', ['phase']]
+    assert root.children[0].duration is not None
+    with span('phase') as spans:  # the tree is finished
+        assert spans is None
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from futebol_wss_agent.lib.channel import Channel, VersionClock
+from futebol_wss_agent.lib.grid import FixedGrid, Grid
+from futebol_wss_agent.lib.wss import Wss
+
+
+class CountingAdapter(object):
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self, wss):
+        self.commits += 1
+
+
+def test_effective_changes_advance_the_version():
+    grid = FixedGrid(number=4)
+    assert grid.version == 0
+    grid[0].port = 1  # same value
+    assert grid.version == 0
+    grid[0].port = 3
+    grid[1].attenuation = 2.5
+    assert grid.version == 2
+
+
+def test_etag_identifies_grid_and_version():
+    a, b = FixedGrid(number=2), FixedGrid(number=2)
+    assert a.etag != b.etag
+    etag = a.etag
+    a[0].blocked = True
+    assert a.etag != etag
+
+
+def test_sub_grids_share_the_clock_without_claiming_channels():
+    grid = FixedGrid(number=8)
+    clock = grid[0]._clock
+    other = Grid(list(grid))
+    assert grid[0]._clock is not clock  # claimed by the new grid
+    grid['frequency', 192.2:].port = 4
+    grid[2:4].attenuation = 1
+    assert all(ch._clock is other._clock for ch in grid)
+    assert other.version > 0
+
+
+def test_wss_sees_changes_made_through_the_original_grid():
+    adapter = CountingAdapter()
+    grid = FixedGrid(number=8)
+    wss = Wss(grid, adapter)
+    wss.commit()
+    assert adapter.commits == 1
+    version, etag = wss.version, wss.etag
+
+    grid['frequency', 192.2:].port = 3
+    assert wss.dirty
+    wss.commit()
+    assert adapter.commits == 2
+    assert wss.version == version + 1
+    assert wss.etag != etag
+
+
+def test_commit_is_skipped_when_nothing_changed():
+    adapter = CountingAdapter()
+    wss = Wss(FixedGrid(number=4), adapter)
+    wss.commit()
+    assert not wss.dirty
+    wss.commit()
+    assert adapter.commits == 1
+
+    wss.grid[0].port = 5
+    wss.grid[0].port = 1  # restored
+    assert wss.dirty
+    wss.commit()
+    assert adapter.commits == 1  # values compared before sending
+
+
+def test_replaced_grid_is_compared_by_value():
+    adapter = CountingAdapter()
+    wss = Wss(FixedGrid(number=4), adapter)
+    wss.commit()
+    wss.grid = FixedGrid(number=4)
+    assert not wss.dirty
+    wss.grid = FixedGrid(number=4, bandwidth=100.0)
+    assert wss.dirty
+    wss.commit()
+    assert adapter.commits == 2
+
+
+def test_version_clock_tag():
+    clock = VersionClock()
+    tag = clock.tag
+    clock.value += 1
+    assert clock.tag != tag
+    assert Channel._clock is None